@@ -26,6 +26,24 @@ try:
 except Exception:
     pass
 
+# Raccolta per waitress (opzionale, backend HTTP di produzione)
+try:
+    waitress_col = collect_all('waitress')
+    datas.extend(waitress_col[0])
+    binaries.extend(waitress_col[1])
+    hiddenimports.extend(waitress_col[2])
+except Exception:
+    pass
+
+# Raccolta per brotli (opzionale, compressione delle pagine QR)
+try:
+    brotli_col = collect_all('brotli')
+    datas.extend(brotli_col[0])
+    binaries.extend(brotli_col[1])
+    hiddenimports.extend(brotli_col[2])
+except Exception:
+    pass
+
 # Raccolta per qrcode e dipendenze
 try:
     qrcode_col = collect_all('qrcode')
@@ -43,6 +61,7 @@ except Exception:
 
 # Aggiungi le risorse dell'applicazione
 datas.append(('resources', 'resources'))
+datas.append(('templates', 'templates'))
 
 # Definisci altri import nascosti necessari
 additional_hiddenimports = [
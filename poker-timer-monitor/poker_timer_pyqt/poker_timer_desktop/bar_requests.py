@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Archivio indicizzato delle richieste bar
+
+Le richieste aperte sono tenute in ordine di arrivo in un OrderedDict
+indicizzato per id, con un indice aggiuntivo per tavolo: completare una
+richiesta costa O(1), le pagine dalla più recente o dalla più vecchia si
+leggono senza ordinare e le scansioni ripetute dello stesso QR (o pressioni
+ripetute del pulsante) entro una finestra vengono riunite nella richiesta
+già aperta. Per ogni richiesta si calcola l'attesa rispetto al tempo di
+servizio previsto (SLA).
+
+I client possono indicare una chiave di idempotenza: un nuovo invio con la
+stessa chiave (ricaricamento della pagina, ritrasmissione) restituisce la
+richiesta già registrata senza modificare nulla, anche se nel frattempo è
+stata completata. Le chiavi vengono dimenticate dopo IDEMPOTENCY_TTL secondi.
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from timer_store import TableIndex
+
+BAR_REQUEST_DEDUP_WINDOW = 60.0  # Secondi in cui una nuova richiesta dallo stesso tavolo è un duplicato
+BAR_REQUEST_SLA = 300.0          # Secondi entro cui una richiesta dovrebbe essere servita
+IDEMPOTENCY_TTL = 120.0          # Secondi per cui una chiave di idempotenza resta valida
+MAX_IDEMPOTENCY_KEYS = 4096      # Oltre questo numero si dimenticano le chiavi più vecchie
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class BarRequestStore:
+    """Richieste bar aperte, indicizzate per id e per tavolo (thread-safe)"""
+
+    def __init__(self, dedup_window=BAR_REQUEST_DEDUP_WINDOW, sla=BAR_REQUEST_SLA, clock=_now_ms,
+                 idempotency_ttl=IDEMPOTENCY_TTL, max_keys=MAX_IDEMPOTENCY_KEYS):
+        self.dedup_window = dedup_window
+        self.sla = sla
+        self.idempotency_ttl = idempotency_ttl
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._requests = OrderedDict()  # id -> richiesta, in ordine di arrivo
+        self._by_table = {}             # chiave tavolo -> {id: None} in ordine di arrivo
+        self._keys = OrderedDict()      # chiave di idempotenza -> (istante, richiesta), dalla più vecchia
+        self._sequence = itertools.count(1)
+        self._completed = 0             # Richieste completate dall'avvio
+        self._completed_in_sla = 0      # ... entro il tempo di servizio previsto
+        self._wait_total = 0.0          # Somma delle attese delle richieste completate (secondi)
+        self.version = 0                # Cresce a ogni modifica (chiave delle pagine in cache)
+
+    def __len__(self):
+        return len(self._requests)
+
+    def new_id(self, prefix):
+        """Id univoco per una nuova richiesta (prefisso, millisecondi e progressivo)"""
+        return f"{prefix}_{self._clock()}_{next(self._sequence)}"
+
+    def add(self, table_number, request_id, timestamp=None, source=None, idempotency_key=None):
+        """Registra una richiesta. Restituisce (richiesta, creata)
+
+        Se idempotency_key è già stata usata negli ultimi idempotency_ttl
+        secondi restituisce la richiesta registrata allora, senza modifiche.
+        Se il tavolo ha già una richiesta aperta arrivata da meno di
+        dedup_window secondi (o con lo stesso id), restituisce quella con
+        creata False e ne incrementa il contatore delle ripetizioni.
+        """
+        now = self._clock()
+        key = TableIndex.table_key(table_number)
+        with self._lock:
+            if idempotency_key is not None:
+                replayed = self._replay(idempotency_key, now)
+                if replayed is not None:
+                    return replayed, False
+
+            existing = self._requests.get(request_id)
+            if existing is None and key is not None:
+                for open_id in reversed(self._by_table.get(key, ())):
+                    candidate = self._requests[open_id]
+                    if now - candidate['received_at'] < self.dedup_window * 1000:
+                        existing = candidate
+                    break
+            if existing is not None:
+                # Le richieste pubblicate non vengono modificate sul posto
+                updated = dict(existing, repeats=existing.get('repeats', 0) + 1)
+                self._requests[existing['id']] = updated
+                self.version += 1
+                self._remember(idempotency_key, updated, now)
+                return updated, False
+
+            bar_request = {
+                "id": request_id,
+                "table_number": table_number,
+                "timestamp": timestamp if timestamp is not None else now,
+                "received_at": now,
+            }
+            if source is not None:
+                bar_request["source"] = source
+            self._insert(bar_request)
+            self._remember(idempotency_key, bar_request, now)
+            return bar_request, True
+
+    def complete(self, request_id):
+        """Completa (rimuove) una richiesta. Restituisce la richiesta o None se non esiste"""
+        now = self._clock()
+        with self._lock:
+            bar_request = self._requests.pop(request_id, None)
+            if bar_request is None:
+                return None
+            self._unindex(bar_request)
+            self.version += 1
+            wait = max(0.0, (now - bar_request['received_at']) / 1000)
+            self._completed += 1
+            self._wait_total += wait
+            if wait <= self.sla:
+                self._completed_in_sla += 1
+            return bar_request
+
+    def get(self, request_id):
+        return self._requests.get(request_id)
+
+    def find_by_table(self, table_number):
+        """Richieste aperte di un tavolo, dalla più vecchia"""
+        key = TableIndex.table_key(table_number)
+        with self._lock:
+            return [self._requests[request_id] for request_id in self._by_table.get(key, ())]
+
+    def page(self, offset=0, limit=None, newest_first=True, table_number=None):
+        """Una pagina di richieste aperte con l'attesa di ciascuna
+
+        Restituisce (richieste, totale) dove totale conta le richieste che
+        soddisfano il filtro sul tavolo. Il costo dipende da offset + limit,
+        non dal numero di richieste aperte.
+        """
+        now = self._clock()
+        with self._lock:
+            if table_number is not None:
+                ids = list(self._by_table.get(TableIndex.table_key(table_number), ()))
+                source = [self._requests[request_id] for request_id in ids]
+            else:
+                source = self._requests.values()
+            total = len(source)
+            ordered = reversed(source) if newest_first else iter(source)
+            stop = None if limit is None else offset + limit
+            selected = list(itertools.islice(ordered, offset, stop))
+        return [self._with_age(bar_request, now) for bar_request in selected], total
+
+    def stats(self):
+        """Riepilogo per il monitoraggio del servizio"""
+        now = self._clock()
+        with self._lock:
+            oldest = next(iter(self._requests.values()), None)
+            overdue = 0
+            # In ordine di arrivo: le richieste in ritardo sono tutte in testa
+            for bar_request in self._requests.values():
+                if (now - bar_request['received_at']) / 1000 <= self.sla:
+                    break
+                overdue += 1
+            return {
+                "open": len(self._requests),
+                "overdue": overdue,
+                "oldest_age_seconds": round((now - oldest['received_at']) / 1000, 1) if oldest else None,
+                "sla_seconds": self.sla,
+                "completed": self._completed,
+                "completed_within_sla": self._completed_in_sla,
+                "average_wait_seconds": round(self._wait_total / self._completed, 1) if self._completed else None,
+            }
+
+    def to_list(self):
+        """Richieste aperte in ordine di arrivo (senza campi calcolati)"""
+        with self._lock:
+            return list(self._requests.values())
+
+    def load(self, bar_requests):
+        """Sostituisce le richieste aperte (ripristino all'avvio)"""
+        now = self._clock()
+        with self._lock:
+            self._requests.clear()
+            self._by_table.clear()
+            for bar_request in bar_requests:
+                if 'received_at' not in bar_request:
+                    timestamp = bar_request.get('timestamp')
+                    bar_request = dict(bar_request, received_at=timestamp if isinstance(timestamp, int) else now)
+                self._insert(bar_request)
+
+    def _insert(self, bar_request):
+        # Chiamato con self._lock acquisito
+        self.version += 1
+        self._requests[bar_request['id']] = bar_request
+        key = TableIndex.table_key(bar_request.get('table_number'))
+        if key is not None:
+            self._by_table.setdefault(key, {})[bar_request['id']] = None
+
+    def _unindex(self, bar_request):
+        # Chiamato con self._lock acquisito
+        key = TableIndex.table_key(bar_request.get('table_number'))
+        ids = self._by_table.get(key)
+        if ids is not None:
+            ids.pop(bar_request['id'], None)
+            if not ids:
+                del self._by_table[key]
+
+    def _replay(self, idempotency_key, now):
+        # Chiamato con self._lock acquisito
+        expire_before = now - self.idempotency_ttl * 1000
+        while self._keys:
+            oldest = next(iter(self._keys.values()))
+            if oldest[0] >= expire_before:
+                break
+            self._keys.popitem(last=False)
+        entry = self._keys.get(idempotency_key)
+        if entry is None:
+            return None
+        # La versione aperta più recente (con le ripetizioni), altrimenti quella completata
+        return self._requests.get(entry[1]['id'], entry[1])
+
+    def _remember(self, idempotency_key, bar_request, now):
+        # Chiamato con self._lock acquisito
+        if idempotency_key is None:
+            return
+        self._keys[idempotency_key] = (now, bar_request)
+        self._keys.move_to_end(idempotency_key)
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def _with_age(self, bar_request, now):
+        age = max(0.0, (now - bar_request['received_at']) / 1000)
+        return dict(bar_request, age_seconds=round(age, 1), overdue=age > self.sla)
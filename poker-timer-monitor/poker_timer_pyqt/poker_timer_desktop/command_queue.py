@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Consegna dei comandi ai timer
+
+I comandi per ogni dispositivo sono accodati in ordine da CommandQueue, con
+un numero di sequenza, conferma di ricezione (ack), reinvio e scadenza.
+I timer li ricevono in risposta a /api/status oppure restando in attesa
+(long-poll) su /api/commands/<device_id>: CommandNotifier risveglia le
+richieste in attesa appena viene accodato un comando per quel dispositivo.
+
+I posti per le attese sono limitati. Quando sono tutti occupati,
+/api/commands risponde subito con retry_ms (e l'header Retry-After): il
+timer deve aspettare quei millisecondi prima del long-poll successivo
+invece di riprovare subito.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('poker_timer.commands')
+
+# Parametri della coda comandi
+COMMAND_RETRY_INTERVAL = 5.0  # Secondi senza conferma prima di reinviare un comando
+COMMAND_TTL = 120.0           # Secondi dopo i quali un comando non ancora confermato scade
+COMMAND_MAX_PENDING = 32      # Comandi in coda per dispositivo
+
+# Comandi che portano con sé le impostazioni da applicare
+SETTINGS_COMMANDS = ('settings', 'apply_settings')
+
+
+class CommandNotifier:
+    """Attese per dispositivo risvegliate quando arriva un nuovo comando"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conditions = {}  # device_id -> [Condition, numero di richieste in attesa]
+        self._closed = False
+
+    def notify(self, device_id):
+        """Risveglia le richieste in attesa per il dispositivo"""
+        with self._lock:
+            entry = self._conditions.get(device_id)
+        if entry is None:
+            return
+        with entry[0]:
+            entry[0].notify_all()
+
+    def wait(self, device_id, check, timeout, recheck_interval=None):
+        """Attende finché check() restituisce un valore diverso da None
+
+        check viene chiamato subito, a ogni notifica per il dispositivo e, se
+        indicato, almeno ogni recheck_interval secondi (per i reinvii).
+        Restituisce il valore di check() oppure None allo scadere del timeout
+        o alla chiusura del server.
+        """
+        deadline = time.monotonic() + timeout
+        entry = self._acquire(device_id)
+        try:
+            with entry[0]:
+                while True:
+                    result = check()
+                    if result is not None or self._closed:
+                        return result
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    if recheck_interval is not None:
+                        remaining = min(remaining, recheck_interval)
+                    entry[0].wait(remaining)
+        finally:
+            self._release(device_id, entry)
+
+    def close(self):
+        """Sblocca tutte le attese (arresto del server)"""
+        with self._lock:
+            self._closed = True
+            entries = list(self._conditions.values())
+        for condition, _ in entries:
+            with condition:
+                condition.notify_all()
+
+    def waiting_count(self):
+        """Numero di richieste attualmente in attesa"""
+        with self._lock:
+            return sum(entry[1] for entry in self._conditions.values())
+
+    def _acquire(self, device_id):
+        with self._lock:
+            entry = self._conditions.get(device_id)
+            if entry is None:
+                entry = self._conditions[device_id] = [threading.Condition(), 0]
+            entry[1] += 1
+            return entry
+
+    def _release(self, device_id, entry):
+        with self._lock:
+            entry[1] -= 1
+            if entry[1] <= 0 and self._conditions.get(device_id) is entry:
+                del self._conditions[device_id]
+
+
+class CommandQueue:
+    """Coda ordinata di comandi per dispositivo con numeri di sequenza e conferme
+
+    Ogni comando riceve un numero di sequenza crescente (command_seq) e viene
+    consegnato uno alla volta, nell'ordine di invio. I dispositivi che
+    confermano la ricezione (ack_seq) ricevono il comando successivo solo dopo
+    aver confermato il precedente, che altrimenti viene reinviato ogni
+    retry_interval secondi: il dispositivo deve ignorare i numeri di sequenza
+    già eseguiti (un numero più basso dell'ultimo indica un riavvio del server).
+    I dispositivi che non hanno mai confermato mantengono il comportamento
+    precedente: il comando esce dalla coda appena consegnato.
+    I comandi non confermati entro ttl secondi dall'accodamento scadono.
+
+    I dispositivi la cui coda cambia vengono annotati: take_changes()
+    restituisce il loro stato per il salvataggio su disco e restore() lo
+    ricarica all'avvio, conservando i numeri di sequenza.
+    """
+
+    def __init__(self, retry_interval=COMMAND_RETRY_INTERVAL, ttl=COMMAND_TTL,
+                 max_pending=COMMAND_MAX_PENDING, clock=time.monotonic):
+        self.retry_interval = retry_interval
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._queues = {}     # device_id -> deque di voci in ordine di sequenza
+        self._last_seq = {}   # device_id -> ultimo numero di sequenza assegnato
+        self._acking = set()  # dispositivi che hanno confermato almeno una volta
+        self._dirty = set()   # dispositivi modificati dall'ultimo take_changes()
+
+    def push(self, device_id, command, settings=None):
+        """Accoda un comando. Restituisce il suo numero di sequenza, o None se la coda è piena"""
+        now = self._clock()
+        with self._lock:
+            queue = self._queues.setdefault(device_id, deque())
+            self._expire(device_id, queue, now)
+
+            # Impostazioni non ancora inviate in fondo alla coda: si uniscono alle
+            # nuove (apply_settings senza valori applica quelli già in coda)
+            if command in SETTINGS_COMMANDS and queue:
+                last = queue[-1]
+                if last['command'] in SETTINGS_COMMANDS and last['sent_at'] is None:
+                    if command == 'apply_settings':
+                        last['command'] = command
+                    if settings is not None:
+                        last['settings'] = settings
+                    last['created'] = now
+                    self._dirty.add(device_id)
+                    return last['seq']
+
+            if len(queue) >= self.max_pending:
+                logger.warning(f"Coda comandi piena per {device_id}: comando {command} scartato")
+                return None
+
+            seq = self._last_seq.get(device_id, 0) + 1
+            self._last_seq[device_id] = seq
+            self._dirty.add(device_id)
+            queue.append({
+                'seq': seq,
+                'command': command,
+                'settings': settings,
+                'created': now,
+                'sent_at': None,
+                'attempts': 0,
+            })
+            return seq
+
+    def take(self, device_id):
+        """Restituisce il comando da consegnare ora al dispositivo, oppure None
+
+        Il risultato contiene command, command_seq e, per le impostazioni, settings.
+        """
+        now = self._clock()
+        with self._lock:
+            queue = self._queues.get(device_id)
+            if not queue:
+                return None
+            self._expire(device_id, queue, now)
+            if not queue:
+                del self._queues[device_id]
+                return None
+
+            entry = queue[0]
+            if device_id in self._acking:
+                # In attesa di conferma: reinvia solo dopo retry_interval
+                if entry['sent_at'] is not None and now - entry['sent_at'] < self.retry_interval:
+                    return None
+                if entry['attempts']:
+                    logger.warning(f"Nessuna conferma da {device_id} per il comando {entry['command']} "
+                                   f"(seq {entry['seq']}): reinvio, tentativo {entry['attempts'] + 1}")
+            else:
+                queue.popleft()
+                self._dirty.add(device_id)
+                if not queue:
+                    del self._queues[device_id]
+
+            entry['sent_at'] = now
+            entry['attempts'] += 1
+
+            command_data = {'command': entry['command'], 'command_seq': entry['seq']}
+            if entry['command'] in SETTINGS_COMMANDS and entry['settings'] is not None:
+                command_data['settings'] = entry['settings']
+            return command_data
+
+    def ack(self, device_id, seq):
+        """Conferma i comandi consegnati fino a seq compreso. Restituisce quanti ne rimuove"""
+        removed = 0
+        with self._lock:
+            if device_id not in self._acking:
+                self._acking.add(device_id)
+                self._dirty.add(device_id)
+            queue = self._queues.get(device_id)
+            while queue and queue[0]['seq'] <= seq and queue[0]['sent_at'] is not None:
+                queue.popleft()
+                removed += 1
+            if removed:
+                self._dirty.add(device_id)
+            if queue is not None and not queue:
+                del self._queues[device_id]
+        return removed
+
+    def peek_command(self, device_id):
+        """Nome del prossimo comando da consegnare (o in attesa di conferma), oppure None"""
+        with self._lock:
+            queue = self._queues.get(device_id)
+            return queue[0]['command'] if queue else None
+
+    def depth(self, device_id=None):
+        """Comandi in coda per un dispositivo, o in totale se device_id è None"""
+        with self._lock:
+            if device_id is not None:
+                return len(self._queues.get(device_id, ()))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def remove(self, device_id):
+        """Scarta la coda e lo stato di un dispositivo"""
+        with self._lock:
+            self._queues.pop(device_id, None)
+            self._acking.discard(device_id)
+            self._dirty.add(device_id)
+
+    def clear(self):
+        """Scarta tutte le code"""
+        with self._lock:
+            self._dirty.update(self._queues)
+            self._dirty.update(self._acking)
+            self._queues.clear()
+            self._acking.clear()
+
+    def take_changes(self):
+        """Stato dei dispositivi modificati dall'ultima chiamata, da salvare
+
+        Restituisce un dict device_id -> {last_seq, acking, entries}, dove ogni
+        voce di entries ha seq, command, settings e age (secondi dall'accodamento).
+        """
+        now = self._clock()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            changes = {}
+            for device_id in dirty:
+                changes[device_id] = {
+                    'last_seq': self._last_seq.get(device_id, 0),
+                    'acking': device_id in self._acking,
+                    'entries': [
+                        {'seq': entry['seq'], 'command': entry['command'],
+                         'settings': entry['settings'], 'age': now - entry['created']}
+                        for entry in self._queues.get(device_id, ())
+                    ],
+                }
+            return changes
+
+    def restore(self, device_id, last_seq, acking, entries):
+        """Ricarica lo stato salvato di un dispositivo (formato di take_changes)
+
+        I comandi già scaduti vengono scartati; gli altri verranno consegnati
+        di nuovo, come se non fossero mai stati inviati.
+        """
+        now = self._clock()
+        with self._lock:
+            self._last_seq[device_id] = max(last_seq, self._last_seq.get(device_id, 0))
+            if acking:
+                self._acking.add(device_id)
+            queue = deque()
+            for entry in entries:
+                if entry['age'] > self.ttl:
+                    continue
+                queue.append({
+                    'seq': entry['seq'],
+                    'command': entry['command'],
+                    'settings': entry.get('settings'),
+                    'created': now - entry['age'],
+                    'sent_at': None,
+                    'attempts': 0,
+                })
+            if queue:
+                self._queues[device_id] = queue
+
+    def _expire(self, device_id, queue, now):
+        # Le voci sono in ordine di creazione: basta controllare la testa
+        while queue and now - queue[0]['created'] > self.ttl:
+            entry = queue.popleft()
+            self._dirty.add(device_id)
+            logger.warning(f"Comando {entry['command']} (seq {entry['seq']}) per {device_id} scaduto "
+                           f"dopo {entry['attempts']} tentativi")
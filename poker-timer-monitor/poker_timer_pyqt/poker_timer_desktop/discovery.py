@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Servizio di discovery UDP del Poker Timer Server
+
+I timer inviano in broadcast POKER_TIMER_DISCOVERY sulla porta 8888 e
+attendono POKER_TIMER_SERVER dall'indirizzo del server. DiscoveryResponder
+serve tutte le richieste da un unico ciclo a eventi (selectors) senza mai
+bloccarsi: la seconda risposta, inviata per aumentare le probabilità di
+ricezione, viene pianificata invece di attendere con sleep().
+
+Il servizio può aprire più socket sulla stessa porta (SO_REUSEPORT) per
+distribuire il carico e avere più buffer di ricezione durante le raffiche
+(es. tutta la sala che si riaccende dopo un blackout). Il kernel consegna
+una copia di ogni broadcast a ciascun socket: le copie vengono scartate.
+Ogni sorgente ha un limite di richieste (token bucket) e all'avvio il server
+può annunciarsi in broadcast ai timer che stanno già cercando.
+
+In modalità beacon il server trasmette anche periodicamente in broadcast un
+pacchetto compatto con porta HTTP, id dell'istanza, versione del protocollo e
+un indice di carico:
+
+    POKER_TIMER_SERVER port=3000 id=1a2b3c4d v=1 load=12
+
+Anche la risposta diretta alle richieste indica porta HTTP e id dell'istanza:
+
+    POKER_TIMER_SERVER port=3000 id=1a2b3c4d
+
+così un timer trova il server subito dopo un riavvio o un cambio di porta,
+senza aspettare un beacon. Firmware e app Android accettano qualsiasi
+pacchetto che inizi con POKER_TIMER_SERVER e usano la porta 3000 se port=
+manca (server precedenti). Il firmware ascolta i beacon anche mentre è
+collegato: se porta o id del suo server cambiano si ricollega subito.
+"""
+
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('poker_timer.discovery')
+
+DISCOVERY_REQUEST = "POKER_TIMER_DISCOVERY"
+DISCOVERY_REPLY = "POKER_TIMER_SERVER"
+
+DEFAULT_SOCKETS = 2             # Socket sulla porta di discovery (se SO_REUSEPORT è disponibile)
+RECEIVE_BUFFER = 1 << 20        # Buffer di ricezione richiesto per ogni socket
+SECOND_REPLY_DELAY = 0.1        # Ritardo della risposta ridondante (secondi)
+# Copie dello stesso broadcast arrivate su socket diversi: il confronto usa l'istante
+# di elaborazione, quindi la finestra copre anche i ritardi del ciclo (invio beacon, risposte)
+DUPLICATE_WINDOW = 0.25
+RATE_LIMIT_BURST = 6            # Richieste consecutive accettate da una sorgente
+RATE_LIMIT_PER_SECOND = 3.0     # Richieste al secondo accettate a regime da una sorgente
+MAX_TRACKED_SOURCES = 4096      # Sorgenti ricordate per il limite (le meno recenti vengono dimenticate)
+ANNOUNCE_DELAYS = (0.0, 0.5, 1.5)  # Annunci in broadcast dopo l'avvio (secondi)
+BEACON_INTERVAL = 2.0           # Secondi tra due beacon (minore della finestra di ascolto di 3 s del firmware)
+PROTOCOL_VERSION = 1            # Versione del protocollo annunciata nel beacon
+
+
+def format_beacon(port, instance_id, load=0, version=PROTOCOL_VERSION):
+    """Compone il payload del beacon"""
+    return f"{DISCOVERY_REPLY} port={port} id={instance_id} v={version} load={load}".encode('utf-8')
+
+
+def format_reply(port, instance_id):
+    """Compone la risposta diretta a una richiesta di discovery"""
+    return f"{DISCOVERY_REPLY} port={port} id={instance_id}".encode('utf-8')
+
+
+def parse_beacon(data):
+    """Interpreta un beacon o una risposta di discovery
+
+    Restituisce un dict con i campi presenti (la risposta semplice produce un
+    dict vuoto) oppure None se il pacchetto non proviene da un server.
+    """
+    try:
+        parts = data.decode('utf-8').split()
+    except UnicodeDecodeError:
+        return None
+    if not parts or parts[0] != DISCOVERY_REPLY:
+        return None
+    fields = {}
+    for part in parts[1:]:
+        name, separator, value = part.partition('=')
+        if not separator:
+            continue
+        fields[name] = int(value) if value.isdigit() else value
+    return fields
+
+
+class SourceRateLimiter:
+    """Token bucket per indirizzo IP con un numero limitato di sorgenti ricordate"""
+
+    def __init__(self, burst=RATE_LIMIT_BURST, per_second=RATE_LIMIT_PER_SECOND,
+                 max_sources=MAX_TRACKED_SOURCES):
+        self.burst = burst
+        self.per_second = per_second
+        self.max_sources = max_sources
+        self._buckets = OrderedDict()  # ip -> [token, ultimo aggiornamento]
+
+    def allow(self, source, now):
+        # Le richieste dallo stesso host (es. loadtest.py) non sono limitate
+        if source.startswith('127.'):
+            return True
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+            self._buckets[source] = bucket
+            if len(self._buckets) > self.max_sources:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(source)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+
+class DiscoveryResponder:
+    """Risponde alle richieste di discovery da un thread a eventi"""
+
+    def __init__(self, port, reply=DISCOVERY_REPLY, sockets=DEFAULT_SOCKETS, announce=False,
+                 rate_limiter=None, on_request=None, beacon=None, beacon_interval=BEACON_INTERVAL):
+        self.port = port
+        self.reply = reply.encode('utf-8') if isinstance(reply, str) else reply
+        self.socket_count = max(1, sockets) if hasattr(socket, 'SO_REUSEPORT') else 1
+        self.announce = announce
+        self.rate_limiter = rate_limiter or SourceRateLimiter()
+        self.on_request = on_request  # Chiamata (indirizzo, accettata) per ogni richiesta ricevuta
+        self.beacon = beacon          # Restituisce il payload del beacon (None: nessun beacon periodico)
+        self.beacon_interval = beacon_interval
+
+        self.thread = None
+        self._sockets = []
+        self._selector = None
+        self._wakeup = None  # Coppia di socket per risvegliare il ciclo da altri thread
+        self._running = False
+        self._lock = threading.Lock()
+        self._scheduled = []  # heap di (istante, progressivo, socket, indirizzo, dati)
+        self._sequence = itertools.count()
+        self._recent = OrderedDict()  # (ip, porta, dati) -> istante, per scartare le copie dei broadcast
+        self._next_beacon = None
+        self.dropped = 0      # Risposte non inviate (buffer pieno o errore di rete)
+
+    def start(self):
+        """Apre i socket (gli errori di bind vengono sollevati qui) e avvia il thread"""
+        self._selector = selectors.DefaultSelector()
+        try:
+            for _ in range(self.socket_count):
+                sock = self._open_socket()
+                self._sockets.append(sock)
+                self._selector.register(sock, selectors.EVENT_READ)
+            self._wakeup = socket.socketpair()
+            for sock in self._wakeup:
+                sock.setblocking(False)
+            self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+        except OSError:
+            self._close_sockets()
+            raise
+
+        # Gli annunci usano il payload del beacon, se attivo (calcolato al momento dell'invio)
+        if self.announce:
+            for delay in ANNOUNCE_DELAYS:
+                self.schedule(delay, self._sockets[0], ('<broadcast>', self.port), None)
+        if self.beacon is not None:
+            self._next_beacon = time.monotonic() + (self.beacon_interval if self.announce else 0.0)
+
+        self._running = True
+        self.thread = threading.Thread(target=self._run, name="discovery")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Servizio discovery in ascolto sulla porta UDP {self.port} ({len(self._sockets)} socket"
+                    + (f", beacon ogni {self.beacon_interval:g}s)" if self.beacon is not None else ")"))
+
+    def stop(self, timeout=2.0):
+        """Ferma il ciclo e chiude i socket"""
+        if not self._running:
+            return
+        self._running = False
+        self._wake()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        self._close_sockets()
+        logger.info("Servizio discovery fermato")
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def schedule(self, delay, sock, address, data):
+        """Pianifica l'invio di un datagramma (thread-safe; data None invia il beacon corrente)"""
+        with self._lock:
+            heapq.heappush(self._scheduled, (time.monotonic() + delay, next(self._sequence), sock, address, data))
+        self._wake()
+
+    # ---- Ciclo a eventi ----
+
+    def _run(self):
+        while self._running:
+            timeout = min(self._send_due(), self._send_beacon_due())
+            try:
+                events = self._selector.select(timeout)
+            except OSError:
+                if self._running:
+                    logger.error("Errore nell'attesa dei pacchetti di discovery", exc_info=True)
+                break
+            for key, _ in events:
+                if key.fileobj is self._wakeup[0]:
+                    self._drain_wakeup()
+                else:
+                    self._receive(key.fileobj)
+
+    def _receive(self, sock):
+        # Legge tutti i datagrammi disponibili senza bloccare
+        while True:
+            try:
+                data, address = sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self._running:
+                    logger.error(f"Errore nel servizio discovery: {e}")
+                return
+            self._handle(sock, data, address)
+
+    def _handle(self, sock, data, address):
+        now = time.monotonic()
+
+        key = (address[0], address[1], data)
+        last_seen = self._recent.get(key)
+        if last_seen is not None and now - last_seen < DUPLICATE_WINDOW:
+            return
+        recent = self._recent
+        recent[key] = now
+        recent.move_to_end(key)
+        # Le voci sono in ordine di arrivo: si scartano le più vecchie finché sono scadute
+        while recent:
+            oldest = next(iter(recent.values()))
+            if now - oldest < DUPLICATE_WINDOW and len(recent) <= MAX_TRACKED_SOURCES:
+                break
+            recent.popitem(last=False)
+
+        try:
+            message = data.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            return
+        if message != DISCOVERY_REQUEST:
+            return
+
+        accepted = self.rate_limiter.allow(address[0], now)
+        if self.on_request is not None:
+            self.on_request(address, accepted)
+        if not accepted:
+            logger.debug("Richiesta discovery da %s:%s ignorata (limite superato)", address[0], address[1])
+            return
+
+        # Prima risposta immediata, seconda pianificata per aumentare le probabilità di ricezione
+        self._send(sock, address, self.reply)
+        with self._lock:
+            heapq.heappush(self._scheduled, (now + SECOND_REPLY_DELAY, next(self._sequence), sock, address, self.reply))
+
+    def _send_due(self):
+        """Invia i datagrammi pianificati scaduti e restituisce l'attesa fino al prossimo"""
+        while True:
+            with self._lock:
+                if not self._scheduled:
+                    return 0.5
+                due = self._scheduled[0][0] - time.monotonic()
+                if due > 0:
+                    return min(due, 0.5)
+                _, _, sock, address, data = heapq.heappop(self._scheduled)
+            if data is None:
+                data = self._beacon_payload()
+            if data is not None:
+                self._send(sock, address, data)
+
+    def _send_beacon_due(self):
+        """Invia il beacon periodico se è scaduto e restituisce l'attesa fino al prossimo"""
+        if self._next_beacon is None:
+            return 0.5
+        now = time.monotonic()
+        if now >= self._next_beacon:
+            payload = self._beacon_payload()
+            if payload is not None:
+                self._send(self._sockets[0], ('<broadcast>', self.port), payload)
+            # Il prossimo beacon si calcola da ora: dopo una pausa non si recuperano quelli persi
+            self._next_beacon = now + self.beacon_interval
+        return self._next_beacon - now
+
+    def _beacon_payload(self):
+        if self.beacon is None:
+            return self.reply
+        try:
+            payload = self.beacon()
+        except Exception:
+            logger.error("Errore nella composizione del beacon", exc_info=True)
+            return None
+        return payload.encode('utf-8') if isinstance(payload, str) else payload
+
+    def _send(self, sock, address, data):
+        try:
+            sock.sendto(data, address)
+        except OSError as e:
+            self.dropped += 1
+            logger.debug("Invio discovery a %s non riuscito: %s", address, e)
+
+    # ---- Socket ----
+
+    def _open_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.socket_count > 1:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            except OSError:
+                pass
+            sock.bind(('', self.port))
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _wake(self):
+        if self._wakeup is not None:
+            try:
+                self._wakeup[1].send(b'\0')
+            except OSError:
+                pass
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup[0].recv(512):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _close_sockets(self):
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+        if self._wakeup is not None:
+            for sock in self._wakeup:
+                sock.close()
+            self._wakeup = None
+        with self._lock:
+            self._scheduled = []
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Diffusione degli eventi del server alle dashboard (Server-Sent Events)
+
+Gli stessi eventi emessi come segnali Qt (aggiornamenti dei timer, posti
+liberi, chiamate floorman, richieste bar) vengono serializzati una sola volta
+e accodati a ogni client collegato a /api/events. Ogni client ha una coda
+limitata: un client troppo lento viene disconnesso e, riconnettendosi con
+Last-Event-ID, recupera gli eventi persi dallo storico recente oppure riceve
+un evento 'resync' che gli chiede di ricaricare lo stato completo.
+Un client può limitarsi ad alcuni tipi di evento (es. la pagina del bar
+riceve solo le richieste bar e non gli aggiornamenti dei timer).
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger('poker_timer')
+
+EVENT_QUEUE_SIZE = 256     # Eventi in attesa per client prima della disconnessione
+EVENT_HISTORY_SIZE = 512   # Eventi recenti conservati per le riconnessioni
+EVENT_HEARTBEAT = 15       # Secondi tra due commenti keep-alive sulla connessione
+EVENT_RETRY_MS = 3000      # Attesa suggerita ai browser prima di riconnettersi
+
+
+def format_event(event_id, event_type, data):
+    """Serializza un evento nel formato text/event-stream"""
+    payload = json.dumps(data, separators=(',', ':'))
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class EventSubscription:
+    """Coda limitata degli eventi destinati a un singolo client"""
+
+    def __init__(self, maxsize, types=None):
+        self.maxsize = maxsize
+        self.types = frozenset(types) if types else None  # Tipi di evento richiesti (None: tutti)
+        self.overflowed = False
+        self._frames = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def accepts(self, event_type):
+        """Indica se il client vuole ricevere gli eventi di questo tipo"""
+        return self.types is None or event_type in self.types
+
+    def put(self, frame):
+        """Accoda un evento. Restituisce False se il client è troppo lento (coda piena)"""
+        with self._condition:
+            if self._closed:
+                return False
+            if len(self._frames) >= self.maxsize:
+                self.overflowed = True
+                self._closed = True
+                self._condition.notify_all()
+                return False
+            self._frames.append(frame)
+            self._condition.notify_all()
+            return True
+
+    def get(self, timeout):
+        """Restituisce gli eventi accodati (lista vuota allo scadere del timeout, None se chiusa)"""
+        with self._condition:
+            if not self._frames and not self._closed:
+                self._condition.wait(timeout)
+            if self._frames:
+                frames = list(self._frames)
+                self._frames.clear()
+                return frames
+            return None if self._closed else []
+
+    def close(self):
+        """Chiude la sottoscrizione risvegliando chi è in attesa"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class EventBroadcaster:
+    """Pubblica gli eventi a tutti i client sottoscritti"""
+
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE, history_size=EVENT_HISTORY_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=history_size)  # (id, tipo, frame) degli eventi recenti
+        self._last_id = 0
+        self._closed = False
+
+    def publish(self, event_type, data):
+        """Pubblica un evento. Restituisce il suo id"""
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            frame = format_event(event_id, event_type, data)
+            self._history.append((event_id, event_type, frame))
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            if not subscription.accepts(event_type):
+                continue
+            if not subscription.put(frame) and subscription.overflowed:
+                logger.warning("Client eventi troppo lento: disconnesso")
+                self.unsubscribe(subscription)
+        return event_id
+
+    def subscribe(self, last_event_id=None, types=None):
+        """Registra un nuovo client, eventualmente limitato ad alcuni tipi di evento
+
+        Se last_event_id è indicato vengono accodati gli eventi successivi
+        ancora nello storico, oppure un evento 'resync' se sono andati persi.
+        Restituisce None se il broadcaster è stato chiuso.
+        """
+        subscription = EventSubscription(self.queue_size, types)
+        with self._lock:
+            if self._closed:
+                return None
+            if last_event_id is not None and last_event_id != self._last_id:
+                missed = [frame for event_id, event_type, frame in self._history
+                          if event_id > last_event_id and subscription.accepts(event_type)]
+                oldest = self._history[0][0] if self._history else self._last_id + 1
+                # Id di un'esecuzione precedente, eventi usciti dallo storico o
+                # troppi da recuperare: il client deve ricaricare lo stato completo
+                if (last_event_id > self._last_id or last_event_id + 1 < oldest
+                        or len(missed) > self.queue_size):
+                    subscription.put(format_event(self._last_id, 'resync', {}))
+                else:
+                    for frame in missed:
+                        subscription.put(frame)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Rimuove un client"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscription.close()
+
+    def close(self):
+        """Chiude tutti i client (arresto del server)"""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscription in subscribers:
+            subscription.close()
+
+    def subscriber_count(self):
+        """Numero di client collegati"""
+        with self._lock:
+            return len(self._subscribers)
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Generatore di carico per il Poker Timer Server
+
+Simula centinaia di timer che parlano il protocollo reale: discovery UDP
+(POKER_TIMER_DISCOVERY), aggiornamenti /api/status con i campi inviati
+dall'Arduino, consegna dei comandi (con conferma ack_seq), chiamate
+floorman, richieste bar e posti liberi, più le dashboard che interrogano
+/api/timers. Alla fine riporta throughput, latenze p50/p99 per operazione
+e la latenza di consegna dei comandi.
+
+Usa solo la libreria standard. Esempi:
+
+    python loadtest.py --host 192.168.1.89 --timers 200 --duration 120
+    python loadtest.py --embedded --timers 300 --dashboards 10 --commands-per-second 5
+"""
+
+import argparse
+import http.client
+import json
+import math
+import random
+import socket
+import threading
+import time
+
+from status_codec import encode_status, STATUS_CONTENT_TYPE
+
+DISCOVERY_REQUEST = b"POKER_TIMER_DISCOVERY"
+DISCOVERY_REPLY = b"POKER_TIMER_SERVER"
+COMMANDS = ("start", "pause", "reset")
+
+
+class LatencyStats:
+    """Latenze ed errori per tipo di operazione (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}  # operazione -> lista di latenze in secondi
+        self._errors = {}   # operazione -> numero di errori
+
+    def record(self, operation, seconds):
+        with self._lock:
+            self._samples.setdefault(operation, []).append(seconds)
+
+    def error(self, operation):
+        with self._lock:
+            self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def summary(self, elapsed):
+        """Dizionario operazione -> count, errori, throughput e percentili (ms)"""
+        with self._lock:
+            operations = set(self._samples) | set(self._errors)
+            result = {}
+            for operation in sorted(operations):
+                samples = sorted(self._samples.get(operation, []))
+                result[operation] = {
+                    "count": len(samples),
+                    "errors": self._errors.get(operation, 0),
+                    "per_second": round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+                    "p50_ms": _percentile_ms(samples, 0.50),
+                    "p99_ms": _percentile_ms(samples, 0.99),
+                    "max_ms": round(samples[-1] * 1000, 2) if samples else None,
+                }
+            return result
+
+
+def _percentile_ms(samples, q):
+    if not samples:
+        return None
+    index = max(0, math.ceil(q * len(samples)) - 1)
+    return round(samples[index] * 1000, 2)
+
+
+class HttpClient:
+    """Connessione keep-alive verso il server, riaperta dopo un errore"""
+
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Esegue una richiesta. Restituisce (stato, risposta, corpo JSON o None)"""
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+        request_headers = dict(headers or {})
+        payload = None
+        if isinstance(body, bytes):
+            payload = body
+        elif body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            request_headers['Content-Type'] = 'application/json'
+        try:
+            self._connection.request(method, path, body=payload, headers=request_headers)
+            response = self._connection.getresponse()
+            data = response.read()
+        except Exception:
+            self.close()
+            raise
+
+        content = None
+        if data and response.getheader('Content-Type', '').startswith('application/json'):
+            content = json.loads(data)
+        return response.status, response, content
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class LoadTest:
+    """Esegue lo scenario di carico e raccoglie le statistiche"""
+
+    def __init__(self, options):
+        self.options = options
+        self.stats = LatencyStats()
+        self.stop_event = threading.Event()
+        self._sent_commands = {}  # (device_id, seq) -> istante di invio
+        self._sent_lock = threading.Lock()
+        self._threads = []
+
+    # ---- Timer simulati ----
+
+    def discover(self, device_id):
+        """Handshake UDP di discovery come l'Arduino (richiesta e attesa della risposta)"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(self.options.discovery_timeout)
+        start = time.perf_counter()
+        try:
+            sock.sendto(DISCOVERY_REQUEST, (self.options.host, self.options.discovery_port))
+            while True:
+                data, _ = sock.recvfrom(1024)
+                if DISCOVERY_REPLY in data:
+                    self.stats.record('discovery', time.perf_counter() - start)
+                    return True
+        except OSError:
+            self.stats.error('discovery')
+            return False
+        finally:
+            sock.close()
+
+    def run_timer(self, index):
+        options = self.options
+        device_id = f"loadtest_{index:04d}"
+        table_number = index + 1
+        client = HttpClient(options.host, options.port)
+        rng = random.Random(index)
+
+        if options.discovery:
+            self.discover(device_id)
+
+        # Distribuisce gli invii nell'intervallo per evitare raffiche sincronizzate
+        if self.stop_event.wait(rng.uniform(0, options.status_interval)):
+            return
+
+        state = {
+            "device_id": device_id,
+            "table_number": table_number,
+            "is_running": 1,
+            "is_paused": 0,
+            "current_timer": 30,
+            "time_expired": 0,
+            "mode": 1,
+            "t1_value": 30,
+            "t2_value": 20,
+            "is_t1_active": True,
+            "battery_level": 100,
+            "voltage": 4.2,
+            "wifi_signal": -55,
+            "buzzer": 1,
+            "players_count": 9,
+        }
+        ack_seq = None
+
+        while not self.stop_event.is_set():
+            state["current_timer"] = state["current_timer"] - 1 if state["current_timer"] > 0 else state["t1_value"]
+            state["battery_level"] = max(0, state["battery_level"] - rng.choice((0, 0, 0, 1)))
+            state["voltage"] = round(3.3 + state["battery_level"] * 0.009, 2)
+            state["wifi_signal"] = rng.randint(-80, -40)
+            body = dict(state)
+            if options.ack and ack_seq is not None:
+                body["ack_seq"] = ack_seq
+            headers = None
+            if options.binary_status:
+                body = encode_status(body)
+                headers = {'Content-Type': STATUS_CONTENT_TYPE}
+
+            start = time.perf_counter()
+            try:
+                status, _, response = client.request('POST', '/api/status', body, headers)
+            except Exception:
+                self.stats.error('status')
+            else:
+                self.stats.record('status', time.perf_counter() - start)
+                if status != 200:
+                    self.stats.error('status')
+                elif response and response.get('command_seq') is not None:
+                    ack_seq = response['command_seq']
+                    self._command_delivered(device_id, ack_seq)
+
+            self.stop_event.wait(options.status_interval)
+
+        client.close()
+
+    def run_long_poll(self, index):
+        """Attende i comandi su /api/commands/<device_id> come farebbe un firmware con long-poll"""
+        device_id = f"loadtest_{index:04d}"
+        client = HttpClient(self.options.host, self.options.port, timeout=self.options.long_poll_timeout + 10)
+        ack_seq = None
+        while not self.stop_event.is_set():
+            path = f"/api/commands/{device_id}?timeout={self.options.long_poll_timeout}"
+            if self.options.ack and ack_seq is not None:
+                path += f"&ack={ack_seq}"
+            try:
+                status, _, response = client.request('GET', path)
+            except Exception:
+                self.stats.error('long_poll')
+                self.stop_event.wait(1)
+                continue
+            if status == 404:
+                # Il timer non si è ancora registrato con /api/status
+                self.stop_event.wait(1)
+                continue
+            if response and response.get('command_seq') is not None:
+                ack_seq = response['command_seq']
+                self._command_delivered(device_id, ack_seq)
+            if response and response.get('retry_ms'):
+                # Tutti i posti per i long-poll sono occupati: attendi come il firmware
+                self.stats.error('long_poll_busy')
+                self.stop_event.wait(response['retry_ms'] / 1000)
+        client.close()
+
+    def _command_delivered(self, device_id, seq):
+        with self._sent_lock:
+            sent_at = self._sent_commands.pop((device_id, seq), None)
+        if sent_at is not None:
+            self.stats.record('command_delivery', time.perf_counter() - sent_at)
+
+    # ---- Operatori e dashboard ----
+
+    def run_commands(self):
+        """Invia comandi casuali ai timer e memorizza l'istante di invio per la latenza di consegna"""
+        options = self.options
+        client = HttpClient(options.host, options.port)
+        rng = random.Random(1)
+        interval = 1.0 / options.commands_per_second
+        while not self.stop_event.wait(interval):
+            device_id = f"loadtest_{rng.randrange(options.timers):04d}"
+            start = time.perf_counter()
+            try:
+                status, _, response = client.request('POST', f'/api/command/{device_id}',
+                                                     {"command": rng.choice(COMMANDS)})
+            except Exception:
+                self.stats.error('command_send')
+                continue
+            self.stats.record('command_send', time.perf_counter() - start)
+            if status == 200 and response and response.get('seq') is not None:
+                with self._sent_lock:
+                    self._sent_commands[(device_id, response['seq'])] = start
+            elif status != 404:
+                self.stats.error('command_send')
+        client.close()
+
+    def run_requests(self, operation, per_minute, make_request):
+        """Genera richieste da tavolo (floorman, bar, posti) con arrivi di Poisson"""
+        client = HttpClient(self.options.host, self.options.port)
+        rng = random.Random(hash(operation))
+        rate = per_minute / 60.0
+        while not self.stop_event.wait(rng.expovariate(rate)):
+            table_number = rng.randint(1, self.options.timers)
+            path, body = make_request(table_number, rng)
+            start = time.perf_counter()
+            try:
+                status, _, _ = client.request('POST', path, body)
+            except Exception:
+                self.stats.error(operation)
+                continue
+            self.stats.record(operation, time.perf_counter() - start)
+            if status >= 400 and status != 404:
+                self.stats.error(operation)
+        client.close()
+
+    def run_dashboard(self, index):
+        """Interroga /api/timers come la dashboard web (completo o incrementale con ETag)"""
+        options = self.options
+        client = HttpClient(options.host, options.port)
+        version = None
+        etag = None
+        self.stop_event.wait(random.uniform(0, options.dashboard_interval))
+        while not self.stop_event.is_set():
+            path = '/api/timers'
+            headers = {}
+            if options.dashboard_mode == 'delta':
+                if version is not None:
+                    path += f'?since={version}'
+                if etag:
+                    headers['If-None-Match'] = etag
+            start = time.perf_counter()
+            try:
+                status, response, _ = client.request('GET', path, headers=headers)
+            except Exception:
+                self.stats.error('dashboard')
+            else:
+                self.stats.record('dashboard', time.perf_counter() - start)
+                if status in (200, 304):
+                    header_version = response.getheader('X-Timers-Version')
+                    version = int(header_version) if header_version else None
+                    etag = response.getheader('ETag')
+                else:
+                    self.stats.error('dashboard')
+            self.stop_event.wait(options.dashboard_interval)
+        client.close()
+
+    # ---- Esecuzione ----
+
+    def start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def run(self):
+        options = self.options
+        for index in range(options.timers):
+            self.start_thread(self.run_timer, index)
+            if options.long_poll:
+                self.start_thread(self.run_long_poll, index)
+        for index in range(options.dashboards):
+            self.start_thread(self.run_dashboard, index)
+        if options.commands_per_second > 0:
+            self.start_thread(self.run_commands)
+        if options.floorman_per_minute > 0:
+            self.start_thread(self.run_requests, 'floorman', options.floorman_per_minute,
+                              lambda table, rng: ('/api/floorman_request', {"table_number": table}))
+        if options.bar_per_minute > 0:
+            self.start_thread(self.run_requests, 'bar', options.bar_per_minute,
+                              lambda table, rng: ('/api/bar_service_request',
+                                                  {"table_number": table, "timestamp": int(time.time() * 1000)}))
+        if options.seat_per_minute > 0:
+            self.start_thread(self.run_requests, 'seat', options.seat_per_minute,
+                              lambda table, rng: ('/api/seat_request',
+                                                  {"table_number": table, "seats": [rng.randint(1, 10)],
+                                                   "action": "seat_open"}))
+
+        started = time.perf_counter()
+        try:
+            self.stop_event.wait(options.duration)
+        except KeyboardInterrupt:
+            pass
+        self.stop_event.set()
+        elapsed = time.perf_counter() - started
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+        with self._sent_lock:
+            undelivered = len(self._sent_commands)
+        return {"elapsed_seconds": round(elapsed, 1), "commands_undelivered": undelivered,
+                "operations": self.stats.summary(elapsed)}
+
+
+def print_report(report):
+    print(f"\nDurata: {report['elapsed_seconds']}s")
+    print(f"{'operazione':<18}{'richieste':>10}{'errori':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for operation, values in report['operations'].items():
+        print(f"{operation:<18}{values['count']:>10}{values['errors']:>8}{values['per_second']:>10}"
+              f"{_fmt(values['p50_ms']):>10}{_fmt(values['p99_ms']):>10}{_fmt(values['max_ms']):>10}")
+    print(f"Comandi non consegnati alla fine del test: {report['commands_undelivered']}")
+
+
+def _fmt(value):
+    return '-' if value is None else value
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generatore di carico per il Poker Timer Server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--discovery-port', type=int, default=8888)
+    parser.add_argument('--embedded', action='store_true',
+                        help="avvia un PokerTimerServer in questo processo (richiede PyQt6 e Flask)")
+    parser.add_argument('--backend', default='auto', help="backend HTTP del server embedded")
+    parser.add_argument('--duration', type=float, default=60, help="durata del test in secondi")
+    parser.add_argument('--timers', type=int, default=100, help="numero di timer simulati")
+    parser.add_argument('--status-interval', type=float, default=2.0, help="secondi tra due /api/status per timer")
+    parser.add_argument('--no-discovery', dest='discovery', action='store_false',
+                        help="non eseguire la discovery UDP all'avvio dei timer")
+    parser.add_argument('--discovery-timeout', type=float, default=2.0)
+    parser.add_argument('--ack', action='store_true', help="i timer confermano i comandi con ack_seq")
+    parser.add_argument('--binary-status', action='store_true',
+                        help="i timer inviano lo stato nel formato binario compatto")
+    parser.add_argument('--long-poll', action='store_true', help="i timer attendono i comandi su /api/commands")
+    parser.add_argument('--long-poll-timeout', type=float, default=25)
+    parser.add_argument('--commands-per-second', type=float, default=1.0)
+    parser.add_argument('--floorman-per-minute', type=float, default=2.0)
+    parser.add_argument('--bar-per-minute', type=float, default=4.0)
+    parser.add_argument('--seat-per-minute', type=float, default=2.0)
+    parser.add_argument('--dashboards', type=int, default=5, help="dashboard che interrogano /api/timers")
+    parser.add_argument('--dashboard-interval', type=float, default=2.0)
+    parser.add_argument('--dashboard-mode', choices=('full', 'delta'), default='full',
+                        help="stato completo a ogni richiesta o incrementale con ?since= e ETag")
+    parser.add_argument('--json', action='store_true', help="stampa il risultato in JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+
+    server = None
+    if options.embedded:
+        from server import PokerTimerServer
+        server = PokerTimerServer(port=options.port, discovery_port=options.discovery_port,
+                                  serving_backend=options.backend, state_path=None)
+        server.start()
+
+    try:
+        report = LoadTest(options).run()
+    finally:
+        if server is not None:
+            server.stop()
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Metriche operative del Poker Timer Server
+
+MetricsRegistry raccoglie contatori e istogrammi di latenza per route HTTP,
+oltre a frequenze al secondo (pacchetti di discovery, segnali Qt emessi).
+Le metriche sono esposte da /api/metrics in JSON oppure nel formato testuale
+di Prometheus. Registrare un valore costa un incremento sotto lock.
+"""
+
+import bisect
+import threading
+import time
+
+# Limiti superiori dei bucket degli istogrammi di latenza (secondi)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_WINDOW = 60  # Secondi su cui si calcolano le frequenze
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class LatencyHistogram:
+    """Istogramma cumulativo a bucket fissi (non thread-safe: usato sotto il lock del registro)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # L'ultimo bucket è +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Stima del quantile q (limite superiore del bucket che lo contiene)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def cumulative(self):
+        """Coppie (limite, conteggio cumulativo) come nel formato Prometheus"""
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        result.append((float('inf'), self.count))
+        return result
+
+
+class RateCounter:
+    """Contatore con frequenza al secondo sugli ultimi window secondi (non thread-safe)"""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self.total = 0
+        self._slots = [0] * window
+        self._slot_seconds = [-1] * window
+
+    def mark(self, now, amount=1):
+        second = int(now)
+        index = second % self.window
+        if self._slot_seconds[index] != second:
+            self._slot_seconds[index] = second
+            self._slots[index] = 0
+        self._slots[index] += amount
+        self.total += amount
+
+    def rate(self, now):
+        oldest = int(now) - self.window
+        events = sum(count for second, count in zip(self._slot_seconds, self._slots) if second > oldest)
+        return events / self.window
+
+
+class MetricsRegistry:
+    """Registro delle metriche del server"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._latency = {}   # (route, metodo) -> LatencyHistogram
+        self._requests = {}  # (route, metodo, stato) -> conteggio
+        self._rates = {}     # (nome, etichetta) -> RateCounter
+
+    def observe_request(self, route, method, status, seconds):
+        """Registra la durata di una richiesta HTTP"""
+        with self._lock:
+            histogram = self._latency.get((route, method))
+            if histogram is None:
+                histogram = self._latency[(route, method)] = LatencyHistogram()
+            histogram.observe(seconds)
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def mark(self, name, label=None, amount=1):
+        """Conta un evento di cui interessa la frequenza (es. pacchetti di discovery)"""
+        now = self._clock()
+        with self._lock:
+            counter = self._rates.get((name, label))
+            if counter is None:
+                counter = self._rates[(name, label)] = RateCounter()
+            counter.mark(now, amount)
+
+    def snapshot(self):
+        """Metriche raccolte in forma di dizionario (per la risposta JSON)"""
+        now = self._clock()
+        with self._lock:
+            routes = {}
+            for (route, method), histogram in self._latency.items():
+                routes[f"{method} {route}"] = {
+                    "count": histogram.count,
+                    "sum_seconds": round(histogram.sum, 6),
+                    "p50_seconds": histogram.quantile(0.5),
+                    "p90_seconds": histogram.quantile(0.9),
+                    "p99_seconds": histogram.quantile(0.99),
+                    "status": {},
+                }
+            for (route, method, status), count in self._requests.items():
+                routes[f"{method} {route}"]["status"][str(status)] = count
+
+            rates = {}
+            for (name, label), counter in self._rates.items():
+                key = name if label is None else f"{name}:{label}"
+                rates[key] = {"total": counter.total, "per_second": round(counter.rate(now), 3)}
+
+        return {"routes": routes, "rates": rates}
+
+    def render_prometheus(self, gauges):
+        """Metriche nel formato testuale di Prometheus; gauges è un dict nome -> valore"""
+        now = self._clock()
+        lines = []
+        with self._lock:
+            lines.append("# HELP poker_timer_http_request_duration_seconds Durata delle richieste HTTP per route")
+            lines.append("# TYPE poker_timer_http_request_duration_seconds histogram")
+            for (route, method), histogram in sorted(self._latency.items()):
+                labels = f'route="{_escape(route)}",method="{method}"'
+                for bound, cumulative in histogram.cumulative():
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'poker_timer_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"poker_timer_http_request_duration_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"poker_timer_http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+
+            lines.append("# HELP poker_timer_http_requests_total Richieste HTTP per route e stato")
+            lines.append("# TYPE poker_timer_http_requests_total counter")
+            for (route, method, status), count in sorted(self._requests.items()):
+                lines.append(f'poker_timer_http_requests_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {count}')
+
+            # Totali e frequenze raggruppati per nome (una famiglia Prometheus ciascuno)
+            rates = sorted(self._rates.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+            for suffix, metric_type in (("total", "counter"), ("per_second", "gauge")):
+                previous = None
+                for (name, label), counter in rates:
+                    if name != previous:
+                        lines.append(f"# TYPE poker_timer_{name}_{suffix} {metric_type}")
+                        previous = name
+                    value = counter.total if suffix == "total" else counter.rate(now)
+                    label_text = '' if label is None else f'{{name="{_escape(label)}"}}'
+                    lines.append(f"poker_timer_{name}_{suffix}{label_text} {value}")
+
+        for name, value in gauges.items():
+            lines.append(f"# TYPE poker_timer_{name} gauge")
+            lines.append(f"poker_timer_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
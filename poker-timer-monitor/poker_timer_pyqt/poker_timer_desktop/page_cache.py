@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache delle pagine HTML servite dal server (bar manager, pagine QR)
+
+Le pagine sono generate da template Jinja compilati una sola volta; il
+risultato viene conservato per chiave (es. numero del tavolo o versione
+delle richieste bar) insieme alle sue versioni compresse con gzip e, se il
+modulo brotli è installato, con brotli. Ogni pagina ha un ETag: i client
+che la hanno già ricevono 304 senza corpo. Le pagine QR vengono aperte dai
+telefoni degli ospiti, spesso attraverso il tunnel ngrok, quindi i byte
+trasferiti contano quanto il tempo di generazione.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+# Cerca di importare brotli (opzionale)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+PAGE_CACHE_SIZE = 256    # Pagine conservate (le meno usate vengono scartate)
+MIN_COMPRESS_SIZE = 512  # Sotto questa dimensione la compressione non conviene
+
+
+class CachedPage:
+    """Pagina generata con le sue versioni compresse"""
+
+    __slots__ = ('body', 'etag', 'mimetype', 'encoded')
+
+    def __init__(self, body, mimetype='text/html'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.encoded = {}  # codifica -> corpo compresso
+        if len(body) >= MIN_COMPRESS_SIZE:
+            if BROTLI_AVAILABLE:
+                self.encoded['br'] = brotli.compress(body, quality=11)
+            self.encoded['gzip'] = gzip.compress(body, compresslevel=9)
+
+    def response(self, request, cache_control='no-cache'):
+        """Risposta per la richiesta corrente: 304, oppure il corpo nella codifica migliore accettata"""
+        # ETag debole: vale per tutte le codifiche della stessa pagina
+        if request.if_none_match.contains_weak(self.etag):
+            response = Response(status=304)
+        else:
+            body, encoding = self.body, None
+            for candidate in ('br', 'gzip'):
+                if candidate in self.encoded and request.accept_encodings[candidate]:
+                    body, encoding = self.encoded[candidate], candidate
+                    break
+            response = Response(body, mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(self.etag, weak=True)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+
+class PageCache:
+    """Pagine generate indicizzate per chiave, con scarto delle meno usate (thread-safe)"""
+
+    def __init__(self, max_entries=PAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()  # chiave -> CachedPage
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render, mimetype='text/html'):
+        """Restituisce la pagina per key, generandola con render() se non è in cache"""
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+
+        # Generazione e compressione fuori dal lock: due richieste contemporanee
+        # possono generare la stessa pagina, il risultato è identico
+        page = CachedPage(render(), mimetype)
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Salvataggio su disco dello stato del server (write-behind su SQLite)
+
+Lo stato dei timer (comprese le informazioni sui posti), le richieste bar e
+i comandi in coda vengono salvati in un database SQLite in modalità WAL.
+Le richieste HTTP non scrivono mai su disco: StatePersistence raccoglie le
+modifiche (versioni di TimerStore, dispositivi annotati da CommandQueue, un
+flag per le richieste bar) e un thread le scrive in un'unica transazione ogni
+FLUSH_INTERVAL secondi, così molti aggiornamenti dello stesso timer tra due
+salvataggi diventano una sola scrittura.
+
+All'avvio load() ricarica lo stato salvato; dopo un crash si perdono al più
+le modifiche dell'ultimo intervallo.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('poker_timer')
+
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".poker_timer", "state.db")
+FLUSH_INTERVAL = 1.0  # Secondi tra due salvataggi
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timers (
+    device_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS commands (
+    device_id TEXT PRIMARY KEY,
+    last_seq INTEGER NOT NULL,
+    acking INTEGER NOT NULL,
+    entries TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bar_requests (
+    position INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+class StatePersistence:
+    """Salva periodicamente su SQLite le modifiche allo stato del server"""
+
+    def __init__(self, path, timers, command_queue, bar_requests, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.timers = timers                # TimerStore
+        self.command_queue = command_queue  # CommandQueue
+        self.bar_requests = bar_requests    # Funzione che restituisce la lista delle richieste bar
+        self.interval = interval
+
+        self.thread = None
+        self._connection = None
+        self._flush_lock = threading.Lock()  # Serializza i salvataggi (thread e chiusura)
+        self._stop_event = threading.Event()
+        self._timers_version = 0     # Versione di TimerStore già salvata
+        self._pending_commands = {}  # device_id -> riga da salvare (ritentata dopo un errore)
+        self._bar_dirty = False
+        self.flush_count = 0
+
+    def open(self):
+        """Apre (o crea) il database"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        except sqlite3.Error:
+            connection.close()
+            raise
+        self._connection = connection
+
+    def load(self):
+        """Ricarica timer e comandi salvati. Restituisce la lista delle richieste bar"""
+        started = time.perf_counter()
+        connection = self._connection
+
+        timers = {device_id: json.loads(data)
+                  for device_id, data in connection.execute("SELECT device_id, data FROM timers")}
+        self.timers.load(timers)
+        self._timers_version = self.timers.version
+
+        now = time.time()
+        for device_id, last_seq, acking, entries in connection.execute(
+                "SELECT device_id, last_seq, acking, entries FROM commands"):
+            entries = [dict(entry, age=now - entry['created']) for entry in json.loads(entries)]
+            self.command_queue.restore(device_id, last_seq, bool(acking), entries)
+
+        bar_requests = [json.loads(data)
+                        for (data,) in connection.execute("SELECT data FROM bar_requests ORDER BY position")]
+
+        logger.info(f"Stato ripristinato da {self.path}: {len(timers)} timer, "
+                    f"{self.command_queue.depth()} comandi in coda, {len(bar_requests)} richieste bar "
+                    f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+        return bar_requests
+
+    def start(self):
+        """Avvia il thread di salvataggio"""
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="persistence")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def mark_bar_requests(self):
+        """Annota che le richieste bar sono cambiate"""
+        self._bar_dirty = True
+
+    def flush(self):
+        """Scrive le modifiche accumulate in un'unica transazione. Restituisce True se ha scritto"""
+        with self._flush_lock:
+            if self._connection is None:
+                return False
+
+            changes = self.timers.changes_since(self._timers_version)
+            if changes is None:
+                # Store svuotato o modifiche troppo vecchie: si riscrive tutto
+                version, changed = self.timers.versioned_snapshot()
+                removed = None
+            else:
+                version, changed, removed = changes
+
+            now = time.time()
+            for device_id, state in self.command_queue.take_changes().items():
+                entries = [{'seq': entry['seq'], 'command': entry['command'],
+                            'settings': entry['settings'], 'created': now - entry['age']}
+                           for entry in state['entries']]
+                self._pending_commands[device_id] = (state['last_seq'], int(state['acking']), _dumps(entries))
+            bar_requests = None
+            if self._bar_dirty:
+                self._bar_dirty = False
+                bar_requests = self.bar_requests()
+
+            if (version == self._timers_version and not self._pending_commands
+                    and bar_requests is None):
+                return False
+
+            try:
+                with self._connection:
+                    if removed is None:
+                        self._connection.execute("DELETE FROM timers")
+                    else:
+                        self._connection.executemany("DELETE FROM timers WHERE device_id = ?",
+                                                     [(device_id,) for device_id in removed])
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO timers (device_id, data) VALUES (?, ?)",
+                        [(device_id, _dumps(timer)) for device_id, timer in changed.items()])
+
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO commands (device_id, last_seq, acking, entries) VALUES (?, ?, ?, ?)",
+                        [(device_id,) + row for device_id, row in self._pending_commands.items()])
+
+                    if bar_requests is not None:
+                        self._connection.execute("DELETE FROM bar_requests")
+                        self._connection.executemany(
+                            "INSERT INTO bar_requests (position, data) VALUES (?, ?)",
+                            [(position, _dumps(bar_request)) for position, bar_request in enumerate(bar_requests)])
+            except sqlite3.Error as e:
+                # Le modifiche restano in sospeso e verranno ritentate al prossimo salvataggio
+                if bar_requests is not None:
+                    self._bar_dirty = True
+                logger.error(f"Errore nel salvataggio dello stato su {self.path}: {e}")
+                return False
+
+            self._timers_version = version
+            self._pending_commands = {}
+            self.flush_count += 1
+            return True
+
+    def close(self, flush=True):
+        """Ferma il thread, salva le ultime modifiche e chiude il database"""
+        self._stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5.0)
+        self.thread = None
+        if flush:
+            self.flush()
+        with self._flush_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.error("Errore imprevisto nel salvataggio dello stato", exc_info=True)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stato online/offline dei timer tenuto aggiornato a ogni evento
+
+Un timer è online se ha inviato /api/status negli ultimi TIMER_ONLINE_TIMEOUT
+secondi. Invece di rileggere e convertire last_update di tutti i timer a
+ogni conteggio, PresenceTracker conserva per ogni dispositivo la scadenza
+sull'orologio monotonico (immune ai cambi dell'ora di sistema) e un heap
+delle scadenze: i contatori online/offline si aggiornano in O(1) a ogni
+aggiornamento e in O(log n) quando un timer scade.
+
+Le voci dell'heap non vengono rimosse quando un timer si aggiorna: quelle
+superate vengono scartate quando arrivano in cima e l'heap viene ricostruito
+se cresce oltre il doppio dei dispositivi.
+"""
+
+import heapq
+import threading
+import time
+
+TIMER_ONLINE_TIMEOUT = 180  # Secondi senza aggiornamenti dopo cui un timer è offline
+
+
+class PresenceTracker:
+    """Scadenze e contatori dei timer online (thread-safe)"""
+
+    def __init__(self, timeout=TIMER_ONLINE_TIMEOUT, clock=time.monotonic):
+        self.timeout = timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._deadlines = {}  # device_id -> scadenza (orologio monotonico)
+        self._online = set()
+        self._heap = []       # (scadenza, device_id), con voci superate
+
+    def touch(self, device_id, age=0.0):
+        """Registra un aggiornamento ricevuto age secondi fa. Restituisce True se il timer torna online"""
+        now = self._clock()
+        deadline = now + self.timeout - age
+        with self._lock:
+            self._deadlines[device_id] = deadline
+            if deadline <= now:
+                self._online.discard(device_id)
+                return False
+            heapq.heappush(self._heap, (deadline, device_id))
+            came_online = device_id not in self._online
+            self._online.add(device_id)
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._rebuild_heap()
+            return came_online
+
+    def expire(self):
+        """Porta offline i timer scaduti. Restituisce la lista dei loro id"""
+        now = self._clock()
+        expired = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                deadline, device_id = heapq.heappop(heap)
+                if self._deadlines.get(device_id) == deadline and device_id in self._online:
+                    self._online.discard(device_id)
+                    expired.append(device_id)
+        return expired
+
+    def is_online(self, device_id):
+        deadline = self._deadlines.get(device_id)
+        return deadline is not None and self._clock() < deadline
+
+    def counts(self):
+        """(timer online, timer offline)"""
+        self.expire()
+        with self._lock:
+            online = len(self._online)
+            return online, len(self._deadlines) - online
+
+    def next_expiry(self):
+        """Secondi alla prossima scadenza di un timer online, None se non ce ne sono"""
+        with self._lock:
+            heap = self._heap
+            # Scarta le voci superate in cima all'heap
+            while heap and (self._deadlines.get(heap[0][1]) != heap[0][0] or heap[0][1] not in self._online):
+                heapq.heappop(heap)
+            if not heap:
+                return None
+            return max(0.0, heap[0][0] - self._clock())
+
+    def remove(self, device_id):
+        with self._lock:
+            self._deadlines.pop(device_id, None)
+            self._online.discard(device_id)
+
+    def clear(self):
+        with self._lock:
+            self._deadlines.clear()
+            self._online.clear()
+            self._heap.clear()
+
+    def _rebuild_heap(self):
+        # Chiamato con self._lock acquisito
+        self._heap = [(deadline, device_id) for device_id, deadline in self._deadlines.items()
+                      if device_id in self._online]
+        heapq.heapify(self._heap)
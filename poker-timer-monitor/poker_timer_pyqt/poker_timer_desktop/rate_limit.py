@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Limite di richieste HTTP per route e per client (token bucket)
+
+Con il tunnel ngrok attivo le pagine QR e le API sono raggiungibili da
+Internet: un link QR finito in rete o un crawler non devono poter riempire
+la coda del bar né rallentare l'elaborazione di /api/status dei timer.
+Ogni coppia (route, client) ha un token bucket; alcune route hanno anche un
+bucket comune a tutti i client, che limita il totale anche quando le
+richieste arrivano da molti indirizzi. I bucket sono tenuti in un LRU di
+dimensione fissa, quindi la memoria non cresce con il numero di client.
+
+Le regole sono indicizzate per regola Flask (es. /qr/bar-request/<int:table_number>),
+non per URL, così un crawler che prova tutti i tavoli consuma un solo bucket.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Limiti: (richieste consentite di seguito, richieste al secondo a regime)
+DEFAULT_LIMIT = (60, 20.0)
+RATE_LIMITS = {
+    # Una scansione QR ogni 10 secondi per client, dopo le prime 5
+    '/qr/bar-request/<int:table_number>': (5, 0.1),
+    '/api/bar_service_request': (5, 0.1),
+    '/api/events': (10, 0.5),
+}
+# Limiti comuni a tutti i client della stessa route
+GLOBAL_RATE_LIMITS = {
+    '/qr/bar-request/<int:table_number>': (30, 1.0),
+    '/api/bar_service_request': (30, 1.0),
+}
+
+MAX_TRACKED_CLIENTS = 4096  # Bucket conservati (i meno usati vengono dimenticati)
+
+
+class RateLimiter:
+    """Token bucket per (route, client) con un numero limitato di bucket (thread-safe)"""
+
+    def __init__(self, limits=None, global_limits=None, default=DEFAULT_LIMIT,
+                 max_clients=MAX_TRACKED_CLIENTS, clock=time.monotonic):
+        self.limits = RATE_LIMITS if limits is None else limits
+        self.global_limits = GLOBAL_RATE_LIMITS if global_limits is None else global_limits
+        self.default = default
+        self.max_clients = max_clients
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # (route, client) -> [token, ultimo aggiornamento]
+        self._global = {}              # route -> [token, ultimo aggiornamento]
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def check(self, route, client):
+        """Consuma un token. Restituisce 0 se la richiesta è consentita,
+        altrimenti i secondi da attendere prima di riprovare"""
+        now = self._clock()
+        burst, per_second = self.limits.get(route, self.default)
+        key = (route, client)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = self._take(bucket, burst, per_second, now)
+            if wait:
+                self.rejected += 1
+                return wait
+
+            global_limit = self.global_limits.get(route)
+            if global_limit is not None:
+                global_bucket = self._global.get(route)
+                if global_bucket is None:
+                    global_bucket = self._global[route] = [float(global_limit[0]), now]
+                wait = self._take(global_bucket, global_limit[0], global_limit[1], now)
+                if wait:
+                    # Il client non ha colpa: gli si restituisce il token
+                    bucket[0] += 1.0
+                    self.rejected += 1
+                    return wait
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._global.clear()
+
+    @staticmethod
+    def _take(bucket, burst, per_second, now):
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * per_second)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            return (1.0 - bucket[0]) / per_second
+        bucket[0] -= 1.0
+        return 0
@@ -8,60 +8,182 @@ Poker Timer Server - Backend per l'applicazione desktop
 import os
 import sys
 import time
+import random
 import datetime
 import threading
-import socket
 import logging
 import json
 from PyQt6.QtCore import QObject, pyqtSignal
 
-# Configura il logger
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from server_logging import configure_logging, get_logger, ActivityLog
+
+# Configura il logger (scrittura asincrona, livelli per sottosistema)
+configure_logging()
 logger = logging.getLogger('poker_timer')
+status_logger = get_logger('status')
+command_logger = get_logger('commands')
+discovery_logger = get_logger('discovery')
 
 # Cerca di importare Flask
 try:
-    from flask import Flask, request, jsonify, send_from_directory, Response
+    from flask import Flask, request, jsonify, send_from_directory, Response, g, render_template
 except ImportError:
     print("Flask non trovato. Installazione in corso...")
     import subprocess
     subprocess.check_call([sys.executable, "-m", "pip", "install", "flask"])
-    from flask import Flask, request, jsonify, send_from_directory, Response
+    from flask import Flask, request, jsonify, send_from_directory, Response, g, render_template
+
+from serving import create_backend, DEFAULT_MAX_BLOCKING, DEFAULT_MAX_EVENT_STREAMS
+from timer_store import TimerStore
+from command_queue import CommandNotifier, CommandQueue
+from events import EventBroadcaster, EVENT_HEARTBEAT, EVENT_RETRY_MS
+from metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from telemetry import TelemetryStore, TELEMETRY_FIELDS
+from bar_requests import BarRequestStore
+from page_cache import PageCache
+from rate_limit import RateLimiter
+from status_codec import decode_status, STATUS_CONTENT_TYPE
+from signal_batcher import SignalBatcher
+from presence import PresenceTracker
+from persistence import StatePersistence, DEFAULT_STATE_PATH
+from discovery import (DiscoveryResponder, DEFAULT_SOCKETS as DEFAULT_DISCOVERY_SOCKETS, BEACON_INTERVAL,
+                       format_beacon, format_reply)
+
+# Durata massima di un long-poll su /api/commands (secondi)
+LONG_POLL_DEFAULT_TIMEOUT = 25
+LONG_POLL_MAX_TIMEOUT = 30
+# Attesa suggerita (retry_ms e Retry-After) quando tutti i posti per i long-poll sono occupati:
+# un valore casuale tra 1x e 2x, così i timer respinti insieme non ritornano insieme
+LONG_POLL_BUSY_RETRY_MS = 5000
+
+# Pagine di /api/bar_requests
+BAR_REQUESTS_PAGE_SIZE = 50
+BAR_REQUESTS_MAX_PAGE_SIZE = 500
+
+def format_clock(timestamp_ms):
+    """Ora locale (HH:MM:SS) di un timestamp in millisecondi, per i template"""
+    try:
+        return datetime.datetime.fromtimestamp(timestamp_ms / 1000).strftime('%H:%M:%S')
+    except (TypeError, ValueError, OverflowError, OSError):
+        return ''
+
+# Route usate dai timer: dalla rete locale non sono mai limitate
+DEVICE_ROUTES = frozenset({
+    '/api/status',
+    '/api/commands/<device_id>',
+    '/api/commands/<device_id>/ack',
+    '/api/seat_request',
+    '/api/floorman_request',
+    '/api/bar_service_request',
+})
+
+def rate_limit_client(req):
+    """Client a cui addebitare la richiesta: (indirizzo, arrivato dal tunnel)
+
+    Il tunnel ngrok si collega dallo stesso host e indica il client reale in
+    X-Forwarded-For (l'ultimo valore, aggiunto dal tunnel). Le richieste
+    locali senza quell'header (interfaccia, loadtest.py) restituiscono None.
+    """
+    address = req.remote_addr or ''
+    if address.startswith('127.') or address == '::1':
+        forwarded = req.headers.get('X-Forwarded-For')
+        if not forwarded:
+            return None
+        return forwarded.rsplit(',', 1)[-1].strip(), True
+    return address, False
+
+# Header con cui browser e proxy segnalano prefetch e anteprime dei link
+PREFETCH_HEADERS = ('Sec-Purpose', 'Purpose', 'X-Purpose', 'X-Moz')
+
+def is_prefetch(req):
+    """True se la richiesta è un prefetch o un'anteprima e non una visita dell'utente"""
+    for header in PREFETCH_HEADERS:
+        value = req.headers.get(header, '').lower()
+        if 'prefetch' in value or 'preview' in value or 'prerender' in value:
+            return True
+    return False
+
 
 class PokerTimerServer(QObject):
     """Server per il Poker Timer con segnali Qt"""
     # Segnali per la comunicazione con l'interfaccia
-    timer_updated = pyqtSignal(str)  # Emesso quando un timer viene aggiornato
-    timer_connected = pyqtSignal(str)  # Emesso quando un nuovo timer si connette
+    timers_batch = pyqtSignal(list, list)  # Timer aggiornati e nuovi timer, raggruppati (al più 30 volte al secondo)
     seat_notification = pyqtSignal(str, list)  # Emesso quando arriva una notifica di posti
     floorman_notification = pyqtSignal(int)  # Emesso quando arriva una chiamata floorman
     bar_service_notification = pyqtSignal(int)  # Emesso quando arriva una richiesta servizio bar
+    timers_cleared = pyqtSignal()  # Emesso quando tutti i timer vengono cancellati
     
-    def __init__(self, port=3000, discovery_port=8888):
+    def __init__(self, port=3000, discovery_port=8888, serving_backend="auto", serving_options=None,
+                 discovery_sockets=DEFAULT_DISCOVERY_SOCKETS, discovery_announce=True,
+                 discovery_beacon=True, beacon_interval=BEACON_INTERVAL, state_path=DEFAULT_STATE_PATH):
         super().__init__()
         self.port = port
         self.discovery_port = discovery_port
+        self.serving_backend = serving_backend
+        self.serving_options = serving_options or {}
         self.start_time = time.time()
         
-        # Inizializza l'app Flask
+        # Inizializza l'app Flask (template in templates/, compilati alla prima richiesta)
         self.app = Flask(__name__)
+        self.app.jinja_env.trim_blocks = True
+        self.app.jinja_env.lstrip_blocks = True
+        self.app.jinja_env.filters['clock'] = format_clock
+        
+        # Pagine HTML generate (bar manager, pagine QR) con le versioni compresse
+        self.pages = PageCache()
         
-        # Memorizza lo stato dei timer
-        self.timers = {}
+        # Memorizza lo stato dei timer (thread-safe, indicizzato anche per tavolo)
+        self.timers = TimerStore()
         
-        # Memorizza le richieste bar
-        self.bar_requests = []
+        # Timer online/offline con contatori aggiornati a ogni evento
+        self.presence = PresenceTracker()
+        self._timers_body_cache = None  # (versione, JSON) dell'ultima risposta completa
         
-        # Thread per il servizio di discovery UDP
-        self.discovery_thread = None
-        self.discovery_running = False
-        self.udp_socket = None
+        # Comandi in coda per ogni timer e risveglio dei timer in attesa (long-poll)
+        self.command_queue = CommandQueue()
+        self.command_notifier = CommandNotifier()
+        self.long_poll_slots = threading.BoundedSemaphore(self.serving_options.get('max_long_polls', DEFAULT_MAX_BLOCKING))
+        # Posti separati per i flussi SSE: le dashboard aperte non tolgono posti ai timer
+        self.event_stream_limit = self.serving_options.get('max_event_streams', DEFAULT_MAX_EVENT_STREAMS)
+        self.event_stream_slots = threading.BoundedSemaphore(self.event_stream_limit)
+        self._event_streams_full = False  # Limite raggiunto (per avvisare una volta sola nel log)
         
-        # Thread per il server HTTP
-        self.server_thread = None
+        # Modifiche ai timer consegnate all'interfaccia in gruppi (al posto di un segnale per aggiornamento)
+        self.signal_batcher = SignalBatcher(self, on_flush=self._on_signal_batch)
+        self.signal_batcher.timers_batch.connect(self.timers_batch)
+        
+        # Eventi per le dashboard collegate a /api/events (stessi dei segnali Qt)
+        self.events = EventBroadcaster()
+        
+        # Metriche operative esposte da /api/metrics
+        self.metrics = MetricsRegistry()
+        
+        # Storico di batteria, WiFi e stato dei timer (/api/telemetry)
+        self.telemetry = TelemetryStore()
+        
+        # Contatori degli eventi frequenti, scritti nel log come riepilogo periodico
+        self.status_activity = ActivityLog(status_logger)
+        self.discovery_activity = ActivityLog(discovery_logger)
+        
+        # Richieste bar aperte (indicizzate per id e per tavolo)
+        self.bar_requests = BarRequestStore()
+        
+        # Limite di richieste per route e per client (tunnel e rete locale)
+        self.rate_limiter = RateLimiter()
+        
+        # Salvataggio su disco dello stato (None: solo in memoria)
+        self.state_path = state_path
+        self.persistence = None
+        
+        # Servizio di discovery UDP (a eventi, senza thread per richiesta)
+        self.discovery = None
+        self.discovery_sockets = discovery_sockets
+        self.discovery_announce = discovery_announce
+        self.discovery_beacon = discovery_beacon  # Beacon periodico con porta HTTP e id dell'istanza
+        self.beacon_interval = beacon_interval
+        
+        # Backend HTTP (waitress o Werkzeug)
+        self.http_backend = None
         
         # Configurazione delle route per l'API
         self.setup_routes()
@@ -93,6 +215,92 @@ class PokerTimerServer(QObject):
     def setup_routes(self):
         """Configura le route API del server Flask"""
         
+        # Misura la durata di ogni richiesta per le metriche
+        @self.app.before_request
+        def start_request_timer():
+            g.request_start = time.perf_counter()
+        
+        # Limite di richieste: i timer sulla rete locale non vengono mai rallentati
+        @self.app.before_request
+        def apply_rate_limit():
+            client = rate_limit_client(request)
+            if client is None:
+                return None
+            address, via_tunnel = client
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            if route in DEVICE_ROUTES and not via_tunnel:
+                return None
+            wait = self.rate_limiter.check(route, address)
+            if not wait:
+                return None
+            self.metrics.mark('rate_limited', route)
+            retry_after = str(max(1, int(wait + 0.999)))
+            if request.path.startswith('/api/'):
+                response = jsonify({"status": "error", "message": "Troppe richieste, riprova più tardi"})
+            else:
+                response = Response("Troppe richieste, riprova tra qualche secondo.", mimetype='text/plain')
+            response.status_code = 429
+            response.headers['Retry-After'] = retry_after
+            return response
+        
+        @self.app.after_request
+        def record_request_metrics(response):
+            start = g.get('request_start')
+            if start is not None:
+                # La regola della route (es. /api/command/<device_id>) limita il numero di serie
+                route = request.url_rule.rule if request.url_rule else 'unmatched'
+                self.metrics.observe_request(route, request.method, response.status_code,
+                                             time.perf_counter() - start)
+            return response
+        
+        # Metriche operative in JSON o, con ?format=prometheus, nel formato di Prometheus
+        @self.app.route('/api/metrics')
+        def get_metrics():
+            gauges = self.collect_gauges()
+            # Prometheus chiede text/plain (con parametri di versione) o openmetrics
+            accept = request.headers.get('Accept', '')
+            wants_text = ('text/plain' in accept or 'openmetrics' in accept) and 'application/json' not in accept
+            if request.args.get('format') == 'prometheus' or wants_text:
+                return Response(self.metrics.render_prometheus(gauges), content_type=PROMETHEUS_CONTENT_TYPE)
+            
+            collected = self.metrics.snapshot()
+            return jsonify({
+                "gauges": gauges,
+                "http": collected["routes"],
+                "rates": collected["rates"]
+            })
+        
+        # Storico della telemetria: dispositivi disponibili
+        @self.app.route('/api/telemetry')
+        def get_telemetry_devices():
+            return jsonify({
+                "fields": list(TELEMETRY_FIELDS),
+                "devices": self.telemetry.devices()
+            })
+        
+        # Storico della telemetria di un dispositivo (since/until in secondi Unix, oppure range in secondi)
+        @self.app.route('/api/telemetry/<device_id>')
+        def get_telemetry(device_id):
+            try:
+                until = request.args.get('until', type=float)
+                since = request.args.get('since', type=float)
+                if since is None and 'range' in request.args:
+                    since = (until or time.time()) - float(request.args['range'])
+                resolution = request.args.get('resolution', type=int)
+            except ValueError:
+                return jsonify({"error": "Invalid since, until, range or resolution"}), 400
+            fields = request.args.get('fields')
+            
+            try:
+                result = self.telemetry.query(device_id, since, until, resolution,
+                                              fields.split(',') if fields else None)
+            except ValueError:
+                # inf e nan sono accettati da float() ma non indicano un intervallo
+                return jsonify({"error": "Invalid since, until, range or resolution"}), 400
+            if result is None:
+                return jsonify({"error": "No telemetry for device"}), 404
+            return jsonify(result)
+        
         # API per ottenere informazioni sul server
         @self.app.route('/api/server-info')
         def server_info():
@@ -101,19 +309,53 @@ class PokerTimerServer(QObject):
                 "name": "Poker Timer Server (Python)",
                 "version": "1.0",
                 "port": self.port,
-                "uptime": uptime
+                "uptime": uptime,
+                "backend": self.http_backend.name if self.http_backend else None
             })
         
         # API per ottenere tutti i timer
+        # Senza parametri restituisce lo stato completo (serializzato una volta per
+        # versione); con ?since=<versione> solo i timer cambiati o rimossi.
+        # In entrambi i casi If-None-Match con l'ETag corrente restituisce 304.
         @self.app.route('/api/timers')
         def get_timers():
-            return jsonify(self.timers)
+            version = self.timers.version
+            etag = f"{self.timers.epoch}-{version}"
+            if request.if_none_match.contains(etag):
+                return self._timers_response(Response(status=304), version)
+            
+            since = request.args.get('since', type=int)
+            if since is None:
+                version, body = self._full_timers_body()
+                return self._timers_response(Response(body, mimetype='application/json'), version)
+            
+            epoch = request.args.get('epoch')
+            changes = None
+            if epoch is None or epoch == self.timers.epoch:
+                changes = self.timers.changes_since(since)
+            
+            if changes is None:
+                version, changed = self.timers.versioned_snapshot()
+                removed = []
+            else:
+                version, changed, removed = changes
+            
+            return self._timers_response(jsonify({
+                "version": version,
+                "epoch": self.timers.epoch,
+                "full": changes is None,
+                "changed": changed,
+                "removed": removed
+            }), version)
         
         # API per cancellare tutti i timer
         @self.app.route('/api/timers', methods=['DELETE'])
         def delete_timers():
-            timer_count = len(self.timers)
-            self.timers.clear()
+            timer_count = self.timers.clear()
+            self.presence.clear()
+            self.command_queue.clear()
+            self.timers_cleared.emit()
+            self.events.publish('timers_cleared', {"version": self.timers.version})
             logger.info(f"Cancellati {timer_count} timer")
             return jsonify({
                 "status": "success",
@@ -128,21 +370,15 @@ class PokerTimerServer(QObject):
             logger.info(f"Ricevuta chiamata floorman dal tavolo {table_number}")
             
             # Trova il dispositivo corrispondente a questo tavolo
-            target_device_id = None
-            for device_id, timer in self.timers.items():
-                if timer.get('table_number') == table_number:
-                    target_device_id = device_id
-                    break
+            target_device_id = self.find_device_by_table(table_number)
             
-            if target_device_id:
-                # Aggiungi il timestamp della chiamata floorman
-                self.timers[target_device_id]['floorman_call_timestamp'] = int(time.time() * 1000)  # timestamp in millisecondi
-                
+            # Aggiungi il timestamp della chiamata floorman (in millisecondi)
+            if target_device_id and self.timers.update(target_device_id, {'floorman_call_timestamp': int(time.time() * 1000)}):
                 # Emetti il segnale per aggiornare l'interfaccia
-                self.timer_updated.emit(target_device_id)
+                self._notify_timer_updated(target_device_id)
             
             # Emetti il segnale per la notifica
-            self.floorman_notification.emit(table_number)
+            self._notify_floorman(table_number)
             
             return jsonify({
                 "status": "success",
@@ -157,15 +393,12 @@ class PokerTimerServer(QObject):
             
             # Trova il timer corrispondente
             cleared = False
-            for device_id, timer in self.timers.items():
-                if timer.get('table_number') == table_number:
-                    if 'floorman_request' in timer:
-                        del timer['floorman_request']
-                        cleared = True
-                        # Emetti segnale di aggiornamento
-                        self.timer_updated.emit(device_id)
-                        logger.info(f"Richiesta floorman cancellata per tavolo {table_number}")
-                        break
+            device_id = self.find_device_by_table(table_number)
+            if device_id and 'floorman_request' in self.timers.pop_fields(device_id, 'floorman_request'):
+                cleared = True
+                # Emetti segnale di aggiornamento
+                self._notify_timer_updated(device_id)
+                logger.info(f"Richiesta floorman cancellata per tavolo {table_number}")
             
             if cleared:
                 return jsonify({
@@ -181,14 +414,27 @@ class PokerTimerServer(QObject):
         # API per aggiornare lo stato di un timer
         @self.app.route('/api/status', methods=['POST'])
         def update_status():
-            timer_data = request.json
+            # Stato in JSON oppure nel formato binario compatto (status_codec.py)
+            if request.mimetype == STATUS_CONTENT_TYPE:
+                try:
+                    timer_data = decode_status(request.get_data(cache=False))
+                except (ValueError, UnicodeDecodeError) as e:
+                    return jsonify({"error": f"Invalid status packet: {e}"}), 400
+                self.metrics.mark('status_format', 'binary')
+            else:
+                timer_data = request.json
             device_id = timer_data.get('device_id')
             
             if not device_id:
                 return jsonify({"error": "Missing device_id"}), 400
             
-            logger.info(f"Ricevuto aggiornamento da {device_id}")
+            self.status_activity.record('status', device_id, "Ricevuto aggiornamento da %s", device_id)
 
+            # Conferma di ricezione dei comandi già consegnati (non fa parte dello stato)
+            ack_seq = self._parse_seq(timer_data.pop('ack_seq', None))
+            if ack_seq is not None:
+                self.command_queue.ack(device_id, ack_seq)
+            
             # Aggiorna timestamp e indirizzo IP
             timer_data['last_update'] = datetime.datetime.now().isoformat()
             timer_data['ip_address'] = request.remote_addr
@@ -196,90 +442,179 @@ class PokerTimerServer(QObject):
             # Calcola wifi_quality se wifi_signal è disponibile
             if 'wifi_signal' in timer_data:
                 timer_data['wifi_quality'] = self.calculate_wifi_quality(timer_data['wifi_signal'])
-                logger.info(f"Calcolato wifi_quality={timer_data['wifi_quality']} da wifi_signal={timer_data['wifi_signal']} per {device_id}")
+                status_logger.debug("Calcolato wifi_quality=%s da wifi_signal=%s per %s",
+                                    timer_data['wifi_quality'], timer_data['wifi_signal'], device_id)
             elif device_id.startswith('android_'):
                 # Per i dispositivi Android, aggiungiamo una qualità WiFi variabile
-                import random
                 quality = random.randint(60, 100)
                 timer_data['wifi_quality'] = quality
-                logger.info(f"Impostato wifi_quality simulato={quality} per dispositivo Android {device_id}")
+                status_logger.debug("Impostato wifi_quality simulato=%s per dispositivo Android %s", quality, device_id)
             
             # Verifica se è un nuovo timer
             is_new = device_id not in self.timers
             
-            # Memorizza lo stato aggiornato
-            if device_id in self.timers:
-                self.timers[device_id].update(timer_data)
-            else:
-                self.timers[device_id] = timer_data
-                logger.info(f"Nuovo timer registrato: {device_id}")
+            response_data = {"status": "ok"}
+            seat_notification = None
+            
+            # Memorizza lo stato aggiornato e preleva comandi e notifiche in un'unica modifica atomica
+            with self.timers.edit(device_id, create=True) as timer:
+                timer.update(timer_data)
+                
+                # Controlla se ci sono comandi in coda
+                response_data.update(self._take_command(device_id, timer))
+                
+                # Controlla se c'è una richiesta di posti da comunicare
+                seat_info = timer.get('seat_info')
+                if seat_info and seat_info.get('needs_web_notification'):
+                    seats = seat_info['open_seats']
+                    seat_notification = (str(timer.get('table_number', 0)), seats)
+                    
+                    response_data['seat_request'] = {
+                        "open_seats": seats,
+                        "action": seat_info.get('action', 'seat_open')
+                    }
+                    
+                    # Resetta il flag (seat_info è condiviso con le snapshot: va sostituito, non modificato)
+                    timer['seat_info'] = dict(seat_info, needs_web_notification=False)
+            
+            self.presence.touch(device_id)
+            self.telemetry.record(device_id, timer_data)
             
             # Emetti il segnale appropriato
             if is_new:
-                self.timer_connected.emit(device_id)
+                logger.info(f"Nuovo timer registrato: {device_id}")
+                self._notify_timer_updated(device_id, connected=True)
             else:
-                self.timer_updated.emit(device_id)
+                self._notify_timer_updated(device_id)
             
-            # Controlla se ci sono comandi in sospeso
-            response_data = {"status": "ok"}
-            
-            if 'pending_command' in self.timers[device_id]:
-                response_data['command'] = self.timers[device_id]['pending_command']
-                
-                if self.timers[device_id]['pending_command'] in ['settings', 'apply_settings']:
-                    if 'pending_settings' in self.timers[device_id]:
-                        response_data['settings'] = self.timers[device_id]['pending_settings']
-                        logger.info(f"Invio nuove impostazioni a {device_id}: {self.timers[device_id]['pending_settings']}")
-                
-                # Rimuovi il comando pendente
-                logger.info(f"Inviato comando {self.timers[device_id]['pending_command']} a {device_id}")
-                del self.timers[device_id]['pending_command']
-                if 'pending_settings' in self.timers[device_id]:
-                    del self.timers[device_id]['pending_settings']
-            
-            # Controlla se c'è una richiesta di posti da comunicare
-            if 'seat_info' in self.timers[device_id] and self.timers[device_id].get('seat_info', {}).get('needs_web_notification'):
-                seats = self.timers[device_id]['seat_info']['open_seats']
-                table_num = self.timers[device_id].get('table_number', 0)
-                
-                # Emetti segnale per notifica desktop
-                self.seat_notification.emit(str(table_num), seats)
-                
-                response_data['seat_request'] = {
-                    "open_seats": seats,
-                    "action": self.timers[device_id]['seat_info'].get('action', 'seat_open')
-                }
-                
-                # Resetta il flag
-                self.timers[device_id]['seat_info']['needs_web_notification'] = False
+            # Emetti segnale per notifica desktop
+            if seat_notification:
+                self._notify_seats(*seat_notification)
             
             return jsonify(response_data)
         
+        # Long-poll: il timer resta in attesa finché non c'è un comando da consegnare
+        @self.app.route('/api/commands/<device_id>')
+        def wait_for_command(device_id):
+            if device_id not in self.timers:
+                return jsonify({"error": "Timer not found"}), 404
+            
+            timeout = request.args.get('timeout', LONG_POLL_DEFAULT_TIMEOUT, type=float)
+            timeout = max(0.0, min(timeout, LONG_POLL_MAX_TIMEOUT))
+            
+            ack_seq = self._parse_seq(request.args.get('ack'))
+            if ack_seq is not None:
+                self.command_queue.ack(device_id, ack_seq)
+            
+            # Se tutti i posti per le attese sono occupati rispondi subito con quello
+            # che c'è e con l'attesa prima del prossimo long-poll (retry_ms): nel
+            # frattempo il timer riceve gli altri comandi via /api/status
+            if not self.long_poll_slots.acquire(blocking=False):
+                timeout = 0.0
+                blocking = False
+                self.metrics.mark('long_poll_busy')
+            else:
+                blocking = True
+            
+            try:
+                command_data = self.command_notifier.wait(
+                    device_id, lambda: self.take_pending_command(device_id), timeout,
+                    recheck_interval=self.command_queue.retry_interval
+                )
+            finally:
+                if blocking:
+                    self.long_poll_slots.release()
+            
+            response_data = {"status": "ok"}
+            if command_data:
+                response_data.update(command_data)
+            if blocking:
+                return jsonify(response_data)
+            
+            retry_ms = random.randint(LONG_POLL_BUSY_RETRY_MS, 2 * LONG_POLL_BUSY_RETRY_MS)
+            response_data["retry_ms"] = retry_ms
+            response = jsonify(response_data)
+            response.headers['Retry-After'] = str(-(-retry_ms // 1000))
+            return response
+        
+        # Conferma di ricezione dei comandi fino a seq compreso
+        @self.app.route('/api/commands/<device_id>/ack', methods=['POST'])
+        def ack_command(device_id):
+            ack_seq = self._parse_seq((request.json or {}).get('seq'))
+            if ack_seq is None:
+                return jsonify({"error": "Missing seq"}), 400
+            
+            removed = self.command_queue.ack(device_id, ack_seq)
+            if removed:
+                self._refresh_pending_command(device_id)
+                # Il comando successivo ora può essere consegnato
+                self.command_notifier.notify(device_id)
+            
+            return jsonify({"status": "ok", "acked": removed, "pending": self.command_queue.depth(device_id)})
+        
+        # Flusso Server-Sent Events con gli aggiornamenti per le dashboard
+        @self.app.route('/api/events')
+        def event_stream():
+            # Ogni flusso occupa un thread del backend, con un budget separato da quello dei long-poll
+            slots = self.event_stream_slots
+            if not slots.acquire(blocking=False):
+                # La dashboard ripiega sul polling: conta i rifiuti e avvisa al primo
+                self.metrics.mark('event_stream_rejected')
+                if not self._event_streams_full:
+                    self._event_streams_full = True
+                    logger.warning(f"Raggiunto il limite di {self.event_stream_limit} dashboard collegate a "
+                                   f"/api/events: le altre useranno il polling (limite nelle impostazioni del server)")
+                response = jsonify({"error": "Too many open connections"})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(EVENT_RETRY_MS // 1000)
+                return response
+            
+            self._event_streams_full = False
+            last_event_id = self._parse_seq(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+            # ?types=bar_request,bar_request_completed limita il flusso ad alcuni eventi
+            types = [name for name in request.args.get('types', '').split(',') if name]
+            subscription = self.events.subscribe(last_event_id, types)
+            if subscription is None:
+                slots.release()
+                response = jsonify({"error": "Server stopping"})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(EVENT_RETRY_MS // 1000)
+                return response
+            
+            released = []
+            
+            def cleanup():
+                # Chiamata alla chiusura della risposta, anche se il flusso non è mai partito
+                if not released:
+                    released.append(True)
+                    self.events.unsubscribe(subscription)
+                    slots.release()
+            
+            def generate():
+                yield f"retry: {EVENT_RETRY_MS}\n\n".encode('utf-8')
+                while True:
+                    frames = subscription.get(EVENT_HEARTBEAT)
+                    if frames is None:
+                        return
+                    # Senza eventi invia un commento: mantiene viva la connessione
+                    # e fa emergere i client disconnessi
+                    yield b"".join(frames) if frames else b": ping\n\n"
+            
+            response = Response(generate(), mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            response.call_on_close(cleanup)
+            return response
+        
         # API per salvare le impostazioni di un timer
         @self.app.route('/api/settings/<device_id>', methods=['POST'])
         def save_settings(device_id):
             settings = request.json
             
-            logger.info(f"Ricevute impostazioni per {device_id}: {settings}")
-            
-            # Crea il timer se non esiste
-            if device_id not in self.timers:
-                self.timers[device_id] = {}
-            
-            # Aggiorna i valori specifici del timer
-            self.timers[device_id]['mode'] = settings.get('mode')
-            self.timers[device_id]['t1_value'] = settings.get('t1')
-            self.timers[device_id]['t2_value'] = settings.get('t2')
-            self.timers[device_id]['table_number'] = settings.get('tableNumber')
-            self.timers[device_id]['buzzer'] = settings.get('buzzer')
-            self.timers[device_id]['players_count'] = settings.get('playersCount')
-            
-            # Imposta il comando in sospeso
-            self.timers[device_id]['pending_command'] = "settings"
-            self.timers[device_id]['pending_settings'] = settings
+            command_logger.info(f"Ricevute impostazioni per {device_id}: {settings}")
             
-            # Emetti il segnale per aggiornare l'interfaccia
-            self.timer_updated.emit(device_id)
+            if not self.update_settings(device_id, settings):
+                return jsonify({"error": "Command queue full"}), 503
             
             return jsonify({
                 "status": "settings_queued",
@@ -291,7 +626,7 @@ class PokerTimerServer(QObject):
             command_data = request.json
             command = command_data.get('command')
             
-            logger.info(f"Ricevuto comando {command} per {device_id}")
+            command_logger.info(f"Ricevuto comando {command} per {device_id}")
             
             if not command:
                 return jsonify({"error": "Missing command"}), 400
@@ -303,12 +638,11 @@ class PokerTimerServer(QObject):
             if command == "clear_floorman":
                 logger.info(f"Cancellazione chiamata floorman per device {device_id}")
                 
-                if 'floorman_call_timestamp' in self.timers[device_id]:
-                    del self.timers[device_id]['floorman_call_timestamp']
+                if 'floorman_call_timestamp' in self.timers.pop_fields(device_id, 'floorman_call_timestamp'):
                     logger.info(f"Timestamp floorman rimosso per device {device_id}")
                 
                 # Emetti il segnale per aggiornare l'interfaccia
-                self.timer_updated.emit(device_id)
+                self._notify_timer_updated(device_id)
                 
                 return jsonify({"status": "success", "command": command})
             
@@ -316,21 +650,22 @@ class PokerTimerServer(QObject):
             elif command == "reset_seat_info":
                 logger.info(f"Reset seat info per device {device_id}")
                 
-                if 'seat_info' in self.timers[device_id]:
-                    del self.timers[device_id]['seat_info']
+                if 'seat_info' in self.timers.pop_fields(device_id, 'seat_info'):
                     logger.info(f"Informazioni sui posti rimosse per device {device_id}")
                 
                 # Emetti il segnale per aggiornare l'interfaccia
-                self.timer_updated.emit(device_id)
+                self._notify_timer_updated(device_id)
                 
                 return jsonify({"status": "success", "command": command})
             
             # Altri comandi standard
             else:
-                # Imposta il comando in sospeso
-                self.timers[device_id]['pending_command'] = command
+                # Accoda il comando
+                seq = self._queue_command(device_id, command)
+                if seq is None:
+                    return jsonify({"error": "Command queue full"}), 503
                 
-                return jsonify({"status": "command_queued", "command": command})
+                return jsonify({"status": "command_queued", "command": command, "seq": seq})
         
         # API per gestire le richieste di posti liberi
         @self.app.route('/api/seat_request', methods=['POST'])
@@ -343,43 +678,52 @@ class PokerTimerServer(QObject):
             logger.info(f"Posti: {', '.join(map(str, seats))}")
             
             # Cerca il dispositivo corrispondente a questo tavolo
-            target_device_id = None
-            for device_id, timer in self.timers.items():
-                if timer.get('table_number') == table_number:
-                    target_device_id = device_id
-                    break
+            target_device_id = self.find_device_by_table(table_number)
             
+            notify_seats = None
             if target_device_id:
-                # Inizializza la struttura dei posti se non esiste
-                if 'seat_info' not in self.timers[target_device_id]:
-                    self.timers[target_device_id]['seat_info'] = {
-                        'open_seats': [],
-                        'timestamp': datetime.datetime.now().isoformat(),
-                        'action': 'seat_open',
-                        'needs_web_notification': False
-                    }
-                
-                # Aggiungi i nuovi posti in coda all'elenco esistente (senza duplicati)
-                for seat in seats:
-                    if seat not in self.timers[target_device_id]['seat_info']['open_seats']:
-                        self.timers[target_device_id]['seat_info']['open_seats'].append(seat)
-                
-                # Aggiorna le informazioni
-                self.timers[target_device_id]['seat_info'].update({
-                    'timestamp': datetime.datetime.now().isoformat(),
-                    'action': request_data.get('action', 'seat_open'),
-                })
-                
-                # Imposta il flag di notifica solo se non è già attivo
-                # Questa modifica evita che vengano emessi più segnali in rapida successione
-                if not self.timers[target_device_id]['seat_info'].get('needs_web_notification', False):
-                    self.timers[target_device_id]['seat_info']['needs_web_notification'] = True
-                    
-                    # Emetti il segnale per la notifica
-                    self.seat_notification.emit(str(table_number), self.timers[target_device_id]['seat_info']['open_seats'])
+                try:
+                    with self.timers.edit(target_device_id) as timer:
+                        # Inizializza la struttura dei posti se non esiste
+                        # (copia: seat_info è condiviso con le snapshot in lettura)
+                        seat_info = dict(timer.get('seat_info') or {
+                            'open_seats': [],
+                            'timestamp': datetime.datetime.now().isoformat(),
+                            'action': 'seat_open',
+                            'needs_web_notification': False
+                        })
+                        
+                        # Aggiungi i nuovi posti in coda all'elenco esistente (senza duplicati)
+                        open_seats = list(seat_info.get('open_seats', []))
+                        for seat in seats:
+                            if seat not in open_seats:
+                                open_seats.append(seat)
+                        seat_info['open_seats'] = open_seats
+                        
+                        # Aggiorna le informazioni
+                        seat_info.update({
+                            'timestamp': datetime.datetime.now().isoformat(),
+                            'action': request_data.get('action', 'seat_open'),
+                        })
+                        
+                        # Imposta il flag di notifica solo se non è già attivo
+                        # Questa modifica evita che vengano emessi più segnali in rapida successione
+                        if not seat_info.get('needs_web_notification', False):
+                            seat_info['needs_web_notification'] = True
+                            notify_seats = open_seats
+                        
+                        timer['seat_info'] = seat_info
+                except KeyError:
+                    # Il timer è stato rimosso nel frattempo
+                    target_device_id = None
+            
+            if target_device_id:
+                # Emetti il segnale per la notifica
+                if notify_seats is not None:
+                    self._notify_seats(str(table_number), notify_seats)
                 
                 # Emetti il segnale per aggiornare l'interfaccia
-                self.timer_updated.emit(target_device_id)
+                self._notify_timer_updated(target_device_id)
                 
                 return jsonify({
                     "status": "success",
@@ -396,230 +740,13 @@ class PokerTimerServer(QObject):
         def bar_manager_interface():
             """Fornisce un'interfaccia web per la gestione delle richieste bar"""
             
-            # Recupera la lista delle richieste bar attive
-            active_requests = self.bar_requests.copy()
-            
-            # Ordina le richieste per timestamp (più recenti in cima)
-            active_requests.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
-            
-            # Crea la pagina HTML
-            html_content = """
-            <!DOCTYPE html>
-            <html lang="it">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Gestione Richieste Bar</title>
-                <style>
-                    * {
-                        box-sizing: border-box;
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    }
-                    body {
-                        background-color: #f5f5f5;
-                        padding: 20px;
-                        max-width: 1200px;
-                        margin: 0 auto;
-                        color: #333;
-                    }
-                    h1, h2 {
-                        color: #2196F3;
-                        text-align: center;
-                    }
-                    .dashboard {
-                        display: grid;
-                        grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
-                        gap: 20px;
-                        margin-top: 30px;
-                    }
-                    .request-card {
-                        background-color: white;
-                        border-radius: 10px;
-                        padding: 20px;
-                        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-                        transition: all 0.3s ease;
-                        position: relative;
-                    }
-                    .request-card:hover {
-                        transform: translateY(-5px);
-                        box-shadow: 0 8px 16px rgba(0,0,0,0.1);
-                    }
-                    .table-number {
-                        font-size: 24px;
-                        font-weight: bold;
-                        color: #FF9800;
-                        margin-bottom: 15px;
-                    }
-                    .timestamp {
-                        color: #757575;
-                        font-size: 14px;
-                        margin-bottom: 20px;
-                    }
-                    .source-tag {
-                        position: absolute;
-                        top: 15px;
-                        right: 15px;
-                        background-color: #E3F2FD;
-                        color: #1976D2;
-                        padding: 5px 10px;
-                        border-radius: 15px;
-                        font-size: 12px;
-                        font-weight: bold;
-                    }
-                    .source-tag.qr {
-                        background-color: #E8F5E9;
-                        color: #388E3C;
-                    }
-                    .source-tag.app {
-                        background-color: #FFF3E0;
-                        color: #F57C00;
-                    }
-                    .complete-btn {
-                        background-color: #4CAF50;
-                        color: white;
-                        border: none;
-                        padding: 10px 15px;
-                        border-radius: 5px;
-                        cursor: pointer;
-                        width: 100%;
-                        font-size: 16px;
-                        font-weight: bold;
-                        transition: background-color 0.3s;
-                    }
-                    .complete-btn:hover {
-                        background-color: #388E3C;
-                    }
-                    .empty-state {
-                        text-align: center;
-                        padding: 40px;
-                        background-color: white;
-                        border-radius: 10px;
-                        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-                    }
-                    .empty-state-icon {
-                        font-size: 60px;
-                        margin-bottom: 20px;
-                    }
-                    .refresh-section {
-                        text-align: center;
-                        margin: 20px 0;
-                    }
-                    .refresh-btn {
-                        background-color: #2196F3;
-                        color: white;
-                        border: none;
-                        padding: 10px 20px;
-                        border-radius: 5px;
-                        cursor: pointer;
-                        font-size: 16px;
-                        transition: background-color 0.3s;
-                    }
-                    .refresh-btn:hover {
-                        background-color: #1976D2;
-                    }
-                    .auto-refresh {
-                        margin-top: 10px;
-                        font-size: 14px;
-                        color: #757575;
-                    }
-                    @media (max-width: 600px) {
-                        .dashboard {
-                            grid-template-columns: 1fr;
-                        }
-                    }
-                </style>
-            </head>
-            <body>
-                <h1>Gestione Richieste Bar</h1>
-                
-                <div class="refresh-section">
-                    <button class="refresh-btn" onclick="window.location.reload()">Aggiorna</button>
-                    <div class="auto-refresh">La pagina si aggiorna automaticamente ogni 15 secondi</div>
-                </div>
-            """
-            
-            # Aggiungi script per aggiornamento automatico
-            html_content += """
-                <script>
-                    // Auto-refresh every 15 seconds
-                    setTimeout(function() {
-                        window.location.reload();
-                    }, 15000);
-                    
-                    // Function to mark a request as complete
-                    function completeRequest(requestId) {
-                        fetch('/api/bar_requests/' + requestId + '/complete', {
-                            method: 'POST'
-                        })
-                        .then(response => {
-                            if (response.ok) {
-                                // Remove the card
-                                document.getElementById('request-' + requestId).remove();
-                                
-                                // Check if there are no more requests
-                                if (document.querySelectorAll('.request-card').length === 0) {
-                                    // Show empty state
-                                    const dashboard = document.querySelector('.dashboard');
-                                    dashboard.innerHTML = `
-                                        <div class="empty-state">
-                                            <div class="empty-state-icon">🍹</div>
-                                            <h2>Nessuna richiesta attiva</h2>
-                                            <p>Non ci sono richieste bar in attesa.</p>
-                                        </div>
-                                    `;
-                                }
-                            } else {
-                                alert('Errore nel completamento della richiesta');
-                            }
-                        })
-                        .catch(error => {
-                            console.error('Error:', error);
-                            alert('Errore di rete');
-                        });
-                    }
-                </script>
-            """
-            
-            # Sezione richieste
-            html_content += '<div class="dashboard">'
-            
-            # Se non ci sono richieste, mostra lo stato vuoto
-            if not active_requests:
-                html_content += """
-                    <div class="empty-state">
-                        <div class="empty-state-icon">🍹</div>
-                        <h2>Nessuna richiesta attiva</h2>
-                        <p>Non ci sono richieste bar in attesa.</p>
-                    </div>
-                """
-            else:
-                # Aggiungi una card per ogni richiesta attiva
-                for request in active_requests:
-                    request_id = request.get('id', 'unknown')
-                    table_number = request.get('table_number', 'N/A')
-                    timestamp = request.get('timestamp', 0)
-                    source = request.get('source', 'app')  # Default to 'app' if not specified
-                    
-                    # Converti il timestamp in formato leggibile
-                    from datetime import datetime
-                    readable_time = datetime.fromtimestamp(timestamp / 1000).strftime('%H:%M:%S')
-                    
-                    # Tag della sorgente
-                    source_class = "qr" if source == "qr_code" else "app"
-                    source_text = "QR Code" if source == "qr_code" else "App"
-                    
-                    html_content += f"""
-                        <div class="request-card" id="request-{request_id}">
-                            <div class="source-tag {source_class}">{source_text}</div>
-                            <div class="table-number">Tavolo {table_number}</div>
-                            <div class="timestamp">Richiesta alle {readable_time}</div>
-                            <button class="complete-btn" onclick="completeRequest('{request_id}')">Completata</button>
-                        </div>
-                    """
-            
-            html_content += '</div></body></html>'
-            
-            return Response(html_content, mimetype='text/html')
+            # La pagina cambia solo quando cambiano le richieste: in cache per versione
+            def render():
+                # Richieste bar attive, più recenti in cima (già in ordine nell'archivio)
+                active_requests, _ = self.bar_requests.page()
+                return render_template('bar_manager.html', requests=active_requests)
+            
+            return self.pages.get(('bar-manager', self.bar_requests.version), render).response(request)
 
 
         # Endpoint per gestire le richieste bar tramite scansione QR
@@ -627,153 +754,40 @@ class PokerTimerServer(QObject):
         def qr_bar_request(table_number):
             """Gestisce le richieste bar provenienti dalla scansione di un codice QR"""
             
-            # Log della richiesta
-            logger.info(f"Ricevuta richiesta bar via QR per il tavolo {table_number}")
-            
-            # Trova il dispositivo corrispondente a questo tavolo
-            target_device_id = None
-            for device_id, timer in self.timers.items():
-                if timer.get('table_number') == table_number:
-                    target_device_id = device_id
-                    break
-            
-            if target_device_id:
-                # Aggiorna il timestamp della richiesta bar
-                self.timers[target_device_id]['bar_service_timestamp'] = int(time.time() * 1000)  # timestamp in millisecondi
-                
-                # Emetti il segnale per aggiornare l'interfaccia
-                self.timer_updated.emit(target_device_id)
-            
-            # Genera un ID univoco per la richiesta
-            request_id = f"bar_qr_{table_number}_{int(time.time())}"
-            
-            # Aggiungi alla lista delle richieste
-            bar_request = {
-                "id": request_id,
-                "table_number": table_number,
-                "timestamp": int(time.time() * 1000),
-                "source": "qr_code"  # Indica che la richiesta proviene da un codice QR
-            }
-            self.bar_requests.append(bar_request)
+            # Prefetch del browser e anteprime dei link non sono scansioni: nessuna
+            # richiesta registrata e una risposta che non può essere riutilizzata,
+            # così la navigazione vera torna al server
+            if is_prefetch(request):
+                response = Response(status=503)
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+            
+            # La pagina dipende solo dal tavolo (ora e rilevamento del telefono sono nel browser)
+            page = self.pages.get(('qr-bar-request', table_number),
+                                  lambda: render_template('qr_bar_request.html', table_number=table_number))
+            if request.method == 'HEAD':
+                return page.response(request)
+            
+            # Registra la richiesta (source indica che proviene da un codice QR). Il cookie
+            # del tavolo fa da chiave di idempotenza: ricaricamenti e ritrasmissioni dello
+            # stesso telefono restituiscono la richiesta già registrata; una nuova scansione
+            # dello stesso tavolo entro la finestra è un duplicato
+            cookie_name = f"bar_request_{table_number}"
+            request_id = self.bar_requests.new_id(f"bar_qr_{table_number}")
+            token = request.cookies.get(cookie_name) or request_id
+            bar_request, created = self._add_bar_request(
+                table_number, request_id, source="qr_code", idempotency_key=f"qr:{table_number}:{token}")
+            if created:
+                logger.info(f"Ricevuta richiesta bar via QR per il tavolo {table_number}")
             
             # Emetti il segnale per la notifica
             #self.bar_service_notification.emit(table_number)
             
-            # Determina se la richiesta proviene da un browser mobile
-            user_agent = request.headers.get('User-Agent', '').lower()
-            is_mobile = 'mobile' in user_agent or 'android' in user_agent or 'iphone' in user_agent or 'ipad' in user_agent
-            
-            # Pagina HTML di conferma migliorata (senza il bottone Stato Server)
-            html_response = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Richiesta Bar Inviata</title>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        padding: 20px;
-                        max-width: 500px;
-                        margin: 0 auto;
-                        text-align: center;
-                        background-color: #f5f5f5;
-                        color: #333;
-                    }}
-                    .container {{
-                        background-color: white;
-                        border-radius: 10px;
-                        padding: 30px;
-                        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                    }}
-                    h1 {{
-                        color: #4CAF50;
-                        margin-top: 0;
-                    }}
-                    .icon {{
-                        font-size: 60px;
-                        margin-bottom: 20px;
-                        animation: bounce 1.5s ease infinite;
-                    }}
-                    .message {{
-                        font-size: 18px;
-                        margin-bottom: 30px;
-                        line-height: 1.5;
-                    }}
-                    .table-number {{
-                        font-weight: bold;
-                        font-size: 24px;
-                        color: #FF9800;
-                    }}
-                    .timer {{
-                        margin-top: 20px;
-                        font-size: 14px;
-                        color: #777;
-                    }}
-                    .count {{
-                        font-weight: bold;
-                        color: #2196F3;
-                    }}
-                    .success-badge {{
-                        display: inline-block;
-                        background-color: #4CAF50;
-                        color: white;
-                        padding: 8px 16px;
-                        border-radius: 20px;
-                        font-weight: bold;
-                        margin-bottom: 20px;
-                        animation: fadeIn 0.5s ease;
-                    }}
-                    @keyframes fadeIn {{
-                        from {{ opacity: 0; transform: translateY(-10px); }}
-                        to {{ opacity: 1; transform: translateY(0); }}
-                    }}
-                    @keyframes bounce {{
-                        0%, 20%, 50%, 80%, 100% {{ transform: translateY(0); }}
-                        40% {{ transform: translateY(-20px); }}
-                        60% {{ transform: translateY(-10px); }}
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="success-badge">Richiesta Inviata</div>
-                    <div class="icon">🍹</div>
-                    <h1>Il servizio bar è in arrivo!</h1>
-                    <div class="message">
-                        La tua richiesta per il tavolo <span class="table-number">{table_number}</span> è stata registrata.
-                        <br><br>
-                        Un addetto al servizio bar sarà da te al più presto.
-                    </div>
-                    <div class="timer">
-                        Richiesta inviata alle <span class="count">{time.strftime('%H:%M:%S')}</span>
-                    </div>
-                </div>
-                <script>
-                    // Vibra il dispositivo mobile se supportato
-                    if ('vibrate' in navigator) {{
-                        navigator.vibrate(200);
-                    }}
-                    
-                    // Auto-chiusura dopo 10 secondi per dispositivi mobili
-                    if ({str(is_mobile).lower()}) {{
-                        setTimeout(function() {{
-                            // Mostra messaggio di chiusura
-                            document.querySelector('.timer').innerHTML += '<br>Questa pagina si chiuderà automaticamente...';
-                            
-                            // Chiudi dopo un ulteriore secondo
-                            setTimeout(function() {{
-                                window.close();
-                            }}, 1000);
-                        }}, 10000);
-                    }}
-                </script>
-            </body>
-            </html>
-            """
-            
-            return Response(html_response, mimetype='text/html')
+            response = page.response(request)
+            if token == request_id:
+                response.set_cookie(cookie_name, token, max_age=int(self.bar_requests.idempotency_ttl),
+                                    path=request.path, httponly=True, samesite='Lax')
+            return response
 
         # Endpoint per la verifica dello stato del server (utile per testare che tutto funzioni)
         @self.app.route('/qr/status')
@@ -784,82 +798,21 @@ class PokerTimerServer(QObject):
             active_requests = len(self.bar_requests)
             
             # Conta i timer online
-            online_timers = 0
-            for device_id, timer in self.timers.items():
-                if self.is_timer_online(timer):
-                    online_timers += 1
+            online_timers, _ = self.presence.counts()
             
             uptime = time.time() - self.start_time
             uptime_hours = int(uptime // 3600)
             uptime_minutes = int((uptime % 3600) // 60)
             
-            # Pagina HTML di stato
-            html_response = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Stato Server QR Bar</title>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        padding: 20px;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        text-align: center;
-                        background-color: #f5f5f5;
-                        color: #333;
-                    }}
-                    .container {{
-                        background-color: white;
-                        border-radius: 10px;
-                        padding: 30px;
-                        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                    }}
-                    h1 {{
-                        color: #2196F3;
-                        margin-top: 0;
-                    }}
-                    .status-item {{
-                        margin: 15px 0;
-                        font-size: 18px;
-                    }}
-                    .status-value {{
-                        font-weight: bold;
-                        color: #4CAF50;
-                    }}
-                    .footer {{
-                        margin-top: 30px;
-                        font-size: 14px;
-                        color: #666;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h1>Stato Server QR Bar</h1>
-                    <div class="status-item">
-                        Stato: <span class="status-value">Attivo</span>
-                    </div>
-                    <div class="status-item">
-                        Timer connessi: <span class="status-value">{online_timers}</span>
-                    </div>
-                    <div class="status-item">
-                        Richieste bar attive: <span class="status-value">{active_requests}</span>
-                    </div>
-                    <div class="status-item">
-                        Uptime: <span class="status-value">{uptime_hours}h {uptime_minutes}m</span>
-                    </div>
-                    <div class="footer">
-                        Poker Timer QR Bar Service
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            return Response(html_response, mimetype='text/html')
+            values = {
+                "online_timers": online_timers,
+                "active_requests": active_requests,
+                "uptime_hours": uptime_hours,
+                "uptime_minutes": uptime_minutes,
+            }
+            page = self.pages.get(('qr-status',) + tuple(values.values()),
+                                  lambda: render_template('qr_status.html', **values))
+            return page.response(request)
 
         @self.app.route('/api/bar_service_request', methods=['POST'])
         def bar_service_request():
@@ -867,32 +820,19 @@ class PokerTimerServer(QObject):
             table_number = request_data.get('table_number')
             timestamp = request_data.get('timestamp')
             
-            logger.info(f"Ricevuta richiesta servizio bar dal tavolo {table_number}")
-            
-            # Trova il dispositivo corrispondente a questo tavolo
-            target_device_id = None
-            for device_id, timer in self.timers.items():
-                if timer.get('table_number') == table_number:
-                    target_device_id = device_id
-                    break
+            # Chiave di idempotenza: l'header Idempotency-Key oppure il timestamp del
+            # timer, che resta lo stesso quando il timer ritrasmette la richiesta
+            idempotency_key = request.headers.get('Idempotency-Key')
+            if idempotency_key:
+                idempotency_key = f"key:{idempotency_key}"
+            elif timestamp is not None:
+                idempotency_key = f"timer:{table_number}:{timestamp}"
             
-            if target_device_id:
-                # Aggiungi il timestamp della richiesta bar
-                self.timers[target_device_id]['bar_service_timestamp'] = int(time.time() * 1000)  # timestamp in millisecondi
-                
-                # Emetti il segnale per aggiornare l'interfaccia
-                self.timer_updated.emit(target_device_id)
-            
-            # Genera un ID univoco per la richiesta
-            request_id = f"bar_{table_number}_{timestamp}"
-            
-            # Aggiungi alla lista delle richieste
-            bar_request = {
-                "id": request_id,
-                "table_number": table_number,
-                "timestamp": timestamp
-            }
-            self.bar_requests.append(bar_request)
+            bar_request, created = self._add_bar_request(
+                table_number, self.bar_requests.new_id(f"bar_{table_number}"), timestamp,
+                idempotency_key=idempotency_key)
+            if created:
+                logger.info(f"Ricevuta richiesta servizio bar dal tavolo {table_number}")
             
             # Emetti il segnale per la notifica
             #self.bar_service_notification.emit(table_number)
@@ -900,122 +840,190 @@ class PokerTimerServer(QObject):
             return jsonify({
                 "status": "success",
                 "message": f"Richiesta bar registrata per tavolo {table_number}",
-                "request_id": request_id
+                "request_id": bar_request["id"],
+                "duplicate": not created
             })
 
         
-        # API per ottenere le richieste bar
+        # API per ottenere le richieste bar: senza parametri la lista completa in ordine
+        # di arrivo (formato usato dall'app Android), con limit/offset/order/table una pagina
         @self.app.route('/api/bar_requests', methods=['GET'])
         def get_bar_requests():
-            return jsonify(self.bar_requests)
+            paged = any(name in request.args for name in ('limit', 'offset', 'order', 'table'))
+            if not paged:
+                requests_list, _ = self.bar_requests.page(newest_first=False)
+                return jsonify(requests_list)
+            
+            limit = request.args.get('limit', BAR_REQUESTS_PAGE_SIZE, type=int)
+            offset = request.args.get('offset', 0, type=int)
+            newest_first = request.args.get('order', 'newest') != 'oldest'
+            table_number = request.args.get('table')
+            limit = max(1, min(limit, BAR_REQUESTS_MAX_PAGE_SIZE))
+            offset = max(0, offset)
+            
+            requests_list, total = self.bar_requests.page(offset, limit, newest_first, table_number)
+            return jsonify({
+                "requests": requests_list,
+                "total": total,
+                "offset": offset,
+                "limit": limit,
+                "next_offset": offset + limit if offset + limit < total else None,
+                "stats": self.bar_requests.stats()
+            })
         
         # API per completare una richiesta bar
         @self.app.route('/api/bar_requests/<request_id>/complete', methods=['POST'])
         def complete_bar_request(request_id):
-            # Trova e rimuovi la richiesta
-            self.bar_requests = [r for r in self.bar_requests if r['id'] != request_id]
-            
-            logger.info(f"Richiesta bar {request_id} completata")
+            # Rimuove la richiesta; completarla due volte non è un errore
+            if self.bar_requests.complete(request_id) is not None:
+                self._bar_requests_changed()
+                self.events.publish('bar_request_completed', {"id": request_id})
+                logger.info(f"Richiesta bar {request_id} completata")
             
             return jsonify({
                 "status": "success",
                 "message": "Richiesta completata"
             })
     
-    def run_discovery_service(self):
-        """Esegue il servizio di discovery UDP per consentire ai client di trovare il server"""
-        self.discovery_running = True
-        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    def _on_discovery_request(self, address, accepted):
+        """Contabilizza le richieste di discovery (chiamata dal thread di discovery)"""
+        self.metrics.mark('discovery_packets')
+        self.discovery_activity.record('discovery' if accepted else 'discovery_limited', address[0],
+                                       "Richiesta discovery da %s:%s", address[0], address[1])
+    
+    def _discovery_beacon(self):
+        """Payload del beacon: porta HTTP, id dell'istanza e timer online come indice di carico"""
+        self.metrics.mark('discovery_beacons')
+        online, _ = self.presence.counts()
+        return format_beacon(self.port, self.timers.epoch, online)
+    
+    def _add_bar_request(self, table_number, request_id, timestamp=None, source=None, idempotency_key=None):
+        """Registra una richiesta bar e avvisa timer e dashboard. Restituisce (richiesta, creata)"""
+        version = self.bar_requests.version
+        bar_request, created = self.bar_requests.add(table_number, request_id, timestamp, source, idempotency_key)
+        if not created:
+            # Una ritrasmissione con la stessa chiave non modifica nulla: niente da salvare
+            if self.bar_requests.version != version:
+                logger.info(f"Richiesta bar ripetuta dal tavolo {table_number}: unita a {bar_request['id']}")
+                self._bar_requests_changed()
+            else:
+                logger.debug(f"Richiesta bar ritrasmessa dal tavolo {table_number}: {bar_request['id']}")
+            return bar_request, False
         
-        try:
-            self.udp_socket.bind(('', self.discovery_port))
-            logger.info(f"Servizio discovery in ascolto sulla porta UDP {self.discovery_port}")
-            
-            # Imposta il socket per il broadcast
-            self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            
-            while self.discovery_running:
-                try:
-                    data, addr = self.udp_socket.recvfrom(1024)
-                    message = data.decode('utf-8').strip()
-                    
-                    logger.info(f"Richiesta discovery ricevuta: {message} da {addr[0]}:{addr[1]}")
-                    
-                    # Verifica che sia una richiesta di discovery del Poker Timer
-                    if message == "POKER_TIMER_DISCOVERY":
-                        logger.info(f"Invio risposta discovery a {addr[0]}:{addr[1]}")
-                        
-                        # Invia una risposta con le informazioni del server
-                        response = "POKER_TIMER_SERVER".encode('utf-8')
-                        
-                        # Prima risposta immediata
-                        self.udp_socket.sendto(response, addr)
-                        logger.info(f"Prima risposta discovery inviata con successo a {addr[0]}:{addr[1]}")
-                        
-                        # Seconda risposta dopo 100ms per aumentare le probabilità di ricezione
-                        time.sleep(0.1)
-                        self.udp_socket.sendto(response, addr)
-                        logger.info(f"Seconda risposta discovery inviata con successo a {addr[0]}:{addr[1]}")
-                        
-                except Exception as e:
-                    logger.error(f"Errore nel servizio discovery: {e}")
-                    # Continua l'esecuzione anche in caso di errore
+        # Aggiorna il timestamp della richiesta bar sul timer del tavolo (in millisecondi)
+        target_device_id = self.find_device_by_table(table_number)
+        if target_device_id and self.timers.update(target_device_id, {'bar_service_timestamp': int(time.time() * 1000)}):
+            # Emetti il segnale per aggiornare l'interfaccia
+            self._notify_timer_updated(target_device_id)
         
+        self._bar_requests_changed()
+        self.events.publish('bar_request', bar_request)
+        return bar_request, True
+    
+    def _bar_requests_changed(self):
+        if self.persistence:
+            self.persistence.mark_bar_requests()
+    
+    def start_persistence(self):
+        """Ripristina lo stato salvato e avvia il salvataggio su disco"""
+        if not self.state_path:
+            return
+        persistence = StatePersistence(self.state_path, self.timers, self.command_queue,
+                                       self.bar_requests.to_list)
+        try:
+            persistence.open()
+            self.bar_requests.load(persistence.load())
+            self._restore_presence()
         except Exception as e:
-            logger.error(f"Errore nell'inizializzazione del servizio discovery: {e}")
-        finally:
-            if self.udp_socket:
-                self.udp_socket.close()
-                logger.info("Socket discovery chiuso")
+            # Database illeggibile: il server funziona comunque, ma solo in memoria
+            logger.error(f"Errore nel ripristino dello stato da {self.state_path}: {e}")
+            persistence.close(flush=False)
+            return
+        persistence.start()
+        self.persistence = persistence
+    
+    def _restore_presence(self):
+        """Riporta nel PresenceTracker i timer ripristinati, con l'età del loro ultimo aggiornamento"""
+        now = time.time()
+        for device_id, timer_data in self.timers.items():
+            try:
+                last_update = datetime.datetime.fromisoformat(timer_data.get('last_update', ''))
+            except (TypeError, ValueError):
+                continue
+            self.presence.touch(device_id, age=now - last_update.timestamp())
+    
+    def stop_persistence(self):
+        """Salva le ultime modifiche e chiude il database"""
+        if self.persistence:
+            self.persistence.close()
+            self.persistence = None
     
     def start_discovery_service(self):
-        """Avvia il servizio di discovery in un thread separato"""
-        self.discovery_thread = threading.Thread(target=self.run_discovery_service)
-        self.discovery_thread.daemon = True
-        self.discovery_thread.start()
-        logger.info("Thread del servizio discovery avviato")
+        """Avvia il servizio di discovery UDP per consentire ai client di trovare il server"""
+        self.discovery = DiscoveryResponder(
+            self.discovery_port,
+            reply=format_reply(self.port, self.timers.epoch),
+            sockets=self.discovery_sockets,
+            announce=self.discovery_announce,
+            on_request=self._on_discovery_request,
+            beacon=self._discovery_beacon if self.discovery_beacon else None,
+            beacon_interval=self.beacon_interval
+        )
+        try:
+            self.discovery.start()
+        except OSError as e:
+            # Come in passato il server HTTP parte comunque: i timer possono usare l'indirizzo salvato
+            logger.error(f"Errore nell'inizializzazione del servizio discovery: {e}")
+            self.discovery = None
     
     def stop_discovery_service(self):
         """Ferma il servizio di discovery"""
-        self.discovery_running = False
-        if self.udp_socket:
-            try:
-                # Chiudi il socket per interrompere il recvfrom
-                self.udp_socket.close()
-            except Exception as e:
-                logger.error(f"Errore nella chiusura del socket discovery: {e}")
-        
-        if self.discovery_thread and self.discovery_thread.is_alive():
-            try:
-                self.discovery_thread.join(timeout=1.0)  # Attendi al massimo 1 secondo
-            except Exception as e:
-                logger.error(f"Errore nell'arresto del thread discovery: {e}")
-        
-        logger.info("Servizio discovery fermato")
+        if self.discovery:
+            self.discovery.stop()
+            self.discovery = None
     
     def start_server(self):
-        """Avvia il server Flask in un thread separato"""
-        def run_flask():
-            self.app.run(host='0.0.0.0', port=self.port, debug=False, use_reloader=False)
-        
-        self.server_thread = threading.Thread(target=run_flask)
-        self.server_thread.daemon = True
-        self.server_thread.start()
-        logger.info(f"Server Flask avviato su porta {self.port}")
+        """Avvia il server HTTP con il backend configurato"""
+        self.http_backend = create_backend(
+            self.serving_backend, self.app, '0.0.0.0', self.port, **self.serving_options
+        )
+        self.http_backend.start()
+        self.long_poll_slots = threading.BoundedSemaphore(self.http_backend.max_blocking_requests())
+        self.event_stream_limit = self.http_backend.max_event_streams()
+        self.event_stream_slots = threading.BoundedSemaphore(self.event_stream_limit)
+        self._event_streams_full = False
+        logger.info(f"Server Flask avviato su porta {self.port} (backend: {self.http_backend.name})")
+    
+    def stop_server(self):
+        """Ferma il server HTTP"""
+        # Sblocca i long-poll e i flussi di eventi in corso, altrimenti il backend attende la loro scadenza
+        self.command_notifier.close()
+        self.events.close()
+        if self.http_backend:
+            self.http_backend.stop()
+            self.http_backend = None
     
     def start(self):
         """Avvia il server e il servizio di discovery"""
         self.start_time = time.time()
+        self.start_persistence()
         self.start_discovery_service()
-        self.start_server()
+        try:
+            self.start_server()
+        except Exception:
+            # Porta occupata o backend non valido: non lasciare attivi discovery e salvataggio
+            self.stop_discovery_service()
+            self.stop_persistence()
+            raise
         logger.info("Server Poker Timer avviato completamente")
     
     def stop(self):
         """Ferma il server"""
         self.stop_discovery_service()
-        # Il server Flask non può essere fermato facilmente, ma essendo in un thread
-        # demone, terminerà quando l'applicazione si chiude
+        self.stop_server()
+        self.stop_persistence()
+        self.status_activity.flush()
+        self.discovery_activity.flush()
         logger.info("Server Poker Timer fermato")
     
     def send_command(self, device_id, command):
@@ -1024,53 +1032,175 @@ class PokerTimerServer(QObject):
             logger.error(f"Timer {device_id} non trovato")
             return False
         
-        logger.info(f"Invio comando {command} a {device_id}")
-        self.timers[device_id]['pending_command'] = command
+        command_logger.info(f"Invio comando {command} a {device_id}")
         
         # La risposta effettiva avverrà quando il timer invierà la prossima richiesta
-        return True
+        return self._queue_command(device_id, command) is not None
+    
+    def _queue_command(self, device_id, command, settings=None):
+        """Accoda un comando, aggiorna pending_command e risveglia i long-poll. Restituisce il seq"""
+        seq = self.command_queue.push(device_id, command, settings)
+        if seq is None:
+            return None
+        self._refresh_pending_command(device_id)
+        self.command_notifier.notify(device_id)
+        return seq
+    
+    def _take_command(self, device_id, timer):
+        """Preleva dalla coda il comando da consegnare, aggiornando il timer (copia in modifica)"""
+        command_data = self.command_queue.take(device_id)
+        self._set_pending_command(device_id, timer)
+        
+        if not command_data:
+            return {}
+        
+        if 'settings' in command_data:
+            command_logger.info(f"Invio nuove impostazioni a {device_id}: {command_data['settings']}")
+        
+        command_logger.info(f"Inviato comando {command_data['command']} (seq {command_data['command_seq']}) a {device_id}")
+        return command_data
+    
+    def take_pending_command(self, device_id):
+        """Preleva il comando da consegnare a un timer. Restituisce None se non ce ne sono"""
+        if not self.command_queue.depth(device_id):
+            return None
+        try:
+            with self.timers.edit(device_id) as timer:
+                command_data = self._take_command(device_id, timer)
+        except KeyError:
+            return None
+        return command_data or None
+    
+    def _set_pending_command(self, device_id, timer):
+        """Riporta nel timer il comando in testa alla coda (usato dalle dashboard per le icone)"""
+        head = self.command_queue.peek_command(device_id)
+        if head:
+            timer['pending_command'] = head
+        else:
+            timer.pop('pending_command', None)
+    
+    def _refresh_pending_command(self, device_id):
+        """Come _set_pending_command, modificando il timer solo se il valore è cambiato"""
+        timer = self.timers.get(device_id)
+        if timer is None or timer.get('pending_command') == self.command_queue.peek_command(device_id):
+            return
+        try:
+            with self.timers.edit(device_id) as timer:
+                self._set_pending_command(device_id, timer)
+        except KeyError:
+            pass
+    
+    @staticmethod
+    def _parse_seq(value):
+        """Converte un numero di sequenza ricevuto dal dispositivo. None se assente o non valido"""
+        if value is None or isinstance(value, bool):
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    
+    def _full_timers_body(self):
+        """(versione, JSON) dello stato completo, serializzato una sola volta per versione"""
+        cached = self._timers_body_cache
+        if cached is None or cached[0] != self.timers.version:
+            version, snapshot = self.timers.versioned_snapshot()
+            cached = self._timers_body_cache = (version, self.app.json.dumps(snapshot))
+        return cached
+    
+    def _timers_response(self, response, version):
+        """Aggiunge ETag e intestazioni di versione alle risposte di /api/timers"""
+        response.set_etag(f"{self.timers.epoch}-{version}")
+        response.headers['X-Timers-Version'] = str(version)
+        response.headers['X-Timers-Epoch'] = self.timers.epoch
+        # I browser devono sempre rivalidare (If-None-Match) invece di usare la cache
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    def _notify_timer_updated(self, device_id, connected=False):
+        """Segnala all'interfaccia e alle dashboard che un timer è cambiato"""
+        self.signal_batcher.mark(device_id, connected)
+        self.events.publish('timer', {
+            "device_id": device_id,
+            "connected": connected,
+            "version": self.timers.version,
+            "timer": self.timers.get(device_id)
+        })
+    
+    def _on_signal_batch(self, updated, connected):
+        # Un solo segnale Qt per gruppo, qualunque sia il numero di timer cambiati
+        self.metrics.mark('qt_signals', 'timers_batch')
+    
+    def _notify_seats(self, table_number, seats):
+        """Segnala una richiesta di posti liberi"""
+        self.seat_notification.emit(table_number, seats)
+        self.metrics.mark('qt_signals', 'seat_notification')
+        self.events.publish('seat', {"table_number": table_number, "open_seats": seats})
+    
+    def _notify_floorman(self, table_number):
+        """Segnala una chiamata floorman"""
+        self.floorman_notification.emit(table_number)
+        self.metrics.mark('qt_signals', 'floorman_notification')
+        self.events.publish('floorman', {"table_number": table_number})
+    
+    def collect_gauges(self):
+        """Valori istantanei per /api/metrics"""
+        online, offline = self.presence.counts()
+        return {
+            "uptime_seconds": round(time.time() - self.start_time, 1),
+            "timers_registered": len(self.timers),
+            "timers_online": online,
+            "timers_offline": offline,
+            "timers_version": self.timers.version,
+            "command_queue_depth": self.command_queue.depth(),
+            "bar_requests_pending": len(self.bar_requests),
+            "bar_requests_overdue": self.bar_requests.stats()["overdue"],
+            "event_subscribers": self.events.subscriber_count(),
+            "event_stream_limit": self.event_stream_limit,
+            "long_poll_waiting": self.command_notifier.waiting_count(),
+            "telemetry_devices": len(self.telemetry.devices()),
+            "telemetry_bytes": self.telemetry.nbytes(),
+            "qt_batch_pending": self.signal_batcher.depth(),
+            "qt_batch_max_pending": self.signal_batcher.max_depth,
+            "qt_batches": self.signal_batcher.batches,
+            "qt_updates_coalesced": self.signal_batcher.marked - self.signal_batcher.delivered - self.signal_batcher.depth(),
+            "rate_limit_clients": len(self.rate_limiter),
+            "rate_limited_total": self.rate_limiter.rejected,
+        }
+    
+    def find_device_by_table(self, table_number):
+        """Restituisce il device_id del timer associato a un tavolo (o None)"""
+        return self.timers.find_by_table(table_number)
     
     def reset_seat_info(self, device_id):
         """Resetta le informazioni sui posti per un timer"""
-        if device_id not in self.timers:
-            return False
-        
-        if 'seat_info' in self.timers[device_id]:
-            del self.timers[device_id]['seat_info']
+        if 'seat_info' in self.timers.pop_fields(device_id, 'seat_info'):
             logger.info(f"Informazioni sui posti rimosse per device {device_id}")
-            self.timer_updated.emit(device_id)
+            self._notify_timer_updated(device_id)
             return True
         
         return False
     
     def update_settings(self, device_id, settings):
         """Aggiorna le impostazioni di un timer"""
-        if device_id not in self.timers:
-            self.timers[device_id] = {}
-        
-        # Aggiorna i valori specifici del timer
-        self.timers[device_id]['mode'] = settings.get('mode')
-        self.timers[device_id]['t1_value'] = settings.get('t1')
-        self.timers[device_id]['t2_value'] = settings.get('t2')
-        self.timers[device_id]['table_number'] = settings.get('tableNumber')
-        self.timers[device_id]['buzzer'] = settings.get('buzzer')
-        self.timers[device_id]['players_count'] = settings.get('playersCount')
+        # Crea il timer se non esiste e aggiorna i valori specifici
+        with self.timers.edit(device_id, create=True) as timer:
+            timer['mode'] = settings.get('mode')
+            timer['t1_value'] = settings.get('t1')
+            timer['t2_value'] = settings.get('t2')
+            timer['table_number'] = settings.get('tableNumber')
+            timer['buzzer'] = settings.get('buzzer')
+            timer['players_count'] = settings.get('playersCount')
         
-        # Imposta il comando in sospeso
-        self.timers[device_id]['pending_command'] = "settings"
-        self.timers[device_id]['pending_settings'] = settings
+        # Accoda le impostazioni da inviare al timer
+        if self._queue_command(device_id, "settings", settings) is None:
+            return False
         
         # Emetti il segnale per aggiornare l'interfaccia
-        self.timer_updated.emit(device_id)
+        self._notify_timer_updated(device_id)
         
         return True
     
-    def is_timer_online(self, timer_data):
-        """Controlla se un timer è considerato online in base al timestamp"""
-        try:
-            last_update = datetime.datetime.fromisoformat(timer_data.get('last_update', ''))
-            now = datetime.datetime.now()
-            # Timer considerato online se aggiornato negli ultimi 3 minuti
-            return (now - last_update).total_seconds() < 180  # 3 minuti = 180 secondi
-        except Exception:
-            return False
\ No newline at end of file
+    def is_timer_online(self, device_id):
+        """Controlla se un timer è considerato online (aggiornato negli ultimi 3 minuti)"""
+        return self.presence.is_online(device_id)
\ No newline at end of file
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Logging del server: scrittura asincrona, livelli per sottosistema e riepiloghi
+
+I messaggi vengono accodati da un QueueHandler e scritti da un thread
+separato (QueueListener), così le richieste HTTP non attendono l'I/O del log.
+Gli eventi ripetitivi dei percorsi caldi (aggiornamenti di stato, richieste
+di discovery, ...) non vengono scritti uno per uno: ActivityLog li conta per
+dispositivo e scrive un riepilogo periodico, mentre il dettaglio dei singoli
+eventi resta disponibile a livello DEBUG.
+
+I livelli dei sottosistemi si impostano con la variabile d'ambiente
+POKER_TIMER_LOG, ad esempio "INFO" oppure "INFO,status=DEBUG,http=INFO".
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_ENV_VAR = 'POKER_TIMER_LOG'
+SUMMARY_INTERVAL = 60  # Secondi tra due riepiloghi dell'attività
+
+# Sottosistemi configurabili -> nome del logger
+SUBSYSTEMS = {
+    'server': 'poker_timer',
+    'status': 'poker_timer.status',        # Aggiornamenti di stato dei timer
+    'commands': 'poker_timer.commands',    # Comandi accodati e consegnati
+    'discovery': 'poker_timer.discovery',  # Servizio di discovery UDP
+    'http': 'werkzeug',                    # Log di accesso del server Werkzeug
+}
+
+# Il log di accesso di Werkzeug scrive una riga per ogni richiesta
+DEFAULT_LEVELS = {
+    'http': logging.WARNING,
+}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def get_logger(subsystem):
+    """Restituisce il logger di un sottosistema"""
+    return logging.getLogger(SUBSYSTEMS.get(subsystem, subsystem))
+
+
+def parse_levels(spec):
+    """Interpreta una specifica come "INFO,status=DEBUG"
+
+    Restituisce (livello generale o None, dict sottosistema -> livello).
+    Le voci non valide vengono ignorate.
+    """
+    default = None
+    levels = {}
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, level_name = item.rpartition('=')
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            continue
+        if name:
+            levels[name.strip()] = level
+        else:
+            default = level
+    return default, levels
+
+
+def configure_logging(level=logging.INFO, levels=None, handlers=None):
+    """Configura il logging asincrono del processo (solo alla prima chiamata)
+
+    levels sovrascrive i livelli predefiniti dei sottosistemi; la variabile
+    d'ambiente POKER_TIMER_LOG ha la precedenza su entrambi.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        if handlers is None:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers = [handler]
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+        env_level, env_levels = parse_levels(os.environ.get(LOG_ENV_VAR))
+        root.setLevel(env_level if env_level is not None else level)
+
+        subsystem_levels = dict(DEFAULT_LEVELS)
+        subsystem_levels.update(levels or {})
+        subsystem_levels.update(env_levels)
+        for subsystem, subsystem_level in subsystem_levels.items():
+            get_logger(subsystem).setLevel(subsystem_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Scrive i messaggi ancora in coda e ferma il thread di logging"""
+    global _listener
+    with _configure_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+class ActivityLog:
+    """Conta gli eventi frequenti per dispositivo e ne scrive un riepilogo periodico
+
+    record() costa un incremento sotto lock; il riepilogo viene scritto dalla
+    prima chiamata successiva allo scadere dell'intervallo, oppure da flush().
+    """
+
+    def __init__(self, logger, interval=SUMMARY_INTERVAL, clock=time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counts = {}  # evento -> {chiave (es. device_id): conteggio} nell'intervallo corrente
+        self._totals = {}  # evento -> conteggio dall'avvio
+        self._window_start = clock()
+
+    def record(self, event, key=None, msg=None, *args):
+        """Conta un evento; il dettaglio (msg % args) viene formattato e scritto solo a livello DEBUG"""
+        if msg is not None:
+            self.logger.debug(msg, *args)
+
+        now = self._clock()
+        with self._lock:
+            per_key = self._counts.get(event)
+            if per_key is None:
+                per_key = self._counts[event] = {}
+            per_key[key] = per_key.get(key, 0) + 1
+            self._totals[event] = self._totals.get(event, 0) + 1
+            if now - self._window_start < self.interval:
+                return
+            counts, elapsed = self._swap(now)
+        self._log_summary(counts, elapsed)
+
+    def flush(self):
+        """Scrive subito il riepilogo dell'intervallo corrente"""
+        with self._lock:
+            counts, elapsed = self._swap(self._clock())
+        self._log_summary(counts, elapsed)
+
+    def totals(self):
+        """Conteggi per evento dall'avvio"""
+        with self._lock:
+            return dict(self._totals)
+
+    def _swap(self, now):
+        counts, elapsed = self._counts, now - self._window_start
+        self._counts = {}
+        self._window_start = now
+        return counts, elapsed
+
+    def _log_summary(self, counts, elapsed):
+        if not counts or not self.logger.isEnabledFor(logging.INFO):
+            return
+        parts = []
+        for event in sorted(counts):
+            per_key = counts[event]
+            part = f"{event}={sum(per_key.values())}"
+            keys = [key for key in per_key if key is not None]
+            if keys:
+                busiest = max(keys, key=per_key.get)
+                part += f" sorgenti={len(keys)} max={busiest}:{per_key[busiest]}"
+            parts.append(part)
+        self.logger.info(f"Attività ultimi {elapsed:.0f}s: " + "; ".join(parts))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Backend di esecuzione HTTP per il Poker Timer Server
+
+Permette di servire l'app Flask con un server WSGI di produzione (waitress,
+pool di thread fisso, keep-alive e limiti sulle connessioni) oppure con il
+server Werkzeug in modalità threaded quando waitress non è installato.
+Entrambi i backend si avviano e si fermano in modo pulito.
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger('poker_timer')
+
+# Cerca di importare waitress (opzionale)
+try:
+    from waitress.server import create_server as create_waitress_server
+    from waitress import wasyncore
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+# Valori predefiniti per i backend
+DEFAULT_THREADS = 16            # Thread del pool di lavoro
+DEFAULT_CONNECTION_LIMIT = 500  # Connessioni contemporanee accettate
+DEFAULT_BACKLOG = 1024          # Coda di connessioni in attesa di accept()
+DEFAULT_KEEPALIVE_TIMEOUT = 30  # Secondi prima di chiudere una connessione keep-alive inattiva
+DEFAULT_MAX_BLOCKING = 128      # Long-poll dei timer in attesa di comandi (un thread ciascuno)
+DEFAULT_MAX_EVENT_STREAMS = 32  # Dashboard collegate a /api/events (un thread ciascuna)
+
+
+class ServingBackend(ABC):
+    """Interfaccia comune dei backend HTTP"""
+    name = None
+
+    def __init__(self, app, host, port, threads=DEFAULT_THREADS,
+                 connection_limit=DEFAULT_CONNECTION_LIMIT, backlog=DEFAULT_BACKLOG,
+                 keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT, max_long_polls=DEFAULT_MAX_BLOCKING,
+                 max_event_streams=DEFAULT_MAX_EVENT_STREAMS):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.connection_limit = connection_limit
+        self.backlog = backlog
+        self.keepalive_timeout = keepalive_timeout
+        self.max_long_polls = max_long_polls
+        self.event_stream_limit = max_event_streams
+        self.thread = None
+        self._server = None
+        self._stopping = False
+
+    def start(self):
+        """Apre il socket (gli errori di bind vengono sollevati qui) e avvia il thread di servizio"""
+        self._stopping = False
+        self._server = self._create_server()
+        self.thread = threading.Thread(target=self._serve, name=f"http-{self.name}")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Backend HTTP '{self.name}' in ascolto su {self.host}:{self.port}")
+
+    def stop(self, timeout=5.0):
+        """Ferma il server e attende la fine del thread di servizio"""
+        if self._server is None:
+            return
+        self._stopping = True
+        try:
+            self._shutdown_server()
+        except Exception as e:
+            logger.error(f"Errore nell'arresto del backend HTTP '{self.name}': {e}")
+
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+            if self.thread.is_alive():
+                logger.warning(f"Il thread del backend HTTP '{self.name}' non si è fermato entro {timeout}s")
+
+        self._server = None
+        logger.info(f"Backend HTTP '{self.name}' fermato")
+
+    def is_running(self):
+        """Indica se il thread di servizio è attivo"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def max_blocking_requests(self):
+        """Quante richieste possono restare in attesa (long-poll) senza affamare le altre"""
+        return self.max_long_polls
+
+    def max_event_streams(self):
+        """Quanti flussi /api/events (dashboard) possono restare aperti, oltre ai long-poll"""
+        return self.event_stream_limit
+
+    def _serve(self):
+        try:
+            self._run_server()
+        except Exception as e:
+            if not self._stopping:
+                logger.error(f"Errore nel backend HTTP '{self.name}': {e}")
+
+    @abstractmethod
+    def _create_server(self):
+        """Crea il server e apre il socket di ascolto"""
+
+    @abstractmethod
+    def _run_server(self):
+        """Serve le richieste fino all'arresto (nel thread di servizio)"""
+
+    @abstractmethod
+    def _shutdown_server(self):
+        """Chiede al server di fermarsi (da un thread qualsiasi)"""
+
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    """Handler Werkzeug con HTTP/1.1 per riusare le connessioni"""
+    protocol_version = "HTTP/1.1"
+
+
+class WerkzeugBackend(ServingBackend):
+    """Server Werkzeug threaded (un thread per connessione, senza pool)
+
+    Non esiste un pool da dimensionare con threads: il limite è sulle
+    connessioni contemporanee (connection_limit), oltre il quale le nuove
+    connessioni vengono chiuse subito.
+    """
+    name = "werkzeug"
+
+    def _create_server(self):
+        backlog = self.backlog
+        keepalive_timeout = self.keepalive_timeout
+        connection_slots = threading.BoundedSemaphore(self.connection_limit)
+        if self.threads != DEFAULT_THREADS:
+            logger.warning(f"Opzione threads={self.threads} non supportata dal backend werkzeug: "
+                           f"un thread per connessione, al massimo {self.connection_limit}")
+
+        class _Server(ThreadedWSGIServer):
+            request_queue_size = backlog
+            rejected_connections = 0
+
+            def process_request(self, request, client_address):
+                if not connection_slots.acquire(blocking=False):
+                    self.rejected_connections += 1
+                    logger.debug("Connessione da %s rifiutata: limite di connessioni raggiunto", client_address[0])
+                    self.shutdown_request(request)
+                    return
+                try:
+                    super().process_request(request, client_address)
+                except Exception:
+                    connection_slots.release()
+                    raise
+
+            def process_request_thread(self, request, client_address):
+                try:
+                    super().process_request_thread(request, client_address)
+                finally:
+                    connection_slots.release()
+
+        class _Handler(_KeepAliveRequestHandler):
+            timeout = keepalive_timeout
+
+        return _Server(self.host, self.port, self.app, handler=_Handler)
+
+    def _run_server(self):
+        self._server.serve_forever(poll_interval=0.5)
+
+    def _shutdown_server(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class WaitressBackend(ServingBackend):
+    """Server WSGI di produzione basato su waitress"""
+    name = "waitress"
+
+    def _create_server(self):
+        return create_waitress_server(
+            self.app,
+            host=self.host,
+            port=self.port,
+            threads=self.pool_size(),
+            connection_limit=self.connection_limit,
+            backlog=self.backlog,
+            channel_timeout=self.keepalive_timeout,
+            asyncore_loop_timeout=0.5,
+            ident="PokerTimerServer",
+        )
+
+    def _run_server(self):
+        server = self._server
+        try:
+            server.run()
+        finally:
+            # I thread di lavoro si fermano dal thread del loop, dopo la sua uscita
+            server.task_dispatcher.shutdown()
+
+    def pool_size(self):
+        """Thread del pool: threads per le richieste brevi più uno per ogni attesa ammessa"""
+        # Ogni long-poll occupa un thread finché non arriva un comando e ogni dashboard
+        # finché resta aperta: con un thread riservato a ciascuno timer in attesa e
+        # dashboard non tolgono posto a /api/status
+        return self.threads + self.max_long_polls + self.event_stream_limit
+
+    def _shutdown_server(self):
+        # I canali di waitress non sono thread-safe: la chiusura del socket di ascolto
+        # e delle connessioni viene eseguita dal thread del loop (tramite il suo trigger),
+        # che termina appena la mappa dei canali è vuota
+        server = self._server
+        if self.thread is not None and self.thread.is_alive():
+            server.trigger.pull_trigger(lambda: wasyncore.close_all(server._map))
+        else:
+            wasyncore.close_all(server._map)
+
+
+BACKENDS = {
+    WerkzeugBackend.name: WerkzeugBackend,
+    WaitressBackend.name: WaitressBackend,
+}
+
+
+def available_backends():
+    """Restituisce i nomi dei backend utilizzabili in questo ambiente"""
+    names = [WerkzeugBackend.name]
+    if WAITRESS_AVAILABLE:
+        names.insert(0, WaitressBackend.name)
+    return names
+
+
+def create_backend(name, app, host, port, **options):
+    """Crea il backend richiesto ('auto' sceglie waitress se installato)"""
+    if name in (None, "", "auto"):
+        name = WaitressBackend.name if WAITRESS_AVAILABLE else WerkzeugBackend.name
+
+    if name == WaitressBackend.name and not WAITRESS_AVAILABLE:
+        logger.warning("waitress non trovato. Installalo con 'pip install waitress'. Uso il server Werkzeug.")
+        name = WerkzeugBackend.name
+
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Backend HTTP sconosciuto: {name}")
+
+    return backend_class(app, host, port, **options)
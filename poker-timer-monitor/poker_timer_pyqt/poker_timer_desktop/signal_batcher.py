@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Consegna raggruppata all'interfaccia Qt delle modifiche ai timer
+
+Ogni /api/status arriva su un thread di Flask. Emettere un segnale Qt per
+ogni aggiornamento accoda un evento nel ciclo dell'interfaccia: con
+centinaia di aggiornamenti al secondo la coda cresce più in fretta di
+quanto l'interfaccia la smaltisca. SignalBatcher raccoglie invece gli id
+dei timer cambiati in un insieme (più aggiornamenti dello stesso timer
+contano una volta sola) e li consegna con il segnale timers_batch al più
+MAX_BATCH_RATE volte al secondo.
+
+Il thread dell'interfaccia viene svegliato una sola volta quando l'insieme
+passa da vuoto a non vuoto, quindi nella coda degli eventi Qt c'è al più un
+evento in attesa indipendentemente dal numero di aggiornamenti.
+"""
+
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
+
+MAX_BATCH_RATE = 30  # Consegne al secondo al massimo
+
+
+class SignalBatcher(QObject):
+    """Raggruppa gli id dei timer cambiati e li consegna al thread dell'interfaccia"""
+
+    # (timer aggiornati, timer appena registrati), in ordine di prima modifica
+    timers_batch = pyqtSignal(list, list)
+    _wake = pyqtSignal()
+
+    def __init__(self, parent=None, max_rate=MAX_BATCH_RATE, on_flush=None):
+        super().__init__(parent)
+        self.min_interval = 1.0 / max_rate
+        self.on_flush = on_flush  # Chiamata (aggiornati, registrati) a ogni consegna, prima del segnale
+        self._lock = threading.Lock()
+        self._updated = {}    # device_id -> None (insieme ordinato)
+        self._connected = {}
+        self._last_flush = 0.0
+
+        # Statistiche per /api/metrics
+        self.marked = 0       # Modifiche segnalate
+        self.delivered = 0    # Id consegnati (marked - delivered = modifiche riunite)
+        self.batches = 0
+        self.max_depth = 0    # Id in attesa al massimo prima di una consegna
+
+        # Il timer vive nel thread dell'interfaccia, come questo oggetto
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.timeout.connect(self.flush)
+        self._wake.connect(self._schedule_flush)
+
+    def mark(self, device_id, connected=False):
+        """Segnala un timer cambiato (da qualsiasi thread)"""
+        with self._lock:
+            wake = not self._updated and not self._connected
+            if connected:
+                self._connected[device_id] = None
+            else:
+                self._updated[device_id] = None
+            self.marked += 1
+            depth = len(self._updated) + len(self._connected)
+            if depth > self.max_depth:
+                self.max_depth = depth
+        if wake:
+            self._wake.emit()
+
+    def depth(self):
+        """Id in attesa di consegna"""
+        with self._lock:
+            return len(self._updated) + len(self._connected)
+
+    @pyqtSlot()
+    def _schedule_flush(self):
+        if self._flush_timer.isActive():
+            return
+        delay = self._last_flush + self.min_interval - time.monotonic()
+        self._flush_timer.start(max(0, int(delay * 1000)))
+
+    @pyqtSlot()
+    def flush(self):
+        """Consegna gli id raccolti (nel thread dell'interfaccia)"""
+        with self._lock:
+            updated, self._updated = self._updated, {}
+            connected, self._connected = self._connected, {}
+        self._last_flush = time.monotonic()
+        if not updated and not connected:
+            return
+        # Un timer appena registrato non va consegnato anche come aggiornato
+        updated = [device_id for device_id in updated if device_id not in connected]
+        self.batches += 1
+        self.delivered += len(updated) + len(connected)
+        connected = list(connected)
+        if self.on_flush is not None:
+            self.on_flush(updated, connected)
+        self.timers_batch.emit(updated, connected)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Formato binario compatto degli aggiornamenti di stato dei timer
+
+In alternativa al JSON, un timer può inviare a /api/status un pacchetto a
+schema fisso con Content-Type application/x-poker-timer-status. Lo stato di
+un ESP8266 occupa circa 40 byte invece di circa 300, non richiede di comporre
+e formattare stringhe sul microcontrollore e sul server si decodifica con
+una sola struct.unpack, senza passare dal parser JSON.
+
+Layout (little-endian, versione 1):
+
+    offset  tipo    campo
+    0       2s      magic b'PT'
+    2       uint8   versione (1)
+    3       uint8   flag (vedi FLAG_*)
+    4       uint16  table_number
+    6       uint16  current_timer (secondi)
+    8       uint16  t1_value (secondi)
+    10      uint16  t2_value (secondi)
+    12      uint8   mode
+    13      uint8   battery_level (%, 255 = assente)
+    14      uint16  voltage (millivolt, 0 = assente)
+    16      int8    wifi_signal (dBm, valido solo con FLAG_WIFI)
+    17      uint8   players_count
+    18      uint32  ack_seq (valido solo con FLAG_ACK)
+    22      uint8   lunghezza del device_id
+    23      ...     device_id (UTF-8)
+
+Il risultato di decode_status() ha le stesse chiavi del JSON inviato
+dall'Arduino, quindi il server lo elabora esattamente come un JSON.
+"""
+
+import struct
+
+STATUS_CONTENT_TYPE = 'application/x-poker-timer-status'
+STATUS_MAGIC = b'PT'
+STATUS_VERSION = 1
+
+FLAG_RUNNING = 0x01
+FLAG_PAUSED = 0x02
+FLAG_T1_ACTIVE = 0x04
+FLAG_EXPIRED = 0x08
+FLAG_BUZZER = 0x10
+FLAG_WIFI = 0x20         # wifi_signal presente
+FLAG_ACK = 0x40          # ack_seq presente
+FLAG_HAS_T1 = 0x80       # is_t1_active presente (l'Arduino non lo invia)
+
+_HEADER = struct.Struct('<2sBBHHHHBBHbBIB')
+BATTERY_MISSING = 255
+MAX_DEVICE_ID = 255
+
+
+def decode_status(data):
+    """Decodifica un pacchetto di stato. Solleva ValueError se non è valido"""
+    if len(data) < _HEADER.size:
+        raise ValueError("pacchetto di stato troppo corto")
+    (magic, version, flags, table_number, current_timer, t1_value, t2_value, mode,
+     battery, voltage, wifi_signal, players_count, ack_seq, id_length) = _HEADER.unpack_from(data)
+    if magic != STATUS_MAGIC:
+        raise ValueError("pacchetto di stato non riconosciuto")
+    if version != STATUS_VERSION:
+        raise ValueError(f"versione del pacchetto di stato non supportata: {version}")
+    end = _HEADER.size + id_length
+    if id_length == 0 or len(data) < end:
+        raise ValueError("device_id mancante o troncato")
+
+    status = {
+        "device_id": bytes(data[_HEADER.size:end]).decode('utf-8'),
+        "table_number": table_number,
+        "is_running": bool(flags & FLAG_RUNNING),
+        "is_paused": bool(flags & FLAG_PAUSED),
+        "current_timer": current_timer,
+        "time_expired": bool(flags & FLAG_EXPIRED),
+        "mode": mode,
+        "t1_value": t1_value,
+        "t2_value": t2_value,
+        "buzzer": bool(flags & FLAG_BUZZER),
+        "players_count": players_count,
+    }
+    if flags & FLAG_HAS_T1:
+        status["is_t1_active"] = bool(flags & FLAG_T1_ACTIVE)
+    if battery != BATTERY_MISSING:
+        status["battery_level"] = battery
+    if voltage:
+        status["voltage"] = voltage / 1000
+    if flags & FLAG_WIFI:
+        status["wifi_signal"] = wifi_signal
+    if flags & FLAG_ACK:
+        status["ack_seq"] = ack_seq
+    return status
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+def encode_status(status):
+    """Codifica un dizionario di stato (stesse chiavi del JSON) nel formato binario"""
+    device_id = str(status["device_id"]).encode('utf-8')
+    if not device_id or len(device_id) > MAX_DEVICE_ID:
+        raise ValueError("device_id vuoto o più lungo di 255 byte")
+
+    flags = 0
+    for key, flag in (("is_running", FLAG_RUNNING), ("is_paused", FLAG_PAUSED),
+                      ("time_expired", FLAG_EXPIRED), ("buzzer", FLAG_BUZZER)):
+        if status.get(key):
+            flags |= flag
+    if status.get("is_t1_active") is not None:
+        flags |= FLAG_HAS_T1
+        if status["is_t1_active"]:
+            flags |= FLAG_T1_ACTIVE
+    wifi_signal = status.get("wifi_signal")
+    if wifi_signal is not None:
+        flags |= FLAG_WIFI
+    ack_seq = status.get("ack_seq")
+    if ack_seq is not None:
+        flags |= FLAG_ACK
+    battery = status.get("battery_level")
+    voltage = status.get("voltage")
+
+    header = _HEADER.pack(
+        STATUS_MAGIC, STATUS_VERSION, flags,
+        _clamp(status.get("table_number") or 0, 0, 0xFFFF),
+        _clamp(status.get("current_timer") or 0, 0, 0xFFFF),
+        _clamp(status.get("t1_value") or 0, 0, 0xFFFF),
+        _clamp(status.get("t2_value") or 0, 0, 0xFFFF),
+        _clamp(status.get("mode") or 0, 0, 0xFF),
+        BATTERY_MISSING if battery is None else _clamp(battery, 0, 254),
+        0 if voltage is None else _clamp(round(float(voltage) * 1000), 0, 0xFFFF),
+        0 if wifi_signal is None else _clamp(wifi_signal, -128, 127),
+        _clamp(status.get("players_count") or 0, 0, 0xFF),
+        0 if ack_seq is None else _clamp(ack_seq, 0, 0xFFFFFFFF),
+        len(device_id))
+    return header + device_id
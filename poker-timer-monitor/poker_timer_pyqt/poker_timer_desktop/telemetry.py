@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Storico della telemetria dei timer (serie temporali in memoria limitata)
+
+Ogni aggiornamento di stato sovrascrive batteria, tensione, segnale WiFi e
+stato del timer: TelemetryStore ne conserva l'andamento per dispositivo in
+ring buffer colonnari (array) a più risoluzioni. Ogni campione viene
+aggregato al momento della ricezione in tutte le risoluzioni (conteggio,
+somma, minimo e massimo per punto), quindi la memoria per dispositivo è
+fissa e le interrogazioni non devono ricampionare nulla.
+
+Con le risoluzioni predefinite un dispositivo occupa circa 150 KB e copre
+4 ore al minuto, 7 giorni ogni 15 minuti e 30 giorni all'ora.
+"""
+
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+# Valori numerici registrati a ogni aggiornamento di stato
+TELEMETRY_FIELDS = ('battery_level', 'voltage', 'wifi_signal', 'wifi_quality', 'current_timer', 'players_count')
+
+# Risoluzioni: (secondi per punto, punti conservati)
+TELEMETRY_TIERS = (
+    (60, 240),     # 4 ore
+    (900, 672),    # 7 giorni
+    (3600, 720),   # 30 giorni
+)
+
+# Oltre questo numero si dimenticano i dispositivi aggiornati meno di recente.
+# Con le risoluzioni predefinite ogni dispositivo occupa circa 157 KB: al
+# massimo circa 40 MB, abbondanti per i tavoli di una sala
+MAX_TELEMETRY_DEVICES = 256
+MAX_SAMPLES = 65535           # Limite dei contatori per punto (array 'H')
+
+
+def _zeros(typecode, length):
+    return array(typecode, bytes(array(typecode).itemsize * length))
+
+
+def _number(value):
+    """Converte un valore del JSON di stato in float (None se assente o non numerico)"""
+    if value is None or isinstance(value, str) and not value:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class SeriesTier:
+    """Ring buffer colonnare di una singola risoluzione (non thread-safe)"""
+
+    def __init__(self, resolution, capacity, field_count=len(TELEMETRY_FIELDS)):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.buckets = array('i', [-1]) * capacity  # Intervallo (timestamp // resolution) di ogni punto
+        self.samples = _zeros('H', capacity)        # Aggiornamenti ricevuti
+        self.running = _zeros('H', capacity)        # ... con il timer in esecuzione
+        self.paused = _zeros('H', capacity)         # ... con il timer in pausa
+        self.expirations = _zeros('H', capacity)    # Tempi scaduti (fronti di salita di time_expired)
+        self.counts = [_zeros('H', capacity) for _ in range(field_count)]
+        self.sums = [_zeros('f', capacity) for _ in range(field_count)]
+        self.mins = [_zeros('f', capacity) for _ in range(field_count)]
+        self.maxs = [_zeros('f', capacity) for _ in range(field_count)]
+
+    def add(self, timestamp, values, running, paused, expired):
+        bucket = int(timestamp // self.resolution)
+        index = bucket % self.capacity
+        current = self.buckets[index]
+        if current != bucket:
+            if bucket < current:
+                return  # Campione più vecchio del punto già presente (orologio spostato indietro)
+            self._reset(index, bucket)
+        if self.samples[index] >= MAX_SAMPLES:
+            return
+
+        self.samples[index] += 1
+        self.running[index] += running
+        self.paused[index] += paused
+        self.expirations[index] += expired
+        for value, counts, sums, mins, maxs in zip(values, self.counts, self.sums, self.mins, self.maxs):
+            if value is None:
+                continue
+            count = counts[index]
+            if count == 0:
+                mins[index] = maxs[index] = value
+            elif value < mins[index]:
+                mins[index] = value
+            elif value > maxs[index]:
+                maxs[index] = value
+            sums[index] += value
+            counts[index] = count + 1
+
+    def span(self):
+        """Secondi di storico coperti"""
+        return self.resolution * self.capacity
+
+    def nbytes(self):
+        columns = [self.buckets, self.samples, self.running, self.paused, self.expirations]
+        columns += self.counts + self.sums + self.mins + self.maxs
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def _reset(self, index, bucket):
+        self.buckets[index] = bucket
+        self.samples[index] = self.running[index] = self.paused[index] = self.expirations[index] = 0
+        for field in range(len(self.counts)):
+            self.counts[field][index] = 0
+            self.sums[field][index] = self.mins[field][index] = self.maxs[field][index] = 0.0
+
+
+class DeviceSeries:
+    """Serie temporali di un dispositivo a tutte le risoluzioni"""
+
+    def __init__(self, tiers=TELEMETRY_TIERS):
+        self.lock = threading.Lock()
+        self.tiers = [SeriesTier(resolution, capacity) for resolution, capacity in tiers]
+        self.last_expired = False
+        self.last_sample = None
+
+    def record(self, timestamp, status):
+        values = [_number(status.get(field)) for field in TELEMETRY_FIELDS]
+        running = 1 if _number(status.get('is_running')) else 0
+        paused = 1 if _number(status.get('is_paused')) else 0
+        expired_now = bool(_number(status.get('time_expired')))
+        with self.lock:
+            expired = 1 if expired_now and not self.last_expired else 0
+            self.last_expired = expired_now
+            self.last_sample = timestamp
+            for tier in self.tiers:
+                tier.add(timestamp, values, running, paused, expired)
+
+
+class TelemetryStore:
+    """Storico della telemetria di tutti i dispositivi (thread-safe)"""
+
+    def __init__(self, tiers=TELEMETRY_TIERS, max_devices=MAX_TELEMETRY_DEVICES, clock=time.time):
+        self.tiers = tiers
+        self.max_devices = max_devices
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._devices = OrderedDict()  # device_id -> DeviceSeries, dal meno al più recente
+
+    def record(self, device_id, status, timestamp=None):
+        """Registra un aggiornamento di stato (il dict ricevuto su /api/status)"""
+        if timestamp is None:
+            timestamp = self._clock()
+        with self._lock:
+            series = self._devices.get(device_id)
+            if series is None:
+                series = self._devices[device_id] = DeviceSeries(self.tiers)
+                if len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+            else:
+                self._devices.move_to_end(device_id)
+        series.record(timestamp, status)
+
+    def devices(self):
+        """Dispositivi con uno storico e istante dell'ultimo campione"""
+        with self._lock:
+            items = list(self._devices.items())
+        return {device_id: series.last_sample for device_id, series in items}
+
+    def remove(self, device_id):
+        with self._lock:
+            return self._devices.pop(device_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+    def nbytes(self):
+        """Memoria occupata dai buffer"""
+        with self._lock:
+            series = list(self._devices.values())
+        return sum(tier.nbytes() for item in series for tier in item.tiers)
+
+    def query(self, device_id, start=None, end=None, resolution=None, fields=None):
+        """Punti di un dispositivo tra start e end (timestamp in secondi)
+
+        Se resolution non è indicata si usa la risoluzione più fine che copre
+        l'intervallo richiesto. Il risultato è colonnare: una lista di istanti
+        (inizio di ogni punto) e, per ogni campo, liste di media, minimo e
+        massimo. I punti senza campioni vengono omessi.
+        Restituisce None se il dispositivo non ha uno storico; solleva
+        ValueError se start o end non sono numeri finiti.
+        """
+        if any(value is not None and not math.isfinite(value) for value in (start, end)):
+            raise ValueError("start ed end devono essere numeri finiti")
+        with self._lock:
+            series = self._devices.get(device_id)
+        if series is None:
+            return None
+
+        now = self._clock()
+        end = now if end is None else end
+        start = end - 3600 if start is None else start
+        selected = [TELEMETRY_FIELDS.index(field) for field in (fields or TELEMETRY_FIELDS)
+                    if field in TELEMETRY_FIELDS]
+
+        tier = self._select_tier(series.tiers, now - start, resolution)
+        first = int(start // tier.resolution)
+        last = int(end // tier.resolution)
+        first = max(first, last - tier.capacity + 1)
+
+        timestamps, samples, running, paused, expirations = [], [], [], [], []
+        columns = {TELEMETRY_FIELDS[field]: {"avg": [], "min": [], "max": []} for field in selected}
+        with series.lock:
+            for bucket in range(first, last + 1):
+                index = bucket % tier.capacity
+                if tier.buckets[index] != bucket or not tier.samples[index]:
+                    continue
+                count = tier.samples[index]
+                timestamps.append(bucket * tier.resolution)
+                samples.append(count)
+                running.append(round(tier.running[index] / count, 3))
+                paused.append(round(tier.paused[index] / count, 3))
+                expirations.append(tier.expirations[index])
+                for field in selected:
+                    column = columns[TELEMETRY_FIELDS[field]]
+                    field_count = tier.counts[field][index]
+                    if field_count:
+                        column["avg"].append(round(tier.sums[field][index] / field_count, 3))
+                        column["min"].append(round(tier.mins[field][index], 3))
+                        column["max"].append(round(tier.maxs[field][index], 3))
+                    else:
+                        column["avg"].append(None)
+                        column["min"].append(None)
+                        column["max"].append(None)
+
+        return {
+            "device_id": device_id,
+            "resolution": tier.resolution,
+            "start": first * tier.resolution,
+            "end": (last + 1) * tier.resolution,
+            "timestamps": timestamps,
+            "samples": samples,
+            "running_ratio": running,
+            "paused_ratio": paused,
+            "expirations": expirations,
+            "fields": columns,
+        }
+
+    @staticmethod
+    def _select_tier(tiers, age, resolution):
+        if resolution is not None:
+            for tier in tiers:
+                if tier.resolution >= resolution:
+                    return tier
+            return tiers[-1]
+        for tier in tiers:
+            if tier.span() >= age:
+                return tier
+        return tiers[-1]
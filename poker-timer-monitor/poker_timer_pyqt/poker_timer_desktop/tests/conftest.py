@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""Configurazione comune dei test: i moduli dell'app si importano come top-level"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """Orologio controllato dai test, da passare come clock= ai componenti"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Duplicati, idempotenza, pagine e SLA di BarRequestStore"""
+
+import pytest
+
+from bar_requests import BarRequestStore
+
+
+@pytest.fixture
+def store(clock):
+    clock.now = 1_000_000  # Millisecondi
+    return BarRequestStore(dedup_window=60, sla=300, idempotency_ttl=120, clock=clock)
+
+
+def test_new_request(store):
+    bar_request, created = store.add(5, 'r1', source='qr')
+    assert created
+    assert bar_request == {'id': 'r1', 'table_number': 5, 'timestamp': 1_000_000,
+                           'received_at': 1_000_000, 'source': 'qr'}
+    assert store.find_by_table('5') == [bar_request]
+
+
+def test_repeat_within_window_is_merged(store, clock):
+    first, _ = store.add(5, 'r1')
+    clock.advance(59_000)
+    merged, created = store.add(5, 'r2')
+    assert not created
+    assert merged['id'] == 'r1'
+    assert merged['repeats'] == 1
+    assert first.get('repeats') is None  # Le richieste pubblicate non vengono modificate
+    assert len(store) == 1
+
+    clock.advance(2_000)  # Oltre la finestra rispetto alla richiesta aperta
+    _, created = store.add(5, 'r3')
+    assert created
+    assert len(store) == 2
+
+
+def test_same_id_is_merged_even_outside_window(store, clock):
+    store.add(5, 'r1')
+    clock.advance(600_000)
+    merged, created = store.add(5, 'r1')
+    assert not created and merged['repeats'] == 1
+
+
+def test_other_tables_are_independent(store):
+    store.add(5, 'r1')
+    _, created = store.add(6, 'r2')
+    assert created
+
+
+def test_idempotency_key_replays_without_changes(store, clock):
+    first, created = store.add(5, 'r1', idempotency_key='k')
+    assert created
+    clock.advance(1_000)
+    replayed, created = store.add(5, 'r2', idempotency_key='k')
+    assert not created
+    assert replayed is first  # Nessuna ripetizione conteggiata
+
+    # Anche dopo il completamento la chiave restituisce la richiesta registrata
+    store.complete('r1')
+    replayed, created = store.add(5, 'r3', idempotency_key='k')
+    assert not created and replayed['id'] == 'r1'
+    assert len(store) == 0
+
+
+def test_idempotency_key_expires(store, clock):
+    store.add(5, 'r1', idempotency_key='k')
+    store.complete('r1')
+    clock.advance(120_001)
+    bar_request, created = store.add(5, 'r2', idempotency_key='k')
+    assert created and bar_request['id'] == 'r2'
+
+
+def test_idempotency_keys_are_bounded(clock):
+    store = BarRequestStore(dedup_window=0, clock=clock, max_keys=2)
+    for index in range(3):
+        store.add(index, f'r{index}', idempotency_key=f'k{index}')
+    # k0 è stata dimenticata: un nuovo invio crea una richiesta
+    _, created = store.add(0, 'again', idempotency_key='k0')
+    assert created
+
+
+def test_complete_and_stats(store, clock):
+    store.add(1, 'r1')
+    clock.advance(10_000)
+    store.add(2, 'r2')
+    clock.advance(300_000)
+
+    stats = store.stats()
+    assert stats['open'] == 2
+    assert stats['overdue'] == 1
+    assert stats['oldest_age_seconds'] == 310.0
+
+    assert store.complete('r1')['id'] == 'r1'
+    assert store.complete('r1') is None
+    store.complete('r2')
+    stats = store.stats()
+    assert stats['completed'] == 2
+    assert stats['completed_within_sla'] == 1
+    assert stats['average_wait_seconds'] == 305.0
+    assert store.find_by_table(1) == []
+
+
+def test_pages(store, clock):
+    for index in range(5):
+        store.add(index, f'r{index}')
+        clock.advance(1_000)
+
+    page, total = store.page(offset=1, limit=2)
+    assert total == 5
+    assert [bar_request['id'] for bar_request in page] == ['r3', 'r2']
+    assert page[0]['age_seconds'] == 2.0 and not page[0]['overdue']
+
+    page, _ = store.page(limit=2, newest_first=False)
+    assert [bar_request['id'] for bar_request in page] == ['r0', 'r1']
+    page, total = store.page(table_number='4')
+    assert total == 1 and page[0]['id'] == 'r4'
+
+
+def test_load_replaces_requests(store):
+    store.add(1, 'old')
+    store.load([{'id': 'a', 'table_number': 2, 'timestamp': 5}, {'id': 'b', 'table_number': 2}])
+    assert [bar_request['id'] for bar_request in store.find_by_table(2)] == ['a', 'b']
+    assert store.get('a')['received_at'] == 5
+    assert store.get('b')['received_at'] == 1_000_000
+    assert store.get('old') is None
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""Ordine, unione, conferme, scadenza e ripristino di CommandQueue"""
+
+import threading
+import time
+
+from command_queue import CommandNotifier, CommandQueue
+
+
+def test_non_acking_device_receives_commands_once_in_order(clock):
+    queue = CommandQueue(clock=clock)
+    assert queue.push('a', 'start') == 1
+    assert queue.push('a', 'pause') == 2
+
+    assert queue.take('a') == {'command': 'start', 'command_seq': 1}
+    assert queue.take('a') == {'command': 'pause', 'command_seq': 2}
+    assert queue.take('a') is None
+    assert queue.depth() == 0
+
+
+def test_unsent_settings_are_merged(clock):
+    queue = CommandQueue(clock=clock)
+    queue.push('a', 'start')
+    first = queue.push('a', 'settings', {'t1': 20})
+    assert queue.push('a', 'settings', {'t1': 30}) == first
+    assert queue.push('a', 'apply_settings') == first
+    assert queue.depth('a') == 2
+
+    queue.take('a')
+    assert queue.take('a') == {'command': 'apply_settings', 'command_seq': first,
+                               'settings': {'t1': 30}}
+
+
+def test_settings_already_sent_are_not_merged(clock):
+    queue = CommandQueue(clock=clock)
+    queue.ack('a', 0)  # Il dispositivo conferma: i comandi restano in coda fino all'ack
+    queue.push('a', 'settings', {'t1': 20})
+    queue.take('a')
+    assert queue.push('a', 'settings', {'t1': 30}) == 2
+    assert queue.depth('a') == 2
+
+
+def test_full_queue_rejects_commands(clock):
+    queue = CommandQueue(clock=clock, max_pending=2)
+    assert queue.push('a', 'start') == 1
+    assert queue.push('a', 'pause') == 2
+    assert queue.push('a', 'reset') is None
+    assert queue.depth('a') == 2
+
+
+def test_acking_device_gets_next_command_only_after_ack(clock):
+    queue = CommandQueue(clock=clock, retry_interval=5)
+    queue.ack('a', 0)
+    queue.push('a', 'start')
+    queue.push('a', 'pause')
+
+    assert queue.take('a')['command_seq'] == 1
+    assert queue.take('a') is None  # In attesa di conferma
+
+    clock.advance(5)
+    assert queue.take('a')['command_seq'] == 1  # Reinvio dopo retry_interval
+
+    assert queue.ack('a', 1) == 1
+    assert queue.take('a')['command_seq'] == 2
+    assert queue.ack('a', 2) == 1
+    assert queue.depth('a') == 0
+
+
+def test_ack_ignores_commands_not_yet_sent(clock):
+    queue = CommandQueue(clock=clock)
+    queue.ack('a', 0)
+    queue.push('a', 'start')
+    queue.push('a', 'pause')
+    queue.take('a')
+    assert queue.ack('a', 2) == 1
+    assert queue.peek_command('a') == 'pause'
+
+
+def test_expired_commands_are_dropped(clock):
+    queue = CommandQueue(clock=clock, ttl=120)
+    queue.push('a', 'start')
+    clock.advance(60)
+    queue.push('a', 'pause')
+
+    clock.advance(61)
+    assert queue.take('a') == {'command': 'pause', 'command_seq': 2}
+    clock.advance(121)
+    queue.push('a', 'reset')  # La scadenza si applica anche all'accodamento
+    assert queue.depth('a') == 1
+
+
+def test_sequence_numbers_survive_remove(clock):
+    queue = CommandQueue(clock=clock)
+    queue.push('a', 'start')
+    queue.remove('a')
+    assert queue.depth('a') == 0
+    assert queue.push('a', 'pause') == 2
+
+
+def test_take_changes_and_restore_round_trip(clock):
+    queue = CommandQueue(clock=clock, ttl=120)
+    queue.ack('a', 0)
+    queue.push('a', 'start')
+    queue.push('a', 'settings', {'t1': 20})
+    queue.take('a')
+    clock.advance(10)
+
+    changes = queue.take_changes()
+    assert queue.take_changes() == {}
+    state = changes['a']
+    assert state['last_seq'] == 2
+    assert state['acking'] is True
+    assert [(entry['seq'], entry['age']) for entry in state['entries']] == [(1, 10), (2, 10)]
+
+    # Riavvio del server più tardi: stesso orologio, nuova coda
+    clock.advance(4000)
+    restored = CommandQueue(clock=clock, ttl=120)
+    restored.restore('a', **state)
+    # Il comando già inviato viene riconsegnato, la numerazione continua
+    assert restored.take('a') == {'command': 'start', 'command_seq': 1}
+    assert restored.ack('a', 1) == 1
+    assert restored.take('a')['settings'] == {'t1': 20}
+    assert restored.push('a', 'reset') == 3
+
+    # L'età viene conservata: scadono ttl secondi dopo l'accodamento originale
+    clock.advance(111)
+    assert restored.depth('a') == 2
+    assert restored.take('a') == {'command': 'reset', 'command_seq': 3}
+    assert restored.depth('a') == 1
+
+
+def test_restore_drops_expired_entries(clock):
+    queue = CommandQueue(clock=clock, ttl=120)
+    queue.restore('a', last_seq=7, acking=False, entries=[
+        {'seq': 6, 'command': 'start', 'age': 200},
+        {'seq': 7, 'command': 'pause', 'age': 30},
+    ])
+    assert queue.take('a') == {'command': 'pause', 'command_seq': 7}
+    assert queue.push('a', 'reset') == 8
+
+
+def test_notifier_wakes_waiting_request():
+    notifier = CommandNotifier()
+    queue = CommandQueue()
+    result = []
+
+    def wait():
+        result.append(notifier.wait('a', lambda: queue.take('a'), timeout=5))
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while notifier.waiting_count() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queue.push('a', 'start')
+    notifier.notify('a')
+    thread.join(5)
+
+    assert result == [{'command': 'start', 'command_seq': 1}]
+    assert notifier.waiting_count() == 0
+
+
+def test_notifier_close_releases_waiters():
+    notifier = CommandNotifier()
+    notifier.close()
+    started = time.monotonic()
+    assert notifier.wait('a', lambda: None, timeout=5) is None
+    assert time.monotonic() - started < 1
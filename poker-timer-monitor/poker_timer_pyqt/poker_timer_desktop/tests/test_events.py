@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Sottoscrizioni, riconnessione con Last-Event-ID e resync di EventBroadcaster"""
+
+import json
+
+from events import EventBroadcaster
+
+
+def _parse(frames):
+    """(id, tipo, dati) di ogni frame text/event-stream"""
+    events = []
+    for frame in frames:
+        fields = dict(line.split(': ', 1) for line in frame.decode('utf-8').strip().split('\n'))
+        events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_subscribers_receive_published_events():
+    broadcaster = EventBroadcaster()
+    subscription = broadcaster.subscribe()
+    broadcaster.publish('timer_updated', {'device_id': 'a'})
+    broadcaster.publish('floorman', {'table_number': 3})
+
+    assert _parse(subscription.get(0)) == [
+        (1, 'timer_updated', {'device_id': 'a'}),
+        (2, 'floorman', {'table_number': 3}),
+    ]
+    assert subscription.get(0) == []
+
+
+def test_type_filter():
+    broadcaster = EventBroadcaster()
+    bar = broadcaster.subscribe(types=['bar_request'])
+    broadcaster.publish('timer_updated', {})
+    broadcaster.publish('bar_request', {'id': 'x'})
+    assert [event[1] for event in _parse(bar.get(0))] == ['bar_request']
+
+
+def test_reconnect_replays_missed_events():
+    broadcaster = EventBroadcaster()
+    for index in range(5):
+        broadcaster.publish('timer_updated', {'index': index})
+
+    subscription = broadcaster.subscribe(last_event_id=3)
+    assert [event[0] for event in _parse(subscription.get(0))] == [4, 5]
+
+
+def test_reconnect_replays_only_requested_types():
+    broadcaster = EventBroadcaster()
+    broadcaster.publish('bar_request', {'id': 'x'})
+    broadcaster.publish('timer_updated', {})
+    broadcaster.publish('bar_request', {'id': 'y'})
+
+    subscription = broadcaster.subscribe(last_event_id=1, types=['bar_request'])
+    assert _parse(subscription.get(0)) == [(3, 'bar_request', {'id': 'y'})]
+
+
+def test_up_to_date_reconnect_receives_nothing():
+    broadcaster = EventBroadcaster()
+    broadcaster.publish('timer_updated', {})
+    subscription = broadcaster.subscribe(last_event_id=1)
+    assert subscription.get(0) == []
+
+
+def test_resync_when_events_left_history():
+    broadcaster = EventBroadcaster(history_size=3)
+    for _ in range(6):
+        broadcaster.publish('timer_updated', {})
+
+    # Gli eventi 2 e 3 sono usciti dallo storico (restano 4, 5 e 6)
+    assert _parse(broadcaster.subscribe(last_event_id=1).get(0)) == [(6, 'resync', {})]
+    assert [event[0] for event in _parse(broadcaster.subscribe(last_event_id=3).get(0))] == [4, 5, 6]
+
+
+def test_resync_for_id_of_previous_run():
+    broadcaster = EventBroadcaster()
+    broadcaster.publish('timer_updated', {})
+    subscription = broadcaster.subscribe(last_event_id=500)
+    assert _parse(subscription.get(0)) == [(1, 'resync', {})]
+
+
+def test_resync_when_too_many_missed_for_queue():
+    broadcaster = EventBroadcaster(queue_size=2)
+    for _ in range(4):
+        broadcaster.publish('timer_updated', {})
+    subscription = broadcaster.subscribe(last_event_id=1)
+    assert [event[1] for event in _parse(subscription.get(0))] == ['resync']
+
+
+def test_slow_subscriber_is_disconnected():
+    broadcaster = EventBroadcaster(queue_size=2)
+    slow = broadcaster.subscribe()
+    for _ in range(3):
+        broadcaster.publish('timer_updated', {})
+
+    assert slow.overflowed
+    assert broadcaster.subscriber_count() == 0
+    assert len(slow.get(0)) == 2  # Gli eventi già accodati vengono consegnati
+    assert slow.get(0) is None    # ... poi la sottoscrizione risulta chiusa
+
+
+def test_close_rejects_new_subscribers():
+    broadcaster = EventBroadcaster()
+    subscription = broadcaster.subscribe()
+    broadcaster.close()
+    assert subscription.get(0) is None
+    assert broadcaster.subscribe() is None
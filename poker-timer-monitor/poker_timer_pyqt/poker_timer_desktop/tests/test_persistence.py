@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""Salvataggio e ripristino dello stato con StatePersistence"""
+
+import pytest
+
+from bar_requests import BarRequestStore
+from command_queue import CommandQueue
+from persistence import StatePersistence
+from timer_store import TimerStore
+
+
+class Server:
+    """Lo stato che il server affida a StatePersistence"""
+
+    def __init__(self, path):
+        self.timers = TimerStore()
+        self.command_queue = CommandQueue()
+        self.bar_requests = BarRequestStore()
+        self.persistence = StatePersistence(path, self.timers, self.command_queue, self.bar_requests.to_list)
+        self.persistence.open()
+        self.bar_requests.load(self.persistence.load())
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'state.db')
+
+
+def _restart(server, path):
+    server.persistence.close()
+    return Server(path)
+
+
+def test_round_trip(path):
+    server = Server(path)
+    with server.timers.edit('a', create=True) as timer:
+        timer.update({'table_number': 3, 'seat_info': {'open_seats': [2, 5]}})
+    with server.timers.edit('b', create=True) as timer:
+        timer['table_number'] = 4
+    server.command_queue.ack('a', 0)
+    server.command_queue.push('a', 'start')
+    server.command_queue.push('a', 'settings', {'t1': 20})
+    server.bar_requests.add(3, 'r1')
+    server.persistence.mark_bar_requests()
+
+    restored = _restart(server, path)
+    assert restored.timers.snapshot() == {
+        'a': {'table_number': 3, 'seat_info': {'open_seats': [2, 5]}},
+        'b': {'table_number': 4},
+    }
+    assert restored.timers.find_by_table(4) == 'b'
+    assert restored.command_queue.take('a') == {'command': 'start', 'command_seq': 1}
+    assert restored.command_queue.ack('a', 1) == 1  # Il dispositivo conferma ancora i comandi
+    assert restored.command_queue.take('a')['settings'] == {'t1': 20}
+    assert restored.command_queue.push('a', 'pause') == 3
+    assert [bar_request['id'] for bar_request in restored.bar_requests.to_list()] == ['r1']
+    restored.persistence.close()
+
+
+def test_incremental_flush_saves_changes_and_removals(path):
+    server = Server(path)
+    for device_id in ('a', 'b', 'c'):
+        with server.timers.edit(device_id, create=True) as timer:
+            timer['mode'] = 1
+    assert server.persistence.flush()
+    assert not server.persistence.flush()  # Nessuna modifica da scrivere
+
+    server.timers.update('a', {'mode': 2})
+    server.timers.remove('b')
+    assert server.persistence.flush()
+
+    restored = _restart(server, path)
+    assert restored.timers.snapshot() == {'a': {'mode': 2}, 'c': {'mode': 1}}
+    restored.persistence.close()
+
+
+def test_clear_rewrites_all_timers(path):
+    server = Server(path)
+    with server.timers.edit('a', create=True) as timer:
+        timer['mode'] = 1
+    server.persistence.flush()
+    server.timers.clear()
+    with server.timers.edit('b', create=True) as timer:
+        timer['mode'] = 1
+
+    restored = _restart(server, path)
+    assert list(restored.timers.snapshot()) == ['b']
+    restored.persistence.close()
+
+
+def test_emptied_command_queue_is_saved(path):
+    server = Server(path)
+    server.command_queue.push('a', 'start')
+    server.persistence.flush()
+    server.command_queue.take('a')  # Dispositivo senza conferme: esce dalla coda
+
+    restored = _restart(server, path)
+    assert restored.command_queue.depth() == 0
+    assert restored.command_queue.push('a', 'pause') == 2
+    restored.persistence.close()
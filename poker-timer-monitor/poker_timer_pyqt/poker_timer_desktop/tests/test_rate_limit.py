@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Token bucket per route e client di RateLimiter"""
+
+import pytest
+
+from rate_limit import RateLimiter
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter(limits={'/qr': (2, 0.5)}, global_limits={'/qr': (3, 1.0)},
+                       default=(1, 1.0), clock=clock)
+
+
+def test_burst_then_refill(limiter, clock):
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.check('/qr', 'a') == pytest.approx(2.0)  # Mezzo token al secondo
+
+    clock.advance(1)
+    assert limiter.check('/qr', 'a') == pytest.approx(1.0)
+    clock.advance(1)
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.rejected == 2
+
+
+def test_refill_is_capped_at_burst(limiter, clock):
+    clock.advance(3600)
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.check('/qr', 'a') > 0
+
+
+def test_clients_and_routes_have_separate_buckets(limiter):
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.check('/qr', 'b') == 0
+    assert limiter.check('/other', 'a') == 0  # Limite predefinito
+    assert limiter.check('/other', 'a') > 0
+
+
+def test_global_limit_refunds_client_token(limiter, clock):
+    assert limiter.check('/qr', 'a') == 0
+    assert limiter.check('/qr', 'b') == 0
+    assert limiter.check('/qr', 'c') == 0
+    # Il bucket comune è vuoto: 'd' viene respinto ma conserva il suo token
+    assert limiter.check('/qr', 'd') == pytest.approx(1.0)
+    clock.advance(1)
+    assert limiter.check('/qr', 'd') == 0
+    assert limiter.check('/qr', 'd') > 0
+
+
+def test_tracked_clients_are_bounded(clock):
+    limiter = RateLimiter(limits={}, global_limits={}, default=(1, 0.001), max_clients=2, clock=clock)
+    limiter.check('/x', 'a')
+    limiter.check('/x', 'b')
+    limiter.check('/x', 'c')
+    assert len(limiter) == 2
+    # Il bucket di 'a' è stato dimenticato: riparte pieno
+    assert limiter.check('/x', 'a') == 0
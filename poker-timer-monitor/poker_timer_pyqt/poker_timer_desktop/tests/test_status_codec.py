@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""Codifica e decodifica del pacchetto di stato binario"""
+
+import json
+
+import pytest
+
+from status_codec import BATTERY_MISSING, decode_status, encode_status
+
+STATUS = {
+    "device_id": "arduino_ab12cd",
+    "table_number": 12,
+    "is_running": True,
+    "is_paused": False,
+    "current_timer": 25,
+    "time_expired": False,
+    "mode": 1,
+    "t1_value": 30,
+    "t2_value": 60,
+    "buzzer": True,
+    "players_count": 7,
+    "is_t1_active": False,
+    "battery_level": 84,
+    "voltage": 3.912,
+    "wifi_signal": -67,
+    "ack_seq": 4_000_000_000,
+}
+
+
+def test_round_trip_preserves_all_fields():
+    packet = encode_status(STATUS)
+    assert len(packet) < len(json.dumps(STATUS))
+    assert decode_status(packet) == STATUS
+
+
+def test_optional_fields_are_omitted():
+    status = {key: STATUS[key] for key in ("device_id", "table_number", "mode")}
+    decoded = decode_status(encode_status(status))
+    for key in ("is_t1_active", "battery_level", "voltage", "wifi_signal", "ack_seq"):
+        assert key not in decoded
+    assert decoded["is_running"] is False
+    assert decoded["current_timer"] == 0
+
+
+def test_out_of_range_values_are_clamped():
+    decoded = decode_status(encode_status({
+        "device_id": "x", "table_number": -3, "current_timer": 100_000,
+        "battery_level": BATTERY_MISSING, "wifi_signal": -200, "ack_seq": 0,
+    }))
+    assert decoded["table_number"] == 0
+    assert decoded["current_timer"] == 0xFFFF
+    assert decoded["battery_level"] == 254  # 255 indica l'assenza della batteria
+    assert decoded["wifi_signal"] == -128
+    assert decoded["ack_seq"] == 0
+
+
+def test_unicode_device_id():
+    decoded = decode_status(bytearray(encode_status({"device_id": "tavolo-è"})))
+    assert decoded["device_id"] == "tavolo-è"
+
+
+@pytest.mark.parametrize('device_id', ["", "x" * 256])
+def test_encode_rejects_invalid_device_id(device_id):
+    with pytest.raises(ValueError):
+        encode_status({"device_id": device_id})
+
+
+def test_decode_rejects_invalid_packets():
+    packet = encode_status(STATUS)
+    with pytest.raises(ValueError):
+        decode_status(packet[:10])                 # Troppo corto
+    with pytest.raises(ValueError):
+        decode_status(b'XX' + packet[2:])          # Magic errato
+    with pytest.raises(ValueError):
+        decode_status(packet[:2] + b'\x02' + packet[3:])  # Versione
+    with pytest.raises(ValueError):
+        decode_status(packet[:-1])                 # device_id troncato
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""Aggregazione e interrogazione per risoluzione di TelemetryStore"""
+
+import pytest
+
+from telemetry import TelemetryStore
+
+# Risoluzioni piccole per coprire più livelli con pochi campioni
+TIERS = ((60, 10), (600, 10), (3600, 10))
+START = 1_000_000 * 3600  # Allineato a tutte le risoluzioni
+
+
+@pytest.fixture
+def store(clock):
+    clock.now = START
+    return TelemetryStore(tiers=TIERS, clock=clock)
+
+
+def test_unknown_device_returns_none(store):
+    assert store.query('missing') is None
+
+
+def test_minute_points_aggregate_samples(store, clock):
+    store.record('a', {'battery_level': 80, 'is_running': 1}, timestamp=START)
+    store.record('a', {'battery_level': 60, 'is_running': 0}, timestamp=START + 30)
+    store.record('a', {'battery_level': 'n/a'}, timestamp=START + 70)
+    clock.now = START + 90
+
+    result = store.query('a', start=START, fields=['battery_level'])
+    assert result['resolution'] == 60
+    assert result['timestamps'] == [START, START + 60]
+    assert result['samples'] == [2, 1]
+    assert result['running_ratio'] == [0.5, 0.0]
+    assert result['fields'] == {'battery_level': {'avg': [70.0, None],
+                                                  'min': [60.0, None],
+                                                  'max': [80.0, None]}}
+
+
+def test_tier_follows_requested_age(store, clock):
+    for minute in range(120):
+        store.record('a', {'voltage': minute}, timestamp=START + minute * 60)
+    clock.now = START + 120 * 60
+
+    # 10 minuti: coperti dalla risoluzione al minuto
+    assert store.query('a', start=clock.now - 600)['resolution'] == 60
+    # 1 ora: serve la risoluzione da 10 minuti (copre 100 minuti)
+    result = store.query('a', start=clock.now - 3600)
+    assert result['resolution'] == 600
+    assert result['samples'] == [10] * 6
+    assert result['fields']['voltage']['avg'][0] == 64.5
+    # Oltre lo storico di tutte le risoluzioni: la più grossolana
+    result = store.query('a', start=clock.now - 100 * 3600)
+    assert result['resolution'] == 3600
+    assert result['samples'] == [60, 60]
+
+
+def test_explicit_resolution_and_range_clamped_to_capacity(store, clock):
+    for minute in range(30):
+        store.record('a', {'voltage': 1}, timestamp=START + minute * 60)
+    clock.now = START + 30 * 60
+
+    result = store.query('a', start=START, resolution=60)
+    # Il livello al minuto conserva 10 punti fino a now: i più vecchi sono stati sovrascritti
+    assert result['resolution'] == 60
+    assert result['start'] == START + 21 * 60
+    assert result['end'] == START + 31 * 60
+    assert result['timestamps'] == [START + minute * 60 for minute in range(21, 30)]
+    assert store.query('a', start=START, resolution=120)['resolution'] == 600
+    assert store.query('a', start=START, resolution=86400)['resolution'] == 3600
+
+
+def test_expirations_count_rising_edges(store, clock):
+    for offset, expired in enumerate([0, 1, 1, 0, 1]):
+        store.record('a', {'time_expired': expired}, timestamp=START + offset)
+    clock.now = START + 10
+    assert store.query('a', start=START)['expirations'] == [2]
+
+
+def test_old_samples_do_not_overwrite_newer_points(store, clock):
+    store.record('a', {'voltage': 4}, timestamp=START + 10 * 60)
+    store.record('a', {'voltage': 3}, timestamp=START)  # Stesso slot del ring buffer, intervallo più vecchio
+    clock.now = START + 11 * 60
+    result = store.query('a', start=START, resolution=60)
+    assert result['timestamps'] == [START + 10 * 60]
+    assert result['fields']['voltage']['avg'] == [4.0]
+
+
+@pytest.mark.parametrize('bounds', [
+    {'start': float('inf')}, {'start': float('-inf')},
+    {'end': float('nan')}, {'start': 0, 'end': float('inf')},
+])
+def test_non_finite_bounds_are_rejected(store, bounds):
+    store.record('a', {'voltage': 1})
+    with pytest.raises(ValueError):
+        store.query('a', **bounds)
+
+
+def test_least_recently_updated_device_is_evicted(clock):
+    store = TelemetryStore(tiers=TIERS, max_devices=2, clock=clock)
+    store.record('a', {})
+    store.record('b', {})
+    store.record('a', {})
+    store.record('c', {})
+    assert sorted(store.devices()) == ['a', 'c']
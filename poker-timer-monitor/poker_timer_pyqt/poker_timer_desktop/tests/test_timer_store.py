@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""Versioni, delta e indice dei tavoli di TimerStore"""
+
+import threading
+
+import pytest
+
+import timer_store
+from timer_store import TableIndex, TimerStore
+
+
+def _add(store, device_id, **fields):
+    with store.edit(device_id, create=True) as timer:
+        timer.update(fields)
+
+
+# ---- TimerStore ----
+
+def test_edit_requires_existing_device():
+    store = TimerStore()
+    with pytest.raises(KeyError):
+        with store.edit('missing'):
+            pass
+    assert store.update('missing', {'mode': 1}) is False
+    assert store.version == 0
+
+
+def test_edit_publishes_copy_only_on_success():
+    store = TimerStore()
+    _add(store, 'a', mode=1)
+    published = store.get('a')
+
+    with pytest.raises(RuntimeError):
+        with store.edit('a') as timer:
+            timer['mode'] = 2
+            raise RuntimeError
+    assert store.get('a') is published
+    assert published['mode'] == 1
+
+    store.update('a', {'mode': 2})
+    assert store.get('a')['mode'] == 2
+    assert published['mode'] == 1  # Le letture precedenti non vedono la modifica
+
+
+def test_changes_since_returns_only_newer_changes():
+    store = TimerStore()
+    _add(store, 'a', mode=1)
+    _add(store, 'b', mode=1)
+    since = store.version
+
+    store.update('b', {'mode': 2})
+    store.remove('a')
+    version, changed, removed = store.changes_since(since)
+    assert version == store.version == since + 2
+    assert changed == {'b': {'mode': 2}}
+    assert removed == ['a']
+
+    assert store.changes_since(store.version) == (store.version, {}, [])
+
+
+def test_changes_since_rejects_future_versions():
+    store = TimerStore()
+    _add(store, 'a')
+    assert store.changes_since(store.version + 1) is None
+
+
+def test_removed_then_recreated_device_is_changed_not_removed():
+    store = TimerStore()
+    _add(store, 'a', mode=1)
+    since = store.version
+    store.remove('a')
+    _add(store, 'a', mode=2)
+    _, changed, removed = store.changes_since(since)
+    assert changed == {'a': {'mode': 2}}
+    assert removed == []
+
+
+def test_clear_raises_floor():
+    store = TimerStore()
+    _add(store, 'a')
+    _add(store, 'b')
+    before = store.version
+
+    assert store.clear() == 2
+    assert len(store) == 0
+    assert store.version == before + 1
+    assert store.changes_since(before) is None
+    assert store.changes_since(store.version) == (store.version, {}, [])
+
+
+def test_tombstone_compaction_raises_floor(monkeypatch):
+    monkeypatch.setattr(timer_store, 'MAX_TOMBSTONES', 4)
+    store = TimerStore()
+    for index in range(6):
+        _add(store, f'd{index}')
+    _add(store, 'kept')
+    since = store.version
+
+    for index in range(4):
+        store.remove(f'd{index}')
+    # Quattro rimozioni: ancora entro il limite, il delta è disponibile
+    _, _, removed = store.changes_since(since)
+    assert sorted(removed) == ['d0', 'd1', 'd2', 'd3']
+
+    store.remove('d4')
+    compacted_at = store.version
+    assert store.changes_since(since) is None
+    assert store.changes_since(compacted_at) == (compacted_at, {}, [])
+
+    # Dopo la compattazione le modifiche successive restano incrementali
+    store.update('kept', {'mode': 1})
+    store.remove('d5')
+    _, changed, removed = store.changes_since(compacted_at)
+    assert changed == {'kept': {'mode': 1}}
+    assert removed == ['d5']
+
+
+def test_concurrent_edits_are_serialized_per_device():
+    store = TimerStore()
+    _add(store, 'a', count=0)
+
+    def increment():
+        for _ in range(500):
+            with store.edit('a') as timer:
+                timer['count'] += 1
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.get('a')['count'] == 2000
+    assert store.version == 2001
+
+
+def test_find_by_table_follows_edits():
+    store = TimerStore()
+    _add(store, 'a', table_number=3)
+    assert store.find_by_table('3') == 'a'
+
+    store.update('a', {'table_number': 4})
+    assert store.find_by_table(3) is None
+    assert store.find_by_table(4.0) == 'a'
+
+    store.remove('a')
+    assert store.find_by_table(4) is None
+
+
+# ---- TableIndex ----
+
+@pytest.mark.parametrize('value, key', [
+    (3, 3), ('3', 3), (3.0, 3), ('A1', 'A1'),
+    (None, None), (True, None), ('', None), ([3], None),
+])
+def test_table_key(value, key):
+    assert TableIndex.table_key(value) == key
+
+
+def test_reassignment_falls_back_to_previous_claimant():
+    index = TableIndex()
+    index.assign('a', 5)
+    index.assign('b', 5)
+    assert index.find(5) == 'b'
+
+    index.assign('b', 6)
+    assert index.find(5) == 'a'
+    assert index.find(6) == 'b'
+
+    index.assign('a', 6)
+    assert index.find(5) is None
+    assert index.find(6) == 'a'
+
+    index.remove('a')
+    assert index.find(6) == 'b'
+
+
+def test_assign_none_unassigns():
+    index = TableIndex()
+    index.assign('a', 5)
+    index.assign('a', None)
+    assert index.find(5) is None
+    index.remove('a')  # Rimuovere un dispositivo non indicizzato non fa nulla
+    assert index.find(None) is None
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Archivio thread-safe dello stato dei timer
+
+I thread Flask scrivono lo stato dei dispositivi mentre il thread Qt lo legge.
+Ogni dispositivo è un dizionario pubblicato in modalità copy-on-write: chi
+scrive lavora su una copia (sotto il lock del singolo dispositivo) e la
+pubblica con una sola assegnazione, chi legge ottiene dizionari che non
+cambiano più e può iterarli senza lock.
+
+I dizionari restituiti da get(), snapshot() e items() vanno considerati in
+sola lettura, compresi i dizionari annidati (es. seat_info): per modificarli
+si usa edit(), sostituendo i valori annidati invece di alterarli sul posto.
+
+Ogni modifica pubblicata incrementa un numero di versione: changes_since()
+restituisce solo i dispositivi cambiati o rimossi dopo una certa versione,
+con un costo proporzionale al numero di modifiche e non al numero di timer.
+"""
+
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger('poker_timer')
+
+# Rimozioni ricordate per le risposte incrementali; oltre questo limite i
+# client con una versione più vecchia ricevono lo stato completo
+MAX_TOMBSTONES = 1024
+
+
+class TableIndex:
+    """Indice tavolo -> dispositivo per trovare il timer di un tavolo in O(1)
+
+    Se più dispositivi dichiarano lo stesso tavolo, la ricerca restituisce
+    l'ultimo che lo ha rivendicato; quando questo cambia tavolo o viene rimosso
+    torna a rispondere il precedente.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_table = {}   # chiave tavolo -> dict ordinato {device_id: None}
+        self._by_device = {}  # device_id -> chiave tavolo
+
+    @staticmethod
+    def table_key(table_number):
+        """Normalizza il numero tavolo (3, "3" e 3.0 indicano lo stesso tavolo)"""
+        if table_number is None or isinstance(table_number, bool):
+            return None
+        try:
+            return int(table_number)
+        except (TypeError, ValueError):
+            return table_number if isinstance(table_number, str) and table_number else None
+
+    def assign(self, device_id, table_number):
+        """Associa un dispositivo al suo tavolo, gestendo i cambi di tavolo"""
+        key = self.table_key(table_number)
+        with self._lock:
+            if device_id in self._by_device and self._by_device[device_id] == key:
+                return
+            self._discard(device_id)
+            if key is None:
+                return
+            bucket = self._by_table.setdefault(key, {})
+            if bucket:
+                logger.warning(f"Tavolo {key} già assegnato a {', '.join(bucket)}: ora risponde {device_id}")
+            bucket[device_id] = None
+            self._by_device[device_id] = key
+
+    def remove(self, device_id):
+        """Rimuove un dispositivo dall'indice"""
+        with self._lock:
+            self._discard(device_id)
+
+    def clear(self):
+        """Svuota l'indice"""
+        with self._lock:
+            self._by_table.clear()
+            self._by_device.clear()
+
+    def find(self, table_number):
+        """Restituisce il device_id associato al tavolo, oppure None"""
+        key = self.table_key(table_number)
+        if key is None:
+            return None
+        with self._lock:
+            bucket = self._by_table.get(key)
+            if not bucket:
+                return None
+            return next(reversed(bucket))
+
+    def _discard(self, device_id):
+        key = self._by_device.pop(device_id, None)
+        if key is None:
+            return
+        bucket = self._by_table.get(key)
+        if bucket is not None:
+            bucket.pop(device_id, None)
+            if not bucket:
+                del self._by_table[key]
+
+
+class TimerStore:
+    """Stato dei timer con lock per dispositivo, letture copy-on-write e versioni"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Protegge mappa e versioni, mai tenuto durante le modifiche
+        self._timers = {}              # device_id -> dizionario pubblicato
+        self._device_locks = {}        # device_id -> lock che serializza le modifiche
+        self.table_index = TableIndex()
+        
+        # Versioni: identificano lo stato per le risposte incrementali e gli ETag
+        self.epoch = uuid.uuid4().hex[:8]  # Cambia a ogni avvio: le versioni precedenti non valgono più
+        self._version = 0
+        self._changes = OrderedDict()  # device_id -> (versione, rimosso), in ordine di versione
+        self._tombstones = 0           # Quante voci di _changes sono rimozioni
+        self._floor = 0                # Versione minima da cui si può calcolare un delta
+
+    # ---- Letture ----
+
+    def __contains__(self, device_id):
+        return device_id in self._timers
+
+    def __len__(self):
+        return len(self._timers)
+
+    def get(self, device_id, default=None):
+        """Restituisce lo stato pubblicato di un dispositivo (sola lettura)"""
+        return self._timers.get(device_id, default)
+
+    def snapshot(self):
+        """Copia coerente della mappa device_id -> stato, iterabile senza lock"""
+        with self._lock:
+            return dict(self._timers)
+
+    def items(self):
+        """Coppie (device_id, stato) da una snapshot"""
+        return self.snapshot().items()
+
+    def find_by_table(self, table_number):
+        """Restituisce il device_id associato a un tavolo (o None)"""
+        return self.table_index.find(table_number)
+
+    @property
+    def version(self):
+        """Versione corrente dello stato (cresce a ogni modifica pubblicata)"""
+        return self._version
+
+    def versioned_snapshot(self):
+        """Coppia (versione, snapshot) coerente"""
+        with self._lock:
+            return self._version, dict(self._timers)
+
+    def changes_since(self, since):
+        """Modifiche successive alla versione since
+
+        Restituisce (versione, cambiati, rimossi) dove cambiati è un dict
+        device_id -> stato e rimossi una lista di device_id. Se since è troppo
+        vecchia (o di un'altra esecuzione) restituisce None: serve lo stato completo.
+        """
+        with self._lock:
+            if since < self._floor or since > self._version:
+                return None
+            changed = {}
+            removed = []
+            # Le voci sono in ordine di versione: si scorre dalla più recente
+            for device_id in reversed(self._changes):
+                version, is_removed = self._changes[device_id]
+                if version <= since:
+                    break
+                if is_removed:
+                    removed.append(device_id)
+                else:
+                    changed[device_id] = self._timers[device_id]
+            return self._version, changed, removed
+
+    # ---- Scritture ----
+
+    @contextmanager
+    def edit(self, device_id, create=False):
+        """Modifica atomica di un dispositivo
+
+        Fornisce una copia modificabile dello stato, pubblicata all'uscita dal
+        blocco with. Se il blocco solleva un'eccezione non viene pubblicato nulla.
+        Solleva KeyError se il dispositivo non esiste e create è False.
+        """
+        with self._device_lock(device_id):
+            current = self._timers.get(device_id)
+            if current is None and not create:
+                raise KeyError(device_id)
+            draft = dict(current) if current is not None else {}
+            yield draft
+            self._publish(device_id, current, draft)
+
+    def update(self, device_id, fields):
+        """Aggiorna alcuni campi di un dispositivo esistente. Restituisce False se non esiste"""
+        try:
+            with self.edit(device_id) as timer:
+                timer.update(fields)
+        except KeyError:
+            return False
+        return True
+
+    def pop_fields(self, device_id, *keys):
+        """Rimuove i campi indicati. Restituisce un dict con i valori effettivamente rimossi"""
+        removed = {}
+        try:
+            with self.edit(device_id) as timer:
+                for key in keys:
+                    if key in timer:
+                        removed[key] = timer.pop(key)
+        except KeyError:
+            pass
+        return removed
+
+    def remove(self, device_id):
+        """Rimuove un dispositivo. Restituisce lo stato rimosso o None"""
+        with self._lock:
+            removed = self._timers.pop(device_id, None)
+            self._device_locks.pop(device_id, None)
+            if removed is not None:
+                self._record_change(device_id, True)
+        self.table_index.remove(device_id)
+        return removed
+
+    def load(self, timers):
+        """Carica in blocco gli stati salvati (all'avvio, prima di servire richieste)"""
+        with self._lock:
+            for device_id, timer in timers.items():
+                self._timers[device_id] = timer
+                self._record_change(device_id, False)
+        for device_id, timer in timers.items():
+            self.table_index.assign(device_id, timer.get('table_number'))
+
+    def clear(self):
+        """Rimuove tutti i dispositivi. Restituisce quanti erano"""
+        with self._lock:
+            count = len(self._timers)
+            self._timers = {}
+            self._device_locks = {}
+            # Dopo uno svuotamento i client ripartono dallo stato completo
+            self._version += 1
+            self._floor = self._version
+            self._changes.clear()
+            self._tombstones = 0
+        self.table_index.clear()
+        return count
+
+    def _device_lock(self, device_id):
+        with self._lock:
+            lock = self._device_locks.get(device_id)
+            if lock is None:
+                lock = self._device_locks[device_id] = threading.Lock()
+            return lock
+
+    def _publish(self, device_id, current, draft):
+        with self._lock:
+            # Se il dispositivo è stato rimosso durante la modifica non va resuscitato
+            if current is not None and self._timers.get(device_id) is not current:
+                return
+            self._timers[device_id] = draft
+            self._record_change(device_id, False)
+
+        if current is None or current.get('table_number') != draft.get('table_number'):
+            self.table_index.assign(device_id, draft.get('table_number'))
+
+    def _record_change(self, device_id, removed):
+        # Chiamato con self._lock acquisito
+        self._version += 1
+        previous = self._changes.pop(device_id, None)
+        if previous is not None and previous[1]:
+            self._tombstones -= 1
+        self._changes[device_id] = (self._version, removed)
+        if removed:
+            self._tombstones += 1
+            if self._tombstones > MAX_TOMBSTONES:
+                self._compact_tombstones()
+
+    def _compact_tombstones(self):
+        # Dimentica le rimozioni: i client più vecchi di ora riceveranno lo stato completo
+        self._floor = self._version
+        for device_id in [d for d, (_, removed) in self._changes.items() if removed]:
+            del self._changes[device_id]
+        self._tombstones = 0
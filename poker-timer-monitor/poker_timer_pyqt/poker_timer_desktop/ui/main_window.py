@@ -10,26 +10,33 @@ import time
 import threading
 
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QLabel, QPushButton, QFrame, QGridLayout, QScrollArea,
+                            QLabel, QPushButton, QFrame, QGridLayout,
                             QSpinBox, QCheckBox, QGroupBox, QMessageBox, QSplitter,
                             QSizePolicy, QRadioButton, QButtonGroup, QMenu, QMenuBar,
-                            QDialog, QFormLayout, QDialogButtonBox)  # Assicurati che QDialog sia qui
+                            QDialog, QFormLayout, QDialogButtonBox, QComboBox)  # Assicurati che QDialog sia qui
 
 from PyQt6.QtCore import Qt, QTimer, QSettings, pyqtSlot
 from PyQt6.QtGui import QFont, QIcon, QAction
 
-from .timer_card import TimerCard
+from .timer_grid import TimerGrid
 from .notifications import NotificationManager
 from server import PokerTimerServer
+from serving import available_backends, DEFAULT_THREADS, DEFAULT_MAX_BLOCKING, DEFAULT_MAX_EVENT_STREAMS
 from .ngrok_integration import NgrokConfigDialog, NgrokService
 
+# Gli aggiornamenti dei timer arrivati nello stesso frame vengono applicati insieme
+UI_FRAME_MS = 16
+# Margine dopo la scadenza prevista prima di ricontrollare i timer offline (millisecondi)
+EXPIRY_SWEEP_MARGIN_MS = 500
 
 
 
 
 class ServerSettingsDialog(QDialog):
     """Dialog per le impostazioni del server"""
-    def __init__(self, parent=None, http_port=3000, discovery_port=8888, autostart=False):
+    def __init__(self, parent=None, http_port=3000, discovery_port=8888, autostart=False,
+                 backend="auto", threads=DEFAULT_THREADS, long_polls=DEFAULT_MAX_BLOCKING,
+                 event_streams=DEFAULT_MAX_EVENT_STREAMS):
         super().__init__(parent)
         
         self.setWindowTitle("Impostazioni Server")
@@ -74,10 +81,72 @@ class ServerSettingsDialog(QDialog):
         self.udp_port_spin.setAlignment(Qt.AlignmentFlag.AlignRight)
         grid_layout.addWidget(self.udp_port_spin, 1, 1)
         
+        # Backend HTTP (waitress se installato, altrimenti Werkzeug)
+        backend_label = QLabel("Backend HTTP:")
+        backend_label.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        backend_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        grid_layout.addWidget(backend_label, 2, 0)
+        
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItem("Automatico", "auto")
+        for name in available_backends():
+            self.backend_combo.addItem(name, name)
+        index = self.backend_combo.findData(backend)
+        self.backend_combo.setCurrentIndex(index if index >= 0 else 0)
+        self.backend_combo.setFixedHeight(30)
+        grid_layout.addWidget(self.backend_combo, 2, 1)
+        
+        # Thread del pool di lavoro (usati dal backend waitress)
+        threads_label = QLabel("Thread HTTP:")
+        threads_label.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        threads_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        grid_layout.addWidget(threads_label, 3, 0)
+        
+        self.threads_spin = QSpinBox()
+        self.threads_spin.setRange(2, 128)
+        self.threads_spin.setValue(threads)
+        self.threads_spin.setButtonSymbols(QSpinBox.ButtonSymbols.NoButtons)
+        self.threads_spin.setMinimumWidth(100)
+        self.threads_spin.setFixedHeight(30)
+        self.threads_spin.setAlignment(Qt.AlignmentFlag.AlignRight)
+        grid_layout.addWidget(self.threads_spin, 3, 1)
+        
+        # Timer in attesa di comandi (long-poll): almeno quanti sono i timer della sala
+        long_polls_label = QLabel("Timer in attesa:")
+        long_polls_label.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        long_polls_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        long_polls_label.setToolTip("Timer che possono restare collegati per ricevere subito i comandi")
+        grid_layout.addWidget(long_polls_label, 4, 0)
+        
+        self.long_polls_spin = QSpinBox()
+        self.long_polls_spin.setRange(1, 400)
+        self.long_polls_spin.setValue(long_polls)
+        self.long_polls_spin.setButtonSymbols(QSpinBox.ButtonSymbols.NoButtons)
+        self.long_polls_spin.setMinimumWidth(100)
+        self.long_polls_spin.setFixedHeight(30)
+        self.long_polls_spin.setAlignment(Qt.AlignmentFlag.AlignRight)
+        grid_layout.addWidget(self.long_polls_spin, 4, 1)
+        
+        # Dashboard e bar manager collegati agli eventi in tempo reale (/api/events)
+        event_streams_label = QLabel("Dashboard collegate:")
+        event_streams_label.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        event_streams_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        event_streams_label.setToolTip("Schede del browser aggiornate in tempo reale; le altre usano il polling")
+        grid_layout.addWidget(event_streams_label, 5, 0)
+        
+        self.event_streams_spin = QSpinBox()
+        self.event_streams_spin.setRange(1, 200)
+        self.event_streams_spin.setValue(event_streams)
+        self.event_streams_spin.setButtonSymbols(QSpinBox.ButtonSymbols.NoButtons)
+        self.event_streams_spin.setMinimumWidth(100)
+        self.event_streams_spin.setFixedHeight(30)
+        self.event_streams_spin.setAlignment(Qt.AlignmentFlag.AlignRight)
+        grid_layout.addWidget(self.event_streams_spin, 5, 1)
+        
         # Autostart checkbox
         self.autostart_check = QCheckBox("Avvia server automaticamente")
         self.autostart_check.setChecked(autostart)
-        grid_layout.addWidget(self.autostart_check, 2, 0, 1, 2, Qt.AlignmentFlag.AlignCenter)
+        grid_layout.addWidget(self.autostart_check, 6, 0, 1, 2, Qt.AlignmentFlag.AlignCenter)
         
         # Aggiungiamo il layout griglia al layout principale
         layout.addLayout(grid_layout)
@@ -106,6 +175,10 @@ class ServerSettingsDialog(QDialog):
         return {
             'http_port': self.http_port_spin.value(),
             'discovery_port': self.udp_port_spin.value(),
+            'backend': self.backend_combo.currentData(),
+            'threads': self.threads_spin.value(),
+            'long_polls': self.long_polls_spin.value(),
+            'event_streams': self.event_streams_spin.value(),
             'autostart': self.autostart_check.isChecked()
         }
 
@@ -126,13 +199,14 @@ class MainWindow(QMainWindow):
         self.http_port = self.settings.value("http_port", 3000, int)
         self.discovery_port = self.settings.value("discovery_port", 8888, int)
         self.show_offline = self.settings.value("show_filter", "only_online", str)
+        self.server_backend = self.settings.value("server_backend", "auto", str)
+        self.server_threads = self.settings.value("server_threads", DEFAULT_THREADS, int)
+        self.server_long_polls = self.settings.value("server_long_polls", DEFAULT_MAX_BLOCKING, int)
+        self.server_event_streams = self.settings.value("server_event_streams", DEFAULT_MAX_EVENT_STREAMS, int)
         
-        self.server = PokerTimerServer(port=self.http_port, discovery_port=self.discovery_port)
+        self.server = self.create_server_instance()
         self.is_server_running = False
         
-        # Dizionario per memorizzare i riferimenti alle card
-        self.timer_cards = {}
-        
         # Dizionario per memorizzare le chiamate floorman attive
         self.active_floorman_calls = {}
         
@@ -145,15 +219,18 @@ class MainWindow(QMainWindow):
         self.setup_ngrok()
         
         # Connessione segnali del server
-        self.server.timer_updated.connect(self.on_timer_updated)
-        self.server.timer_connected.connect(self.on_timer_connected)
+        self.server.timers_batch.connect(self.on_timers_batch)
         self.server.seat_notification.connect(self.on_seat_notification)
         self.server.floorman_notification.connect(self.on_floorman_notification)
         self.server.bar_service_notification.connect(self.on_bar_service_notification)
+        self.server.timers_cleared.connect(self.on_timers_cleared)
         
         # Lock per evitare aggiornamenti concorrenti
         self.update_lock = threading.Lock()
-        self.last_full_update = 0  # Timestamp dell'ultimo aggiornamento completo
+        
+        # Aggiornamenti in attesa del prossimo frame: timer cambiati e necessità di ricostruire la griglia
+        self._pending_devices = set()
+        self._full_refresh_pending = False
         
         # Crea la barra dei menu
         self.create_menu_bar()
@@ -169,34 +246,23 @@ class MainWindow(QMainWindow):
         top_panel = self.create_top_panel()
         main_layout.addWidget(top_panel)
         
-        # Area di scorrimento per i timer
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setMinimumHeight(400)
-        self.scroll_area.setFrameShape(QFrame.Shape.NoFrame)
-        self.scroll_area.setStyleSheet("background-color: #f5f5f5;")
-        
-        self.timer_container = QWidget()
-        self.timer_container.setStyleSheet("background-color: #f5f5f5;")
-        self.grid_layout = QGridLayout(self.timer_container)
-        self.grid_layout.setSpacing(20)
-        self.grid_layout.setContentsMargins(20, 20, 20, 20)
-        self.grid_layout.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
-        
-        self.scroll_area.setWidget(self.timer_container)
-        main_layout.addWidget(self.scroll_area)
-        
-        # Etichetta per quando non ci sono timer
-        self.no_timers_label = QLabel("Nessun timer connesso")
-        self.no_timers_label.setObjectName("no-timers-label")
-        self.no_timers_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.no_timers_label.setStyleSheet("font-size: 16pt; color: #333333; font-weight: bold; padding: 20px;")
-        self.grid_layout.addWidget(self.no_timers_label, 0, 0, 1, 3)
-        
-        # Timer per aggiornamenti periodici
-        self.update_timer = QTimer(self)
-        self.update_timer.timeout.connect(self.update_timers_automatic)
-        self.update_timer.start(5000)  # 5 secondi
+        # Griglia dei timer: crea le card solo per i tavoli visibili
+        self.timer_grid = TimerGrid(self.server)
+        self.timer_grid.setMinimumHeight(400)
+        self.timer_grid.setFrameShape(QFrame.Shape.NoFrame)
+        self.timer_grid.setStyleSheet("background-color: #f5f5f5;")
+        main_layout.addWidget(self.timer_grid)
+        
+        # Nessun polling: l'interfaccia si aggiorna sui segnali del server, raggruppati per frame
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(UI_FRAME_MS)
+        self.refresh_timer.timeout.connect(self.apply_pending_updates)
+        
+        # Unico controllo temporizzato: alla prossima scadenza un timer silenzioso diventa offline
+        self.expiry_timer = QTimer(self)
+        self.expiry_timer.setSingleShot(True)
+        self.expiry_timer.timeout.connect(self.on_expiry_sweep)
         
         # Barra di stato
         self.statusBar().showMessage("Server Poker Timer pronto")
@@ -375,7 +441,11 @@ class MainWindow(QMainWindow):
             self,
             http_port=self.http_port,
             discovery_port=self.discovery_port,
-            autostart=self.settings.value("autostart_server", False, bool)
+            autostart=self.settings.value("autostart_server", False, bool),
+            backend=self.server_backend,
+            threads=self.server_threads,
+            long_polls=self.server_long_polls,
+            event_streams=self.server_event_streams
         )
         
         if dialog.exec() == QDialog.DialogCode.Accepted:
@@ -384,10 +454,18 @@ class MainWindow(QMainWindow):
             # Aggiorna le impostazioni
             self.http_port = settings['http_port']
             self.discovery_port = settings['discovery_port']
+            self.server_backend = settings['backend']
+            self.server_threads = settings['threads']
+            self.server_long_polls = settings['long_polls']
+            self.server_event_streams = settings['event_streams']
             
             # Salva le impostazioni
             self.settings.setValue("http_port", self.http_port)
             self.settings.setValue("discovery_port", self.discovery_port)
+            self.settings.setValue("server_backend", self.server_backend)
+            self.settings.setValue("server_threads", self.server_threads)
+            self.settings.setValue("server_long_polls", self.server_long_polls)
+            self.settings.setValue("server_event_streams", self.server_event_streams)
             self.settings.setValue("autostart_server", settings['autostart'])
             
             # Se il server è attivo, chiedi di riavviarlo
@@ -506,6 +584,19 @@ class MainWindow(QMainWindow):
         # Aggiorna la visualizzazione
         self.update_timers()
     
+    def create_server_instance(self):
+        """Crea il server con porte e backend HTTP configurati"""
+        return PokerTimerServer(
+            port=self.http_port,
+            discovery_port=self.discovery_port,
+            serving_backend=self.server_backend,
+            serving_options={
+                'threads': self.server_threads,
+                'max_long_polls': self.server_long_polls,
+                'max_event_streams': self.server_event_streams,
+            }
+        )
+    
     def toggle_server(self):
         """Avvia o ferma il server"""
         if self.is_server_running:
@@ -517,14 +608,15 @@ class MainWindow(QMainWindow):
         """Avvia il server"""
         try:
             # Crea una nuova istanza del server con le porte aggiornate
-            self.server = PokerTimerServer(port=self.http_port, discovery_port=self.discovery_port)
+            self.server = self.create_server_instance()
+            self.timer_grid.set_server(self.server)
             
             # Connetti i segnali
-            self.server.timer_updated.connect(self.on_timer_updated)
-            self.server.timer_connected.connect(self.on_timer_connected)
+            self.server.timers_batch.connect(self.on_timers_batch)
             self.server.seat_notification.connect(self.on_seat_notification)
             self.server.floorman_notification.connect(self.on_floorman_notification)
             self.server.bar_service_notification.connect(self.on_bar_service_notification)
+            self.server.timers_cleared.connect(self.on_timers_cleared)
             
             # Avvia il server
             self.server.start()
@@ -557,6 +649,12 @@ class MainWindow(QMainWindow):
             # Ferma il server
             self.server.stop()
             
+            # Scarta gli aggiornamenti in attesa
+            self.refresh_timer.stop()
+            self.expiry_timer.stop()
+            self._pending_devices.clear()
+            self._full_refresh_pending = False
+            
             # Aggiorna l'interfaccia
             self.is_server_running = False
             self.server_action.setText("Avvia Server")
@@ -571,111 +669,90 @@ class MainWindow(QMainWindow):
                 self.ngrok_service.stop_tunnel()
             
             # Pulisci tutte le card e mostra "Nessun timer connesso"
-            for device_id in list(self.timer_cards.keys()):
-                card = self.timer_cards.pop(device_id)
-                self.grid_layout.removeWidget(card)
-                card.setParent(None)
-                card.deleteLater()
-            
-            # Assicurati che l'etichetta "Nessun timer connesso" sia visibile
-            if self.no_timers_label.parent() is None:
-                self.grid_layout.addWidget(self.no_timers_label, 0, 0, 1, 3)
+            self.timer_grid.clear()
             
         except Exception as e:
             QMessageBox.critical(self, "Errore", f"Errore nella chiusura del server: {str(e)}")
 
-    def update_timers_automatic(self):
-        """Aggiorna solo i dati delle card esistenti senza ricostruire l'interfaccia"""
+    def schedule_refresh(self, device_id=None):
+        """Pianifica l'aggiornamento dell'interfaccia al prossimo frame
+
+        Con device_id aggiorna solo la card di quel timer, senza ricostruire
+        la griglia. Più segnali nello stesso frame producono un solo aggiornamento.
+        """
+        if device_id is None:
+            self._full_refresh_pending = True
+        else:
+            self._pending_devices.add(device_id)
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    def apply_pending_updates(self):
+        """Applica gli aggiornamenti raccolti nell'ultimo frame"""
+        devices = self._pending_devices
+        self._pending_devices = set()
         if not self.is_server_running:
             return
-            
-        # Usa un lock per evitare aggiornamenti concorrenti
-        if not self.update_lock.acquire(blocking=False):
-            return  # Un altro aggiornamento è in corso, esci
-            
-        try:
-            # Controlla se è necessario un aggiornamento completo
-            current_time = time.time()
-            if current_time - self.last_full_update > 30:  # Ogni 30 secondi fai un aggiornamento completo
+        if self._full_refresh_pending:
+            self._full_refresh_pending = False
+            self.update_timers()
+            return
+
+        for device_id in devices:
+            timer_data = self.server.timers.get(device_id)
+            if timer_data is None:
                 self.update_timers()
-                self.last_full_update = current_time
                 return
-                
-            # Ottieni i timer dal server
-            timers = self.server.timers
-            online_timers = []
-            offline_timers = []
-            
-            # Aggiorna lo stato di connessione dei timer
-            for timer_id, timer_data in timers.items():
-                timer_data['is_online'] = self.server.is_timer_online(timer_data)
-                if timer_data['is_online']:
-                    online_timers.append(timer_id)
-                else:
-                    offline_timers.append(timer_id)
-            
-            # Aggiorna il contatore dei timer
-            self.timer_count.setText(f"Timer connessi: {len(online_timers)} online, {len(offline_timers)} offline")
-            
-            # Aggiorna solo i dati delle card esistenti
-            cards_to_update = list(self.timer_cards.keys())
-            
-            for device_id in cards_to_update:
-                if device_id in timers:
-                    timer_data = timers[device_id]
-                    timer_data['is_online'] = self.server.is_timer_online(timer_data)
-                    
-                    # Aggiorna solo se ci sono modifiche significative
-                    current_card_data = self.timer_cards[device_id].timer_data
-                    if self._has_significant_changes(current_card_data, timer_data):
-                        self.timer_cards[device_id].update_data(timer_data)
-            
-        except Exception as e:
-            print(f"Errore in update_timers_automatic: {e}")
-        finally:
-            self.update_lock.release()
+            timer_data = dict(timer_data, is_online=self.server.is_timer_online(device_id))
+
+            shown_data = self.timer_grid.timer_data(device_id)
+            if shown_data is None:
+                if self._matches_filter(timer_data):
+                    # Un timer da mostrare che non è nella griglia: serve ricostruirla
+                    self.update_timers()
+                    return
+            elif (not self._matches_filter(timer_data)
+                    or shown_data.get('table_number') != timer_data.get('table_number')):
+                # Il timer esce dal filtro o cambia tavolo (e quindi posizione nella griglia)
+                self.update_timers()
+                return
+            else:
+                # La card confronta da sola i campi che mostra; i dati restano
+                # aggiornati nella griglia anche quando il timer non è visibile
+                self.timer_grid.update_timer(device_id, timer_data)
+
+        self._update_timer_count()
+        if not self.expiry_timer.isActive():
+            self._schedule_expiry_sweep()
+
+    def on_expiry_sweep(self):
+        """Aggiorna solo le card dei timer appena diventati offline"""
+        if not self.is_server_running:
+            return
+        self._pending_devices.update(self.server.presence.expire())
+        self.apply_pending_updates()
+        self._schedule_expiry_sweep()
+
+    def _matches_filter(self, timer_data):
+        """True se il timer va mostrato con il filtro selezionato"""
+        if self.show_offline == "all":
+            return True
+        if self.show_offline == "only_offline":
+            return not timer_data['is_online']
+        return timer_data['is_online']
+
+    def _update_timer_count(self):
+        online, offline = self.server.presence.counts()
+        self.timer_count.setText(f"Timer connessi: {online} online, {offline} offline")
+
+    def _schedule_expiry_sweep(self):
+        """Ricontrolla i timer quando il primo timer online smette di essere aggiornato"""
+        delay = self.server.presence.next_expiry()
+        if delay is None:
+            self.expiry_timer.stop()
+            return
+        self.expiry_timer.start(int(delay * 1000) + EXPIRY_SWEEP_MARGIN_MS)
 
-    def _has_significant_changes(self, old_data, new_data):
-        """
-        Controlla se ci sono modifiche significative tra i dati vecchi e nuovi
-        Per evitare aggiornamenti inutili delle card
-        """
-        # Lista dei campi da confrontare per verificare modifiche significative
-        fields_to_check = [
-            'is_running', 
-            'is_paused', 
-            'table_number', 
-            'battery_level', 
-            'wifi_quality', 
-            'buzzer', 
-            'seat_info',
-            't1_value',
-            't2_value',
-            'voltage',
-            'last_update',
-            'is_online',       # Aggiunto per verificare cambiamenti online/offline
-            'is_t1_active',    # Aggiunto per verificare cambiamenti T1/T2
-            'current_timer'    # Aggiunto per verificare cambiamenti nel timer attuale
-        ]
-        
-        for field in fields_to_check:
-            old_value = old_data.get(field)
-            new_value = new_data.get(field)
-            
-            # Confronto speciale per seat_info
-            if field == 'seat_info':
-                old_seats = old_value.get('open_seats', []) if old_value else []
-                new_seats = new_value.get('open_seats', []) if new_value else []
-                if set(old_seats) != set(new_seats):
-                    return True
-                continue
-            
-            # Per tutti gli altri campi
-            if old_value != new_value:
-                return True
-        
-        return False
-    
     def update_timers(self):
         """Aggiorna la visualizzazione dei timer in modo efficiente (ricostruzione completa)"""
         if not self.is_server_running:
@@ -686,150 +763,55 @@ class MainWindow(QMainWindow):
             return  # Un altro aggiornamento è in corso, esci
             
         try:
-            # Ottieni i timer dal server
-            timers = self.server.timers
-            
-            # Conta i timer online/offline
-            online_timers = []
-            offline_timers = []
-            for timer_id, timer_data in timers.items():
-                timer_data['is_online'] = self.server.is_timer_online(timer_data)
-                if timer_data['is_online']:
-                    online_timers.append(timer_id)
-                else:
-                    offline_timers.append(timer_id)
-            
-            # Aggiorna il contatore
-            self.timer_count.setText(f"Timer connessi: {len(online_timers)} online, {len(offline_timers)} offline")
-            
-            # Filtra i timer in base al filtro selezionato
-            filtered_timers = {}
-            for device_id, timer_data in timers.items():
-                if self.show_offline == "all":
-                    # Mostra tutti i timer
-                    filtered_timers[device_id] = timer_data
-                elif self.show_offline == "only_online" and timer_data['is_online']:
-                    # Mostra solo i timer online
-                    filtered_timers[device_id] = timer_data
-                elif self.show_offline == "only_offline" and not timer_data['is_online']:
-                    # Mostra solo i timer offline
-                    filtered_timers[device_id] = timer_data
+            # Ottieni una snapshot coerente dei timer, con lo stato di connessione
+            timers = self.get_timers_with_status()
             
-            # Trova timer da rimuovere (non più presenti o filtrati)
-            to_remove = []
-            for device_id in self.timer_cards:
-                if device_id not in filtered_timers:
-                    to_remove.append(device_id)
+            # Aggiorna il contatore e pianifica il prossimo passaggio di un timer a offline
+            self._update_timer_count()
+            self._schedule_expiry_sweep()
             
-            # Rimuovi card non più necessarie
-            for device_id in to_remove:
-                card = self.timer_cards.pop(device_id)
-                self.grid_layout.removeWidget(card)
-                card.setParent(None)
-                card.deleteLater()
-            
-            # Se non ci sono timer da visualizzare, mostra il messaggio "Nessun timer connesso"
-            if not filtered_timers:
-                # Verifica se l'etichetta è già presente nel layout
-                if self.no_timers_label.parent() is None:
-                    self.grid_layout.addWidget(self.no_timers_label, 0, 0, 1, 3)  # Span su 3 colonne
-                return
-            else:
-                # Assicurati che l'etichetta "Nessun timer connesso" sia nascosta se ci sono timer
-                if self.no_timers_label.parent() is not None:
-                    self.grid_layout.removeWidget(self.no_timers_label)
-                    self.no_timers_label.setParent(None)
-            
-            # Ordina i timer per numero tavolo
-            sorted_timers = sorted(filtered_timers.items(), 
-                                key=lambda x: x[1].get('table_number', 999))
-            
-            # Calcola nuove posizioni
-            max_cols = 3  # Numero di colonne nella griglia
-            positions = {}
-            row, col = 0, 0
-            
-            for device_id, _ in sorted_timers:
-                positions[device_id] = (row, col)
-                col += 1
-                if col >= max_cols:
-                    col = 0
-                    row += 1
-            
-            # Aggiorna o crea le card
-            for device_id, timer_data in sorted_timers:
-                # Imposta la posizione iniziale della card
-                row, col = positions[device_id]
-                
-                # MODIFICATO: Non controlliamo più le chiamate floorman e non attiviamo l'icona
-                
-                if device_id in self.timer_cards:
-                    # Aggiorna i dati della card esistente
-                    card = self.timer_cards[device_id]
-                    card.update_data(timer_data)
-                    
-                    # Sposta la card nella nuova posizione se necessario
-                    current_index = self.grid_layout.indexOf(card)
-                    if current_index >= 0:
-                        current_row, current_col, _, _ = self.grid_layout.getItemPosition(current_index)
-                        if current_row != row or current_col != col:
-                            self.grid_layout.removeWidget(card)
-                            self.grid_layout.addWidget(card, row, col)
-                else:
-                    # Crea una nuova card direttamente nella posizione corretta
-                    card = TimerCard(device_id, timer_data, self.server)
-                    
-                    # MODIFICATO: Non impostiamo più set_floorman_active anche se c'è una chiamata floorman
-                    
-                    self.grid_layout.addWidget(card, row, col)
-                    self.timer_cards[device_id] = card
-                    
+            # Filtra i timer in base al filtro selezionato e ordinali per numero tavolo
+            sorted_timers = sorted(
+                ((device_id, timer_data) for device_id, timer_data in timers.items()
+                 if self._matches_filter(timer_data)),
+                key=lambda x: x[1].get('table_number', 999))
             
-            # Aggiorna il timestamp dell'ultimo aggiornamento completo
-            self.last_full_update = time.time()
+            # La griglia riposiziona e aggiorna solo le card visibili
+            self.timer_grid.set_timers(sorted_timers)
         finally:
             self.update_lock.release()
     
 
-    @pyqtSlot(str)
-    def on_timer_updated(self, device_id):
-        """Gestisce il segnale di aggiornamento timer"""
-        # Controlla se il timer esiste nei dati del server
-        if device_id not in self.server.timers:
-            return
-            
-        timer_data = self.server.timers[device_id]
-        
-        # MODIFICATO: Non controlliamo più lo stato floorman
-        
-        # Se c'è una card esistente, aggiornala
-        if device_id in self.timer_cards:
-            card = self.timer_cards[device_id]
-            
-            # Aggiorna i dati della card
-            card.update_data(timer_data)
-        else:
-            # Se non esiste una card, forza un aggiornamento completo
-            self.update_timers()
-        
-        # Aggiorna il contatore
-        timers = self.server.timers
-        online_timers = []
-        offline_timers = []
-        for timer_id, timer_data in timers.items():
-            if self.server.is_timer_online(timer_data):
-                online_timers.append(timer_id)
-            else:
-                offline_timers.append(timer_id)
+    def get_timers_with_status(self):
+        """Snapshot dei timer del server con il campo is_online calcolato
         
-        self.timer_count.setText(f"Timer connessi: {len(online_timers)} online, {len(offline_timers)} offline")
+        Lo stato pubblicato dal server è in sola lettura: is_online viene
+        aggiunto a una copia di ciascun timer.
+        """
+        return {
+            device_id: dict(timer_data, is_online=self.server.is_timer_online(device_id))
+            for device_id, timer_data in self.server.timers.items()
+        }
+    
+    @pyqtSlot(list, list)
+    def on_timers_batch(self, updated, connected):
+        """Gestisce un gruppo di timer aggiornati e di nuovi timer (già raggruppati dal server)"""
+        self._pending_devices.update(updated)
+        if connected:
+            self._full_refresh_pending = True
+        self.refresh_timer.stop()
+        self.apply_pending_updates()
+        
+        for device_id in connected:
+            self.on_timer_connected(device_id)
+    
+    @pyqtSlot()
+    def on_timers_cleared(self):
+        """Gestisce la cancellazione di tutti i timer dal server"""
+        self.schedule_refresh()
        
-    @pyqtSlot(str)
     def on_timer_connected(self, device_id):
-        """Gestisce il segnale di connessione nuovo timer"""
-        # Aggiorna la vista quando si connette un nuovo timer
-        self.update_timers()
-        
+        """Notifica la connessione di un nuovo timer"""
         # Determina il tipo di timer
         device_type = None
         if device_id.startswith('android_'):
@@ -876,22 +858,17 @@ class MainWindow(QMainWindow):
         
         # Determina il tipo di dispositivo
         device_type = None
-        for device_id, timer_data in self.server.timers.items():
-            if str(timer_data.get('table_number', '')) == table_number:
-                if device_id.startswith('android_'):
-                    device_type = "android"
-                elif device_id.startswith('arduino_'):
-                    device_type = "hardware"
-                break
+        device_id = self.server.find_device_by_table(table_number)
+        if device_id:
+            if device_id.startswith('android_'):
+                device_type = "android"
+            elif device_id.startswith('arduino_'):
+                device_type = "hardware"
         
         # Definisce il callback per il reset dei posti
         def reset_seats_callback():
             # Cerca il device_id corrispondente al tavolo
-            device_id = None
-            for d_id, timer_data in self.server.timers.items():
-                if str(timer_data.get('table_number', '')) == table_number:
-                    device_id = d_id
-                    break
+            device_id = self.server.find_device_by_table(table_number)
             
             # Se trovato, resetta i posti
             if device_id:
@@ -928,17 +905,14 @@ class MainWindow(QMainWindow):
     def on_floorman_notification(self, table_number):
         """Gestisce il segnale di notifica chiamata floorman"""
         # Trova il device_id dal numero del tavolo
-        device_id = None
         device_type = None
+        device_id = self.server.find_device_by_table(table_number)
         
-        for dev_id, timer_data in self.server.timers.items():
-            if timer_data.get('table_number') == table_number:
-                device_id = dev_id
-                if device_id.startswith('android_'):
-                    device_type = "android"
-                elif device_id.startswith('arduino_'):
-                    device_type = "hardware"
-                break
+        if device_id:
+            if device_id.startswith('android_'):
+                device_type = "android"
+            elif device_id.startswith('arduino_'):
+                device_type = "hardware"
         
         if not device_id:
             print(f"Avviso: Nessun timer trovato per il tavolo {table_number}")
@@ -8,11 +8,12 @@ Widget per visualizzare un singolo timer con modifiche per rimuovere visual floo
 import os
 import time
 import threading
+from datetime import datetime
 
 from PyQt6.QtWidgets import (QFrame, QVBoxLayout, QHBoxLayout, QLabel, 
                             QPushButton, QMenu, QDialog, QMessageBox, QGridLayout)
 from PyQt6.QtCore import Qt, pyqtSlot, QTimer, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon, QPixmap, QPainter, QColor
+from PyQt6.QtGui import QFont, QIcon, QPixmap, QPainter, QColor, QAction
 
 # Funzione sicura per mostrare messaggi che non causa crash
 def safe_message_box(title, text, icon=QMessageBox.Icon.Question,
@@ -27,6 +28,45 @@ def safe_message_box(title, text, icon=QMessageBox.Icon.Question,
     msg_box.setDefaultButton(default_button)
     return msg_box.exec()
 
+# Fogli di stile delle etichette, preparati una volta sola e condivisi tra le card
+DEVICE_ICON_STYLE = "background-color: #f8f9fa; padding: 4px 8px; border-radius: 4px;"
+TITLE_STYLE = "font-size: 14pt; font-weight: bold; color: #000000; background-color: #f8f9fa; padding: 4px 8px; border-radius: 4px;"
+INFO_STYLE = """
+    background-color: #f8f9fa; 
+    padding: 4px 6px; 
+    border-radius: 4px; 
+    font-size: 11pt;
+"""
+SEAT_INFO_STYLE = """
+    background-color: #fde68a; 
+    color: #854d0e; 
+    padding: 4px; 
+    border-radius: 4px; 
+    font-weight: bold;
+    font-size: 12pt;
+"""
+STATUS_STYLES = {
+    "Running": "background-color: #d4edda; color: #155724; padding: 4px 8px; border-radius: 4px; font-size: 13pt;",
+    "Paused": "background-color: #fff3cd; color: #856404; padding: 4px 8px; border-radius: 4px; font-size: 13pt;",
+    "Stopped": "background-color: #f8d7da; color: #721c24; padding: 4px 8px; border-radius: 4px; font-size: 13pt;",
+}
+ONLINE_STYLES = {
+    True: "color: #28a745; font-size: 12pt; background-color: #f8f9fa; padding: 4px 6px; border-radius: 4px;",
+    False: "color: #dc3545; font-size: 12pt; background-color: #f8f9fa; padding: 4px 6px; border-radius: 4px;",
+}
+LAST_UPDATE_STYLE = "color: #6c757d; font-size: 11pt; background-color: #f8f9fa; padding: 4px 6px; border-radius: 4px;"
+
+# Icone dei dispositivi già renderizzate (nome file -> QPixmap), condivise tra le card
+_device_pixmaps = {}
+
+def _device_pixmap(icon_name):
+    """Pixmap 20x20 dell'icona SVG, None se il file non esiste"""
+    if icon_name not in _device_pixmaps:
+        icon_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
+                                'resources', 'icons', icon_name)
+        _device_pixmaps[icon_name] = QIcon(icon_path).pixmap(20, 20) if os.path.exists(icon_path) else None
+    return _device_pixmaps[icon_name]
+
 class TimerCard(QFrame):
     """Widget che rappresenta un singolo timer nel pannello principale (versione compatta)"""
     
@@ -75,54 +115,19 @@ class TimerCard(QFrame):
         header_layout.setSpacing(5)
         
         # Titolo "Table X" con font ridotto - fissato per avere altezza uniforme
-        title = QLabel(f"Table {timer_data.get('table_number', 'N/A')}")
-        title.setObjectName("title_label")
-        title.setStyleSheet("font-size: 14pt; font-weight: bold; color: #000000; background-color: #f8f9fa; padding: 4px 8px; border-radius: 4px;")
-        title.setFixedHeight(30)  # Altezza fissa
-        header_layout.addWidget(title, alignment=Qt.AlignmentFlag.AlignLeft)
+        self.title_label = QLabel()
+        self.title_label.setObjectName("title_label")
+        self.title_label.setStyleSheet(TITLE_STYLE)
+        self.title_label.setFixedHeight(30)  # Altezza fissa
+        header_layout.addWidget(self.title_label, alignment=Qt.AlignmentFlag.AlignLeft)
         
         # Icona dispositivo (Android o Arduino) - integrata nel proprio contenitore
-        device_icon = QLabel()
-        device_icon.setObjectName("device_icon")
-        device_icon.setFixedHeight(30)  # Altezza fissa
-        device_icon.setStyleSheet("background-color: #f8f9fa; padding: 4px 8px; border-radius: 4px;")
+        self.device_icon = QLabel()
+        self.device_icon.setObjectName("device_icon")
+        self.device_icon.setFixedHeight(30)  # Altezza fissa
+        self.set_device_icon(device_id)
         
-        if self.is_android_timer(device_id):
-            # Usa l'icona SVG di Android
-            icon_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                    'resources', 'icons', 'ic_android.svg')
-            if os.path.exists(icon_path):
-                # Carica l'icona come QIcon
-                icon = QIcon(icon_path)
-                # Crea un QPixmap dalle dimensioni desiderate
-                pixmap = icon.pixmap(20, 20)  # Dimensione ridotta
-                # Imposta il pixmap sulla QLabel
-                device_icon.setPixmap(pixmap)
-                device_icon.setToolTip("Android App")
-            else:
-                # Emoji visibile come fallback
-                device_icon.setText("🤖")
-                device_icon.setStyleSheet("color: #000000; font-size: 18px; background-color: #f8f9fa; padding: 4px 8px; border-radius: 4px;")
-                device_icon.setToolTip("Android App")
-        elif self.is_hardware_timer(device_id):
-            # Usa l'icona SVG di Hardware
-            icon_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                    'resources', 'icons', 'ic_hardware.svg')
-            if os.path.exists(icon_path):
-                # Carica l'icona come QIcon
-                icon = QIcon(icon_path)
-                # Crea un QPixmap dalle dimensioni desiderate
-                pixmap = icon.pixmap(20, 20)  # Dimensione ridotta
-                # Imposta il pixmap sulla QLabel
-                device_icon.setPixmap(pixmap)
-                device_icon.setToolTip("Hardware Timer")
-            else:
-                # Emoji visibile come fallback
-                device_icon.setText("🔌")
-                device_icon.setStyleSheet("color: #000000; font-size: 18px; background-color: #f8f9fa; padding: 4px 8px; border-radius: 4px;")
-                device_icon.setToolTip("Hardware Timer")
-        
-        header_layout.addWidget(device_icon)
+        header_layout.addWidget(self.device_icon)
         
         # Spazio flessibile per allineare il titolo a sinistra
         header_layout.addStretch()
@@ -157,116 +162,61 @@ class TimerCard(QFrame):
         self.seat_info_container.setSpacing(2)  # Ridotto spazio
         main_layout.addLayout(self.seat_info_container)
         
-        if 'seat_info' in timer_data and 'open_seats' in timer_data['seat_info'] and timer_data['seat_info']['open_seats']:
-            seats = ', '.join(map(str, timer_data['seat_info']['open_seats']))
-            
-            self.seat_info = QLabel(f"SEAT OPEN: {seats}")
-            self.seat_info.setObjectName("seat_info_label")
-            self.seat_info.setStyleSheet("""
-                background-color: #fde68a; 
-                color: #854d0e; 
-                padding: 4px; 
-                border-radius: 4px; 
-                font-weight: bold;
-                font-size: 12pt;
-            """)
-            self.seat_info.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            
-            # Gestione separata del click per il reset dei posti
-            self.seat_info.mousePressEvent = lambda e: self.on_seat_info_click(e)
-            self.seat_info.setCursor(Qt.CursorShape.PointingHandCursor)
-            self.seat_info_container.addWidget(self.seat_info)
+        # L'etichetta esiste sempre e viene nascosta quando non ci sono posti liberi
+        self.seat_info = QLabel()
+        self.seat_info.setObjectName("seat_info_label")
+        self.seat_info.setStyleSheet(SEAT_INFO_STYLE)
+        self.seat_info.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        
+        # Gestione separata del click per il reset dei posti
+        self.seat_info.mousePressEvent = lambda e: self.on_seat_info_click(e)
+        self.seat_info.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.seat_info.setVisible(False)
+        self.seat_info_container.addWidget(self.seat_info)
         
         # ---- INFO GRID - Layout a griglia per informazioni ----
         info_grid = QGridLayout()
         info_grid.setSpacing(5)  # Ridotto spazio tra celle
 
-        # Stile comune per le info - RIMOSSO border: none che causava il problema
-        info_style = """
-            background-color: #f8f9fa; 
-            padding: 4px 6px; 
-            border-radius: 4px; 
-            font-size: 11pt;
-        """
-
-        # Prima riga della griglia (0)
-        col = 0
-
-        is_t1_active = timer_data.get('is_t1_active', True)
-        active_timer_text = "T1" if is_t1_active else "T2"
-        
-        # Determina quale valore mostrare basandosi su quale timer è attivo
-        if is_t1_active:
-            timer_value = timer_data.get('t1_value', 20)
-        else:
-            timer_value = timer_data.get('t2_value', 30)
-            
-        self.t1_label = QLabel(f"Timer: {active_timer_text} - {timer_value}s")
+        # Prima riga della griglia (0): timer attivo, stato, buzzer
+        self.t1_label = QLabel()
         self.t1_label.setObjectName("t1_label")
-        self.t1_label.setStyleSheet(f"{info_style} font-weight: bold;")
-        info_grid.addWidget(self.t1_label, 0, col)
-        col += 1
+        self.t1_label.setStyleSheet(f"{INFO_STYLE} font-weight: bold;")
+        info_grid.addWidget(self.t1_label, 0, 0)
 
-        # Stato Timer (sostituisce Giocatori)
-        is_running = timer_data.get('is_running', False)
-        is_paused = timer_data.get('is_paused', False)
-        status_text = "Paused" if is_paused else "Running" if is_running else "Stopped"
-        self.timer_status_label = QLabel(status_text)
+        # Stato Timer (sostituisce Giocatori) - lo stile dipende dallo stato
+        self.timer_status_label = QLabel()
         self.timer_status_label.setObjectName("timer_status_label")
+        info_grid.addWidget(self.timer_status_label, 0, 1)
 
-        # Utilizza lo stesso stile del badge rimosso
-        if status_text == "Running":
-            self.timer_status_label.setStyleSheet("background-color: #d4edda; color: #155724; padding: 4px 8px; border-radius: 4px; font-size: 13pt;")
-        elif status_text == "Paused":
-            self.timer_status_label.setStyleSheet("background-color: #fff3cd; color: #856404; padding: 4px 8px; border-radius: 4px; font-size: 13pt;")
-        else:  # Stopped
-            self.timer_status_label.setStyleSheet("background-color: #f8d7da; color: #721c24; padding: 4px 8px; border-radius: 4px; font-size: 13pt;")
-        info_grid.addWidget(self.timer_status_label, 0, col)
-        col += 1
-
-        # Buzzer
-        self.buzzer_label = QLabel(f"Buzzer: {'On' if timer_data.get('buzzer', False) else 'Off'}")
+        self.buzzer_label = QLabel()
         self.buzzer_label.setObjectName("buzzer_label")
-        self.buzzer_label.setStyleSheet(info_style)
-        info_grid.addWidget(self.buzzer_label, 0, col)
+        self.buzzer_label.setStyleSheet(INFO_STYLE)
+        info_grid.addWidget(self.buzzer_label, 0, 2)
         
-        # Seconda riga della griglia (1)
-        col = 0
-        
-        # Battery con colore verde
-        battery_level = timer_data.get('battery_level', 100)
-        battery_text = f"Battery: {battery_level}%"
-        self.battery_label = QLabel(battery_text)
+        # Seconda riga della griglia (1): batteria (in verde), voltage, WiFi
+        self.battery_label = QLabel()
         self.battery_label.setObjectName("battery_label")
-        self.battery_label.setStyleSheet(f"{info_style} color: #28a745;")
+        self.battery_label.setStyleSheet(f"{INFO_STYLE} color: #28a745;")
         info_grid.addWidget(self.battery_label, 1, 0)
         
-        # Voltage e WiFi sulla stessa riga
-        voltage = timer_data.get('voltage', 5.00)
-        voltage_text = f"Voltage: {voltage:.2f}V"
-        self.voltage_label = QLabel(voltage_text)
+        self.voltage_label = QLabel()
         self.voltage_label.setObjectName("voltage_label")
-        self.voltage_label.setStyleSheet(info_style)
+        self.voltage_label.setStyleSheet(INFO_STYLE)
         info_grid.addWidget(self.voltage_label, 1, 1)
         
-        # WiFi accanto a Voltage - valore dinamico in base alla qualità
-        wifi_quality = timer_data.get('wifi_quality', 100)
-        wifi_dots = self.format_wifi_indicator(wifi_quality)
-        self.wifi_label = QLabel(f"WiFi: <span style='color: #28a745;'>{wifi_dots}")
+        self.wifi_label = QLabel()
         self.wifi_label.setObjectName("wifi_label")
-        self.wifi_label.setStyleSheet(info_style)
+        self.wifi_label.setStyleSheet(INFO_STYLE)
         info_grid.addWidget(self.wifi_label, 1, 2)
         
-        # T2 e modalità - solo per timer hardware (Arduino), posizionati in altre celle
-        if self.is_hardware_timer(device_id):
-            # T2 - mostralo solo se la modalità è 1 o 2 (modalità che usano T1/T2)
-            mode = timer_data.get('mode', 1)
-            if mode in [1, 2]:
-                self.t2_label = QLabel(f"T2: {timer_data.get('t2_value', 'N/A')}s")
-                self.t2_label.setObjectName("t2_label")
-                self.t2_label.setStyleSheet(info_style)
-                # Posiziona in una cella specifica
-                info_grid.addWidget(self.t2_label, 2, 0)
+        # T2 - solo per timer hardware (Arduino) nelle modalità 1 e 2 (che usano T1/T2)
+        # L'etichetta esiste sempre perché la card può essere riassegnata a un altro timer
+        self.t2_label = QLabel()
+        self.t2_label.setObjectName("t2_label")
+        self.t2_label.setStyleSheet(INFO_STYLE)
+        self.t2_label.setVisible(False)
+        info_grid.addWidget(self.t2_label, 2, 0)
         
         main_layout.addLayout(info_grid)
         
@@ -274,44 +224,76 @@ class TimerCard(QFrame):
         status_layout = QHBoxLayout()
         status_layout.setSpacing(5)  # Ridotto spazio
 
-        # Indicatore Online/Offline - con altezza fissa
-        is_online = timer_data.get('is_online', False)
-        online_status_text = "● Online" if is_online else "● Offline"
-        online_status_color = "#28a745" if is_online else "#dc3545"  # Verde o rosso
-
-        online_status = QLabel(online_status_text)
-        online_status.setObjectName("online_status")
-        online_status.setFixedHeight(30)  # Altezza fissa uguale agli altri componenti
-        online_status.setStyleSheet(f"color: {online_status_color}; font-size: 12pt; background-color: #f8f9fa; padding: 4px 6px; border-radius: 4px;")
-        status_layout.addWidget(online_status)
+        # Indicatore Online/Offline - con altezza fissa uguale agli altri componenti
+        self.online_status = QLabel()
+        self.online_status.setObjectName("online_status")
+        self.online_status.setFixedHeight(30)
+        status_layout.addWidget(self.online_status)
 
         # Spaziatore
         status_layout.addStretch()
 
         # Ultimo aggiornamento - con altezza fissa
-        try:
-            from datetime import datetime
-            last_update = timer_data.get('last_update', '')
-            if last_update:
-                last_update_dt = datetime.fromisoformat(last_update)
-                formatted_time = last_update_dt.strftime("%H:%M:%S")
-            else:
-                formatted_time = "N/A"
-        except:
-            formatted_time = "N/A"
-
-        self.last_update_label = QLabel(f"Last update: {formatted_time}")
+        self.last_update_label = QLabel()
         self.last_update_label.setObjectName("last_update_label")
         self.last_update_label.setFixedHeight(30)  # Altezza fissa
-        self.last_update_label.setStyleSheet("color: #6c757d; font-size: 11pt; background-color: #f8f9fa; padding: 4px 6px; border-radius: 4px;")
+        self.last_update_label.setStyleSheet(LAST_UPDATE_STYLE)
         status_layout.addWidget(self.last_update_label)
 
         main_layout.addLayout(status_layout)
         
+        # Valori già mostrati per ogni campo: update_data tocca solo le etichette cambiate
+        self._shown = {}
+        self._field_setters = {
+            'title': self._show_title,
+            'seats': self._show_seats,
+            'timer': self._show_timer,
+            't2': self._show_t2,
+            'status': self._show_status,
+            'buzzer': self._show_buzzer,
+            'battery': self._show_battery,
+            'voltage': self._show_voltage,
+            'wifi': self._show_wifi,
+            'online': self._show_online,
+            'last_update': self._show_last_update,
+        }
+        self.update_data(timer_data)
+        
         # Menu contestuale
         self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_context_menu)
 
+    def bind(self, device_id, timer_data):
+        """Riassegna la card a un altro timer (griglia virtuale)"""
+        if device_id != self.device_id:
+            self.device_id = device_id
+            self.set_device_icon(device_id)
+            self._last_click_time = 0
+            # La visibilità di T2 dipende dal tipo di dispositivo
+            self._shown.pop('t2', None)
+        self.update_data(timer_data)
+
+    def set_device_icon(self, device_id):
+        """Mostra l'icona del tipo di dispositivo (Android o hardware)"""
+        self.device_icon.clear()
+        self.device_icon.setToolTip("")
+        self.device_icon.setStyleSheet(DEVICE_ICON_STYLE)
+        if self.is_android_timer(device_id):
+            icon_name, fallback, tooltip = 'ic_android.svg', "🤖", "Android App"
+        elif self.is_hardware_timer(device_id):
+            icon_name, fallback, tooltip = 'ic_hardware.svg', "🔌", "Hardware Timer"
+        else:
+            return
+        
+        pixmap = _device_pixmap(icon_name)
+        if pixmap is not None:
+            self.device_icon.setPixmap(pixmap)
+        else:
+            # Emoji visibile come fallback
+            self.device_icon.setText(fallback)
+            self.device_icon.setStyleSheet(f"color: #000000; font-size: 18px; {DEVICE_ICON_STYLE}")
+        self.device_icon.setToolTip(tooltip)
+
     def mousePressEvent(self, event):
         """Override del mousePressEvent per gestire i click sulla card"""
         # Nessuna verifica per l'icona floorman, dato che ora è sempre nascosta
@@ -360,227 +342,90 @@ class TimerCard(QFrame):
             return f"{empty}{empty}{empty}{empty}{empty}"
             
     def update_data(self, new_timer_data):
-        """Aggiorna i dati della card senza ricrearla"""
-
-        print(f"Timer {self.device_id} dati ricevuti: {list(new_timer_data.keys())}")
-        if 'is_t1_active' in new_timer_data:
-            print(f"Timer {self.device_id} is_t1_active={new_timer_data['is_t1_active']}")
-        if 'wifi_quality' in new_timer_data:
-            print(f"Timer {self.device_id} wifi_quality={new_timer_data['wifi_quality']}")
+        """Aggiorna i dati della card senza ricrearla
 
-        # Aggiorna i dati interni
-        old_timer_data = self.timer_data.copy() if self.timer_data else {}
+        Confronta i valori grezzi dei campi con quelli già mostrati e
+        aggiorna solo le etichette cambiate.
+        """
         self.timer_data = new_timer_data
         
         # MODIFICATO: Non gestire specificamente lo stato floorman
         # Solo impostiamo il flag interno se presente un floorman_call_timestamp
-        self.has_active_floorman_call = 'floorman_call_timestamp' in new_timer_data and new_timer_data['floorman_call_timestamp'] is not None
-        
-        # Aggiorna il titolo
-        title_label = self.findChild(QLabel, "title_label")
-        if title_label:
-            new_title = f"Table {new_timer_data.get('table_number', 'N/A')}"
-            if title_label.text() != new_title:
-                title_label.setText(new_title)
-        
-        # Aggiorna i posti liberi (se presenti o cambiati)
-        if ('seat_info' in new_timer_data and 'open_seats' in new_timer_data['seat_info'] and 
-            new_timer_data['seat_info']['open_seats']):
-            
-            seats = ', '.join(map(str, new_timer_data['seat_info']['open_seats']))
-            seat_text = f"SEAT OPEN: {seats}"
-            seat_info_label = self.findChild(QLabel, "seat_info_label")
-            
-            if seat_info_label:
-                # Aggiorna l'etichetta esistente solo se il testo è cambiato
-                if seat_info_label.text() != seat_text:
-                    seat_info_label.setText(seat_text)
-            else:
-                # Crea una nuova etichetta
-                self.seat_info = QLabel(seat_text)
-                self.seat_info.setObjectName("seat_info_label")
-                self.seat_info.setStyleSheet("""
-                    background-color: #fde68a; 
-                    color: #854d0e; 
-                    padding: 4px; 
-                    border-radius: 4px; 
-                    font-weight: bold;
-                    font-size: 12pt;
-                """)
-                self.seat_info.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.seat_info.mousePressEvent = lambda e: self.on_seat_info_click(e)
-                self.seat_info.setCursor(Qt.CursorShape.PointingHandCursor)
-                
-                # Pulisci il layout prima di aggiungere la nuova etichetta
-                for i in reversed(range(self.seat_info_container.count())): 
-                    self.seat_info_container.itemAt(i).widget().setParent(None)
-                
-                self.seat_info_container.addWidget(self.seat_info)
+        self.has_active_floorman_call = new_timer_data.get('floorman_call_timestamp') is not None
+        
+        seat_info = new_timer_data.get('seat_info') or {}
+        fields = {
+            'title': new_timer_data.get('table_number', 'N/A'),
+            'seats': tuple(seat_info.get('open_seats') or ()),
+            'timer': (new_timer_data.get('is_t1_active', True),
+                      new_timer_data.get('t1_value', 20), new_timer_data.get('t2_value', 30)),
+            't2': (new_timer_data.get('mode', 1), new_timer_data.get('t2_value', 'N/A')),
+            'status': (new_timer_data.get('is_paused', False), new_timer_data.get('is_running', False)),
+            'buzzer': new_timer_data.get('buzzer', False),
+            'battery': new_timer_data.get('battery_level', 100),
+            'voltage': new_timer_data.get('voltage', 5.00),
+            'wifi': new_timer_data.get('wifi_quality', 100),
+            'online': new_timer_data.get('is_online', False),
+            'last_update': new_timer_data.get('last_update', ''),
+        }
+        shown = self._shown
+        for field, value in fields.items():
+            if field not in shown or shown[field] != value:
+                shown[field] = value
+                self._field_setters[field](value)
+
+    def _show_title(self, table_number):
+        self.title_label.setText(f"Table {table_number}")
+
+    def _show_seats(self, seats):
+        if seats:
+            self.seat_info.setText(f"SEAT OPEN: {', '.join(map(str, seats))}")
+        self.seat_info.setVisible(bool(seats))
+
+    def _show_timer(self, value):
+        # Mostra il valore del timer attivo, non sempre t1_value
+        is_t1_active, t1_value, t2_value = value
+        if is_t1_active:
+            self.t1_label.setText(f"Timer: T1 - {t1_value}s")
         else:
-            # Rimuovi l'etichetta dei posti se non ci sono posti
-            seat_info_label = self.findChild(QLabel, "seat_info_label")
-            if seat_info_label:
-                seat_info_label.setParent(None)
-        
-        # Aggiorna i valori dei timer
-        t1_label = self.findChild(QLabel, "t1_label")
-        if t1_label:
-            is_t1_active = new_timer_data.get('is_t1_active', True)
-            active_timer_text = "T1" if is_t1_active else "T2"
-            
-            # IMPORTANTE: Usa il valore del timer attivo, non sempre t1_value
-            if is_t1_active:
-                timer_value = new_timer_data.get('t1_value', 20)
-            else:
-                timer_value = new_timer_data.get('t2_value', 30)
-            
-            new_t1_text = f"Timer: {active_timer_text} - {timer_value}s"
-            if t1_label.text() != new_t1_text:
-                t1_label.setText(new_t1_text)
-                print(f"Timer {self.device_id} aggiornato: {new_t1_text}")
-        
-        if self.is_hardware_timer(self.device_id):
-            t2_label = self.findChild(QLabel, "t2_label")
-            mode = new_timer_data.get('mode', 1)
-            
-            if t2_label and mode in [1, 2]:
-                new_t2_text = f"T2: {new_timer_data.get('t2_value', 'N/A')}s"
-                if t2_label.text() != new_t2_text:
-                    t2_label.setText(new_t2_text)
-                t2_label.setVisible(True)
-            elif t2_label:
-                t2_label.setVisible(False)
-        
-        # AGGIUNTA: Aggiorna l'indicatore del timer attivo (T1/T2)
-        active_timer_text = self.findChild(QLabel, "activeTimerText")
-        if active_timer_text:
-            mode = new_timer_data.get('mode', 1)
-            if mode in [3, 4]:  # Modalità solo T1
-                new_active_text = "T1"
-            else:
-                # Verifica se 'is_t1_active' è disponibile nei dati
-                if 'is_t1_active' in new_timer_data:
-                    is_t1_active = new_timer_data['is_t1_active']
-                    new_active_text = "T1" if is_t1_active else "T2"
-                else:
-                    # Fallback: controlla se il timer corrente corrisponde a T1 o T2
-                    current_timer = new_timer_data.get('current_timer', 0)
-                    t1_value = new_timer_data.get('t1_value', 0)
-                    t2_value = new_timer_data.get('t2_value', 0)
-                    
-                    if current_timer == t1_value:
-                        new_active_text = "T1"
-                    elif current_timer == t2_value:
-                        new_active_text = "T2"
-                    else:
-                        # Se non corrisponde esattamente a nessuno dei due, determina il più vicino
-                        if abs(current_timer - t1_value) <= abs(current_timer - t2_value):
-                            new_active_text = "T1"
-                        else:
-                            new_active_text = "T2"
-            
-            # Aggiorna solo se il testo è cambiato
-            if active_timer_text.text() != new_active_text:
-                active_timer_text.setText(new_active_text)
-                print(f"Timer {self.device_id} timer attivo aggiornato a: {new_active_text}")
-        
-        # IMPORTANTE: Aggiorna stato timer - questo è il punto critico
-        timer_status_label = self.findChild(QLabel, "timer_status_label")
-        if timer_status_label:
-            is_running = new_timer_data.get('is_running', False)
-            is_paused = new_timer_data.get('is_paused', False)
-            
-            # Determina il nuovo stato
-            if is_paused:
-                status_text = "Paused"
-            elif is_running:
-                status_text = "Running"
-            else:
-                status_text = "Stopped"
-            
-            # Aggiorna solo se il testo è cambiato
-            if timer_status_label.text() != status_text:
-                timer_status_label.setText(status_text)
-                
-                # Aggiorna anche lo stile
-                if status_text == "Running":
-                    timer_status_label.setStyleSheet("background-color: #d4edda; color: #155724; padding: 4px 8px; border-radius: 4px; font-size: 13pt;")
-                elif status_text == "Paused":
-                    timer_status_label.setStyleSheet("background-color: #fff3cd; color: #856404; padding: 4px 8px; border-radius: 4px; font-size: 13pt;")
-                else:  # Stopped
-                    timer_status_label.setStyleSheet("background-color: #f8d7da; color: #721c24; padding: 4px 8px; border-radius: 4px; font-size: 13pt;")
-                
-                print(f"Timer {self.device_id} stato aggiornato a: {status_text}")
-        
-        # Aggiorna buzzer
-        buzzer_label = self.findChild(QLabel, "buzzer_label")
-        if buzzer_label:
-            buzzer_text = f"Buzzer: {'On' if new_timer_data.get('buzzer', False) else 'Off'}"
-            if buzzer_label.text() != buzzer_text:
-                buzzer_label.setText(buzzer_text)
-        
-
-        # Aggiorna indicatore timer attivo (T1/T2)
-        active_timer_label = self.findChild(QLabel, "active_timer_label")
-        if active_timer_label:
-            is_t1_active = new_timer_data.get('is_t1_active', True)
-            new_active_text = f"Timer: T1" if is_t1_active else f"Timer: T2"
-            if active_timer_label.text() != new_active_text:
-                active_timer_label.setText(new_active_text)
-                print(f"Timer {self.device_id} timer attivo aggiornato a: {new_active_text}")
-
-        # Aggiorna batteria
-        battery_label = self.findChild(QLabel, "battery_label")
-        if battery_label:
-            battery_level = new_timer_data.get('battery_level', 100)
-            battery_text = f"Battery: {battery_level}%"
-            if battery_label.text() != battery_text:
-                battery_label.setText(battery_text)
-        
-        # Aggiorna voltage
-        voltage_label = self.findChild(QLabel, "voltage_label")
-        if voltage_label:
-            voltage = new_timer_data.get('voltage', 5.00)
-            voltage_text = f"Voltage: {voltage:.2f}V"
-            if voltage_label.text() != voltage_text:
-                voltage_label.setText(voltage_text)
-        
-        # Aggiorna WiFi
-        wifi_label = self.findChild(QLabel, "wifi_label")
-        if wifi_label:
-            wifi_quality = new_timer_data.get('wifi_quality', 100)
-            wifi_dots = self.format_wifi_indicator(wifi_quality)
-            wifi_text = f"WiFi: <span style='color: #28a745;'>{wifi_dots}</span>"
-            if wifi_label.text() != wifi_text:
-                wifi_label.setText(wifi_text)
-        
-        # Aggiorna stato online/offline
-        online_status = self.findChild(QLabel, "online_status")
-        if online_status:
-            is_online = new_timer_data.get('is_online', False)
-            online_status_text = "● Online" if is_online else "● Offline"
-            if online_status.text() != online_status_text:
-                online_status.setText(online_status_text)
-                online_status_color = "#28a745" if is_online else "#dc3545"
-                online_status.setStyleSheet(f"color: {online_status_color}; font-size: 12pt; background-color: #f8f9fa; padding: 4px 6px; border-radius: 4px;")
-        
-        # Aggiorna l'orario dell'ultimo aggiornamento
-        last_update_label = self.findChild(QLabel, "last_update_label")
-        if last_update_label:
-            try:
-                from datetime import datetime
-                last_update = new_timer_data.get('last_update', '')
-                if last_update:
-                    last_update_dt = datetime.fromisoformat(last_update)
-                    formatted_time = last_update_dt.strftime("%H:%M:%S")
-                else:
-                    formatted_time = "N/A"
-            except:
-                formatted_time = "N/A"
-            
-            new_update_text = f"Last update: {formatted_time}"
-            if last_update_label.text() != new_update_text:
-                last_update_label.setText(new_update_text)
+            self.t1_label.setText(f"Timer: T2 - {t2_value}s")
+
+    def _show_t2(self, value):
+        mode, t2_value = value
+        visible = bool(self.is_hardware_timer(self.device_id)) and mode in [1, 2]
+        if visible:
+            self.t2_label.setText(f"T2: {t2_value}s")
+        self.t2_label.setVisible(visible)
+
+    def _show_status(self, value):
+        is_paused, is_running = value
+        status_text = "Paused" if is_paused else "Running" if is_running else "Stopped"
+        self.timer_status_label.setText(status_text)
+        self.timer_status_label.setStyleSheet(STATUS_STYLES[status_text])
+
+    def _show_buzzer(self, buzzer):
+        self.buzzer_label.setText(f"Buzzer: {'On' if buzzer else 'Off'}")
+
+    def _show_battery(self, battery_level):
+        self.battery_label.setText(f"Battery: {battery_level}%")
+
+    def _show_voltage(self, voltage):
+        self.voltage_label.setText(f"Voltage: {voltage:.2f}V")
+
+    def _show_wifi(self, wifi_quality):
+        wifi_dots = self.format_wifi_indicator(wifi_quality)
+        self.wifi_label.setText(f"WiFi: <span style='color: #28a745;'>{wifi_dots}</span>")
+
+    def _show_online(self, is_online):
+        self.online_status.setText("● Online" if is_online else "● Offline")
+        self.online_status.setStyleSheet(ONLINE_STYLES[bool(is_online)])
+
+    def _show_last_update(self, last_update):
+        try:
+            formatted_time = datetime.fromisoformat(last_update).strftime("%H:%M:%S") if last_update else "N/A"
+        except (TypeError, ValueError):
+            formatted_time = "N/A"
+        self.last_update_label.setText(f"Last update: {formatted_time}")
         
     def on_card_click(self, event):
         """Gestisce il click sulla card - apre i dettagli"""
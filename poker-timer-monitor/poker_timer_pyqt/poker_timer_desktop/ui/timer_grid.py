@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Griglia virtuale delle card dei timer
+
+Con centinaia di tavoli, una TimerCard per timer in un QGridLayout significa
+migliaia di widget figli e un ricalcolo del layout a ogni spostamento.
+TimerGrid conosce l'ordine di tutti i timer ma crea card solo per le righe
+visibili nell'area di scorrimento, più OVERSCAN_ROWS righe sopra e sotto:
+le card che escono dalla vista tornano in un pool e vengono riassegnate con
+TimerCard.bind() ai timer che entrano. Le card sono posizionate a mano su
+celle di dimensione fissa, quindi scorrere, filtrare e riordinare non passa
+dal motore di layout di Qt e costa in proporzione alle card visibili, non
+al numero di timer.
+"""
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QScrollArea, QWidget, QLabel
+
+from .timer_card import TimerCard
+
+CARD_WIDTH = 420      # Larghezza fissa di TimerCard
+GRID_SPACING = 20     # Spazio tra le card
+GRID_MARGIN = 20      # Margine attorno alla griglia
+MAX_COLUMNS = 3       # Colonne al massimo (meno se la finestra è stretta)
+OVERSCAN_ROWS = 1     # Righe di card create oltre quelle visibili, sopra e sotto
+
+# Timer fittizio con tutte le righe opzionali, per misurare l'altezza delle celle
+SAMPLE_TIMER = {
+    'table_number': 0,
+    'seat_info': {'open_seats': [1]},
+    'mode': 1,
+    't2_value': 30,
+}
+
+
+class TimerGrid(QScrollArea):
+    """Area di scorrimento che crea le card dei soli timer visibili"""
+
+    def __init__(self, server, parent=None):
+        super().__init__(parent)
+        self.server = server
+        self._order = []     # device_id nell'ordine di visualizzazione
+        self._data = {}      # device_id -> dati del timer
+        self._cards = {}     # device_id -> card visibile
+        self._pool = []      # Card nascoste, pronte per essere riassegnate
+        self._columns = 1
+        self._row_height = None
+
+        self.setWidgetResizable(False)
+        self._canvas = QWidget()
+        self._canvas.setStyleSheet("background-color: #f5f5f5;")
+        self.setWidget(self._canvas)
+
+        # Etichetta per quando non ci sono timer
+        self.empty_label = QLabel("Nessun timer connesso", self._canvas)
+        self.empty_label.setObjectName("no-timers-label")
+        self.empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.empty_label.setStyleSheet("font-size: 16pt; color: #333333; font-weight: bold; padding: 20px;")
+
+        self.verticalScrollBar().valueChanged.connect(self._place_cards)
+        self._update_geometry()
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, device_id):
+        return device_id in self._data
+
+    def timer_data(self, device_id):
+        """Ultimi dati mostrati per il timer, None se non è nella griglia"""
+        return self._data.get(device_id)
+
+    def card_for(self, device_id):
+        """Card del timer se è visibile, altrimenti None"""
+        return self._cards.get(device_id)
+
+    def set_server(self, server):
+        """Usa un nuovo server (riavvio) per le card esistenti e future"""
+        self.server = server
+        for card in list(self._cards.values()) + self._pool:
+            card.server = server
+
+    def set_timers(self, timers):
+        """Sostituisce l'elenco dei timer mostrati
+
+        timers è una lista di (device_id, timer_data) già filtrata e ordinata.
+        """
+        self._order = [device_id for device_id, _ in timers]
+        self._data = dict(timers)
+        self._update_geometry()
+        self._place_cards()
+
+    def update_timer(self, device_id, timer_data):
+        """Aggiorna i dati di un timer già nella griglia, senza spostarlo"""
+        if device_id not in self._data:
+            return
+        self._data[device_id] = timer_data
+        card = self._cards.get(device_id)
+        if card is not None:
+            card.update_data(timer_data)
+
+    def clear(self):
+        """Rimuove tutti i timer e distrugge le card"""
+        for card in list(self._cards.values()) + self._pool:
+            card.setParent(None)
+            card.deleteLater()
+        self._cards.clear()
+        self._pool.clear()
+        self._order = []
+        self._data = {}
+        self._update_geometry()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_geometry()
+        self._place_cards()
+
+    def _cell_height(self):
+        """Altezza di una cella: quella di una card con tutte le righe opzionali"""
+        if self._row_height is None:
+            card = TimerCard('arduino_sample', dict(SAMPLE_TIMER), self.server, self._canvas)
+            card.hide()
+            card.ensurePolished()
+            self._row_height = card.sizeHint().height()
+            # La card di misura diventa la prima del pool
+            self._pool.append(card)
+        return self._row_height
+
+    def _update_geometry(self):
+        """Ridimensiona l'area interna in base al numero di timer e alla larghezza disponibile"""
+        viewport = self.viewport()
+        available = viewport.width() - 2 * GRID_MARGIN + GRID_SPACING
+        self._columns = max(1, min(MAX_COLUMNS, available // (CARD_WIDTH + GRID_SPACING)))
+
+        if not self._order:
+            self.empty_label.setGeometry(GRID_MARGIN, GRID_MARGIN,
+                                         max(CARD_WIDTH, viewport.width() - 2 * GRID_MARGIN),
+                                         self.empty_label.sizeHint().height())
+            self.empty_label.show()
+            self._canvas.resize(viewport.width(), viewport.height())
+            return
+
+        self.empty_label.hide()
+        rows = -(-len(self._order) // self._columns)
+        width = 2 * GRID_MARGIN + self._columns * CARD_WIDTH + (self._columns - 1) * GRID_SPACING
+        height = 2 * GRID_MARGIN + rows * self._cell_height() + (rows - 1) * GRID_SPACING
+        self._canvas.resize(max(width, viewport.width()), height)
+
+    def _visible_range(self):
+        """Indici in _order dei timer da mostrare, [primo, ultimo)"""
+        pitch = self._cell_height() + GRID_SPACING
+        top = self.verticalScrollBar().value() - GRID_MARGIN
+        bottom = top + self.viewport().height()
+        first_row = max(0, top // pitch - OVERSCAN_ROWS)
+        last_row = bottom // pitch + OVERSCAN_ROWS
+        return first_row * self._columns, min(len(self._order), (last_row + 1) * self._columns)
+
+    def _place_cards(self):
+        """Assegna le card alle celle visibili e ricicla quelle uscite dalla vista"""
+        if not self._order:
+            for device_id in list(self._cards):
+                self._release(device_id)
+            self._trim_pool()
+            return
+
+        first, last = self._visible_range()
+        visible = self._order[first:last]
+        wanted = set(visible)
+        for device_id in [device_id for device_id in self._cards if device_id not in wanted]:
+            self._release(device_id)
+
+        height = self._cell_height()
+        for index, device_id in enumerate(visible, first):
+            timer_data = self._data[device_id]
+            card = self._cards.get(device_id)
+            if card is None:
+                card = self._acquire(device_id, timer_data)
+            elif card.timer_data is not timer_data:
+                card.update_data(timer_data)
+            row, col = divmod(index, self._columns)
+            card.setGeometry(GRID_MARGIN + col * (CARD_WIDTH + GRID_SPACING),
+                             GRID_MARGIN + row * (height + GRID_SPACING),
+                             CARD_WIDTH, height)
+            if card.isHidden():
+                card.show()
+
+        self._trim_pool()
+
+    def _trim_pool(self):
+        # Il pool non supera le card visibili (es. dopo aver rimpicciolito la finestra
+        # o quando non ci sono più timer da mostrare)
+        while len(self._pool) > len(self._cards):
+            card = self._pool.pop()
+            card.setParent(None)
+            card.deleteLater()
+
+    def _acquire(self, device_id, timer_data):
+        if self._pool:
+            card = self._pool.pop()
+            card.server = self.server
+            card.bind(device_id, timer_data)
+        else:
+            card = TimerCard(device_id, timer_data, self.server, self._canvas)
+        self._cards[device_id] = card
+        return card
+
+    def _release(self, device_id):
+        card = self._cards.pop(device_id)
+        card.hide()
+        self._pool.append(card)
@@ -25,6 +25,7 @@ except ImportError:
     import subprocess
     subprocess.check_call([sys.executable, "-m", "pip", "install", "flask"])
     from flask import Flask, request, jsonify, send_from_directory, Response
+from werkzeug.exceptions import NotFound
 
 # Configurazione logging
 logging.basicConfig(
@@ -75,15 +76,16 @@ class PokerTimerServer:
         @self.app.route('/', defaults={'path': 'index.html'})
         @self.app.route('/<path:path>')
         def serve_static(path):
-            file_path = os.path.join(self.static_folder, path)
-            logger.info(f"Richiesta file: {path}")
-            logger.info(f"Cerco file in: {file_path}")
-            logger.info(f"Il file esiste: {os.path.exists(file_path)}")
+            logger.debug("Richiesta file: %s", path)
             
-            if path == "favicon.ico" and not os.path.exists(os.path.join(self.static_folder, "favicon.ico")):
-                return Response(status=204)
-                
-            return send_from_directory(self.static_folder, path)
+            # send_from_directory verifica già l'esistenza del file: nessun accesso
+            # al disco in più per ogni richiesta
+            try:
+                return send_from_directory(self.static_folder, path)
+            except NotFound:
+                if path == "favicon.ico":
+                    return Response(status=204)
+                raise
         
         # API per ottenere informazioni sul server
         @self.app.route('/api/server-info')
@@ -121,7 +123,7 @@ class PokerTimerServer:
             if not device_id:
                 return jsonify({"error": "Missing device_id"}), 400
             
-            logger.info(f"Ricevuto aggiornamento da {device_id}")
+            logger.debug("Ricevuto aggiornamento da %s", device_id)
             
             # Aggiorna timestamp e indirizzo IP
             timer_data['last_update'] = datetime.datetime.now().isoformat()
@@ -6,6 +6,7 @@ import kotlinx.coroutines.withContext
 import java.net.HttpURLConnection
 import java.net.URL
 import com.google.gson.Gson
+import com.google.gson.annotations.SerializedName
 import java.util.Random
 import kotlinx.coroutines.delay
 import org.json.JSONObject
@@ -13,6 +14,15 @@ import android.net.wifi.WifiManager
 
 class NetworkManager(private val context: Context) {
 
+    companion object {
+        const val LONG_POLL_TIMEOUT_S = 25             // Secondi di attesa chiesti al server
+        const val LONG_POLL_ERROR_DELAY_MS = 5000L     // Attesa dopo un errore prima di riprovare
+    }
+
+    // command_seq dell'ultimo comando ricevuto, confermato al server con ack_seq
+    @Volatile
+    private var lastCommandSeq = 0L
+
     /**
      * Ottiene un identificatore univoco per il dispositivo in un formato compatibile col server
      * Genera un ID nel formato "android_XXXX" dove XXXX è un numero casuale fisso
@@ -86,7 +96,8 @@ class NetworkManager(private val context: Context) {
                 "buzzer": ${timerState.buzzerEnabled},
                 "players_count": ${timerState.playersCount},
                 "is_t1_active": ${timerState.isT1Active},
-                "wifi_signal": ${wifiSignal ?: "null"}
+                "wifi_signal": ${wifiSignal ?: "null"},
+                "ack_seq": $lastCommandSeq
             }
             """.trimIndent()
 
@@ -111,58 +122,9 @@ class NetworkManager(private val context: Context) {
                         val gson = Gson()
                         val response = gson.fromJson(responseBody, ServerResponse::class.java)
 
-                        if (response.command != null) {
-                            android.util.Log.d("NetworkManager", "Received command: ${response.command}")
-
-                            // Gestisci i diversi comandi
-                            when (response.command) {
-                                "start" -> return@withContext Pair(true, Command.START)
-                                "pause" -> return@withContext Pair(true, Command.PAUSE)
-                                "reset" -> return@withContext Pair(true, Command.RESET)
-                                "clear_seats" -> return@withContext Pair(true, Command.CLEAR_SEATS)
-                                "factory_reset" -> return@withContext Pair(true, Command.FACTORY_RESET)
-                                "settings", "apply_settings" -> {
-                                    // Elabora le nuove impostazioni
-                                    if (response.settings != null) {
-                                        val settings = response.settings
-                                        android.util.Log.d("NetworkManager", "Received settings: $settings")
-
-                                        val t1 = settings.t1 ?: timerState.timerT1
-                                        val t2 = settings.t2 ?: timerState.timerT2
-                                        val mode = settings.mode ?: timerState.operationMode
-                                        val tableNumber = settings.tableNumber ?: timerState.tableNumber
-
-                                        // Controlla se è presente il parametro playersCount nelle impostazioni
-                                        val playersCount = settings.playersCount ?: timerState.playersCount
-
-                                        // Gestione migliorata del buzzer
-                                        val buzzerEnabled = when {
-                                            settings.buzzer == null -> timerState.buzzerEnabled
-                                            settings.buzzer is Boolean -> settings.buzzer as Boolean
-                                            settings.buzzer is Double -> (settings.buzzer as Double).toInt() == 1
-                                            settings.buzzer is Int -> (settings.buzzer as Int) == 1
-                                            settings.buzzer is String -> {
-                                                val buzzerStr = settings.buzzer as String
-                                                buzzerStr.equals("true", ignoreCase = true) ||
-                                                        buzzerStr == "1"
-                                            }
-                                            else -> {
-                                                // Conversione di sicurezza: prova a convertire in stringa
-                                                val buzzerStr = settings.buzzer.toString()
-                                                buzzerStr.equals("true", ignoreCase = true) ||
-                                                        buzzerStr == "1"
-                                            }
-                                        }
-
-                                        android.util.Log.d("NetworkManager", "Buzzer setting: ${settings.buzzer} (${settings.buzzer?.javaClass?.simpleName}), parsed as: $buzzerEnabled")
-                                        android.util.Log.d("NetworkManager", "Players count: $playersCount")
-
-                                        return@withContext Pair(true, Command.SETTINGS(
-                                            t1, t2, mode, tableNumber, buzzerEnabled, playersCount
-                                        ))
-                                    }
-                                }
-                            }
+                        val command = parseCommand(response, timerState)
+                        if (command != null) {
+                            return@withContext Pair(true, command)
                         }
                     } catch (e: Exception) {
                         android.util.Log.e("NetworkManager", "Error parsing response: ${e.message}", e)
@@ -179,11 +141,125 @@ class NetworkManager(private val context: Context) {
             }
         }
     }
+    /**
+     * Converte il comando contenuto in una risposta del server (stato o long-poll)
+     * Restituisce null se non c'è un comando o se è già stato ricevuto
+     */
+    private fun parseCommand(response: ServerResponse, timerState: PokerTimerState): Command? {
+        if (!acceptCommandSeq(response.commandSeq)) {
+            android.util.Log.d("NetworkManager", "Command ${response.command} (seq ${response.commandSeq}) already received, ignoring")
+            return null
+        }
+        if (response.command != null) {
+            android.util.Log.d("NetworkManager", "Received command: ${response.command}")
+
+            // Gestisci i diversi comandi
+            when (response.command) {
+                "start" -> return Command.START
+                "pause" -> return Command.PAUSE
+                "reset" -> return Command.RESET
+                "clear_seats" -> return Command.CLEAR_SEATS
+                "factory_reset" -> return Command.FACTORY_RESET
+                "settings", "apply_settings" -> {
+                    // Elabora le nuove impostazioni
+                    if (response.settings != null) {
+                        val settings = response.settings
+                        android.util.Log.d("NetworkManager", "Received settings: $settings")
+
+                        val t1 = settings.t1 ?: timerState.timerT1
+                        val t2 = settings.t2 ?: timerState.timerT2
+                        val mode = settings.mode ?: timerState.operationMode
+                        val tableNumber = settings.tableNumber ?: timerState.tableNumber
+
+                        // Controlla se è presente il parametro playersCount nelle impostazioni
+                        val playersCount = settings.playersCount ?: timerState.playersCount
+
+                        // Gestione migliorata del buzzer
+                        val buzzerEnabled = when {
+                            settings.buzzer == null -> timerState.buzzerEnabled
+                            settings.buzzer is Boolean -> settings.buzzer as Boolean
+                            settings.buzzer is Double -> (settings.buzzer as Double).toInt() == 1
+                            settings.buzzer is Int -> (settings.buzzer as Int) == 1
+                            settings.buzzer is String -> {
+                                val buzzerStr = settings.buzzer as String
+                                buzzerStr.equals("true", ignoreCase = true) ||
+                                        buzzerStr == "1"
+                            }
+                            else -> {
+                                // Conversione di sicurezza: prova a convertire in stringa
+                                val buzzerStr = settings.buzzer.toString()
+                                buzzerStr.equals("true", ignoreCase = true) ||
+                                        buzzerStr == "1"
+                            }
+                        }
+
+                        android.util.Log.d("NetworkManager", "Buzzer setting: ${settings.buzzer} (${settings.buzzer?.javaClass?.simpleName}), parsed as: $buzzerEnabled")
+                        android.util.Log.d("NetworkManager", "Players count: $playersCount")
+
+                        return Command.SETTINGS(
+                            t1, t2, mode, tableNumber, buzzerEnabled, playersCount
+                        )
+                    }
+                }
+            }
+        }
+        return null
+    }
+
+    /**
+     * Il server reinvia un comando finché non riceve ack_seq: un comando con lo
+     * stesso numero di sequenza dell'ultimo ricevuto è un reinvio da ignorare
+     */
+    @Synchronized
+    private fun acceptCommandSeq(commandSeq: Long?): Boolean {
+        if (commandSeq == null) return true
+        if (commandSeq == lastCommandSeq) return false
+        lastCommandSeq = commandSeq
+        return true
+    }
+
+    /**
+     * Attende un comando dal server (long-poll su /api/commands) confermando l'ultimo ricevuto
+     * @return Coppia (comando, millisecondi da attendere prima del long-poll successivo)
+     */
+    suspend fun waitForCommand(serverUrl: String, timerState: PokerTimerState): Pair<Command?, Long> {
+        return withContext(Dispatchers.IO) {
+            var connection: HttpURLConnection? = null
+            try {
+                val deviceId = getUniqueDeviceId()
+                val url = URL("$serverUrl/api/commands/$deviceId?timeout=$LONG_POLL_TIMEOUT_S&ack=$lastCommandSeq")
+                connection = url.openConnection() as HttpURLConnection
+                connection.requestMethod = "GET"
+                connection.connectTimeout = 5000
+                connection.readTimeout = (LONG_POLL_TIMEOUT_S + 10) * 1000
+
+                val responseCode = connection.responseCode
+                if (responseCode != HttpURLConnection.HTTP_OK) {
+                    // 404: il timer non ha ancora inviato il primo stato
+                    android.util.Log.d("NetworkManager", "Command long-poll response code: $responseCode")
+                    return@withContext Pair(null, LONG_POLL_ERROR_DELAY_MS)
+                }
+
+                val responseBody = connection.inputStream.bufferedReader().use { it.readText() }
+                val response = Gson().fromJson(responseBody, ServerResponse::class.java)
+                // Posti per le attese esauriti: il server indica dopo quanto riprovare
+                return@withContext Pair(parseCommand(response, timerState), response.retryMs ?: 0L)
+            } catch (e: Exception) {
+                android.util.Log.e("NetworkManager", "Command long-poll error: ${e.message}")
+                return@withContext Pair(null, LONG_POLL_ERROR_DELAY_MS)
+            } finally {
+                connection?.disconnect()
+            }
+        }
+    }
+
     // Classe per rappresentare la risposta del server
     data class ServerResponse(
         val status: String,
         val command: String? = null,
-        val settings: TimerSettings? = null
+        val settings: TimerSettings? = null,
+        @SerializedName("command_seq") val commandSeq: Long? = null,
+        @SerializedName("retry_ms") val retryMs: Long? = null
     )
 
     // Classe per rappresentare le impostazioni del timer
@@ -26,6 +26,7 @@ import kotlinx.coroutines.isActive
 
 class PokerTimerViewModel(application: Application) : AndroidViewModel(application) {
     private var serverPollingJob: Job? = null
+    private var commandPollingJob: Job? = null
     private val preferences = PokerTimerPreferences(application)
     private val networkManager = NetworkManager(application)
     private val context = application.applicationContext
@@ -604,44 +605,7 @@ class PokerTimerViewModel(application: Application) : AndroidViewModel(applicati
 
                 // Gestisci il comando ricevuto dal server
                 if (success && command != null) {
-                    when (command) {
-                        is Command.START -> {
-                            if (!currentState.isRunning || currentState.isPaused) {
-                                startTimer()
-                            }
-                        }
-                        is Command.PAUSE -> {
-                            if (currentState.isRunning && !currentState.isPaused) {
-                                pauseTimer()
-                            }
-                        }
-                        is Command.RESET -> {
-                            resetTimer(true)
-                        }
-                        is Command.FACTORY_RESET -> {  // NUOVO CASE
-                            Log.d("PokerTimerViewModel", "Ricevuto comando FACTORY_RESET dal server")
-                            performFactoryReset()
-                        }
-                        is Command.SEAT_OPEN -> {
-                            refreshFromServer()
-                            Log.d("PokerTimerViewModel", "Ricevuto comando SEAT_OPEN: ${command.seats}")
-                        }
-                        is Command.SETTINGS -> {
-                            saveSettings(
-                                timerT1 = command.t1,
-                                timerT2 = command.t2,
-                                operationMode = command.mode,
-                                buzzerEnabled = command.buzzerEnabled,
-                                tableNumber = command.tableNumber,
-                                serverUrl = currentState.serverUrl,
-                                playersCount = command.playersCount
-                            )
-                        }
-                        is Command.CLEAR_SEATS -> {
-                            selectedSeats.clear()
-                            Log.d("PokerTimerViewModel", "Ricevuto comando CLEAR_SEATS, posti selezionati resettati")
-                        }
-                    }
+                    handleServerCommand(command)
                 }
             } catch (e: Exception) {
                 Log.e("PokerTimerViewModel", "Errore nell'invio dello stato: ${e.message}", e)
@@ -651,6 +615,52 @@ class PokerTimerViewModel(application: Application) : AndroidViewModel(applicati
         }
     }
 
+    /**
+     * Esegue un comando ricevuto dal server (risposta allo stato o long-poll)
+     */
+    private fun handleServerCommand(command: Command) {
+        val currentState = _timerState.value ?: return
+
+        when (command) {
+            is Command.START -> {
+                if (!currentState.isRunning || currentState.isPaused) {
+                    startTimer()
+                }
+            }
+            is Command.PAUSE -> {
+                if (currentState.isRunning && !currentState.isPaused) {
+                    pauseTimer()
+                }
+            }
+            is Command.RESET -> {
+                resetTimer(true)
+            }
+            is Command.FACTORY_RESET -> {  // NUOVO CASE
+                Log.d("PokerTimerViewModel", "Ricevuto comando FACTORY_RESET dal server")
+                performFactoryReset()
+            }
+            is Command.SEAT_OPEN -> {
+                refreshFromServer()
+                Log.d("PokerTimerViewModel", "Ricevuto comando SEAT_OPEN: ${command.seats}")
+            }
+            is Command.SETTINGS -> {
+                saveSettings(
+                    timerT1 = command.t1,
+                    timerT2 = command.t2,
+                    operationMode = command.mode,
+                    buzzerEnabled = command.buzzerEnabled,
+                    tableNumber = command.tableNumber,
+                    serverUrl = currentState.serverUrl,
+                    playersCount = command.playersCount
+                )
+            }
+            is Command.CLEAR_SEATS -> {
+                selectedSeats.clear()
+                Log.d("PokerTimerViewModel", "Ricevuto comando CLEAR_SEATS, posti selezionati resettati")
+            }
+        }
+    }
+
     /**
      * Gestisce il comando floorman_call localmente per aggiornamento immediato UI
      */
@@ -856,6 +866,29 @@ class PokerTimerViewModel(application: Application) : AndroidViewModel(applicati
             }
         }
 
+        // Long-poll dei comandi: start/pausa dal server arrivano subito, senza attendere il polling
+        commandPollingJob = CoroutineScope(Dispatchers.Main).launch {
+            while (isActive) {
+                val state = _timerState.value
+                if (state == null || state.serverUrl.isEmpty()) {
+                    break
+                }
+                if (!state.isConnectedToServer) {
+                    delay(2000)
+                    continue
+                }
+
+                val (command, retryMs) = networkManager.waitForCommand(state.serverUrl, state)
+                if (command != null) {
+                    handleServerCommand(command)
+                }
+                if (retryMs > 0) {
+                    delay(retryMs)
+                }
+            }
+            Log.d("PokerTimerViewModel", "Job di long-poll dei comandi terminato")
+        }
+
         Log.d("PokerTimerViewModel", "Job di polling avviato con successo")
     }
 
@@ -890,6 +923,8 @@ class PokerTimerViewModel(application: Application) : AndroidViewModel(applicati
     fun stopServerPolling() {
         serverPollingJob?.cancel()
         serverPollingJob = null
+        commandPollingJob?.cancel()
+        commandPollingJob = null
 
         // Aggiorniamo lo stato per indicare la disconnessione
         val currentState = _timerState.value ?: return
@@ -368,9 +368,14 @@ class ServerUrlActivity : AppCompatActivity() {
                         Log.d(TAG, "Received response: '$serverResponse' from $serverIp")
 
                         // Verifica la risposta
-                        if (serverResponse.trim() == "POKER_TIMER_SERVER") {
-                            // Aggiunge l'indirizzo IP e la porta del server Express
-                            val serverUrl = "http://$serverIp:3000"
+                        // Le risposte e i beacon del server indicano la porta HTTP ("port=NNNN"),
+                        // i server precedenti inviano solo POKER_TIMER_SERVER
+                        if (serverResponse.trim().startsWith("POKER_TIMER_SERVER")) {
+                            val serverPort = Regex("""\bport=(\d{1,5})""").find(serverResponse)
+                                ?.groupValues?.get(1)?.toIntOrNull()
+                                ?.takeIf { it in 1..65535 } ?: 3000
+                            // Aggiunge l'indirizzo IP e la porta del server
+                            val serverUrl = "http://$serverIp:$serverPort"
                             Log.d(TAG, "Found server: $serverUrl")
 
                             // Aggiunge il server alla lista se non è già presente
@@ -273,6 +273,10 @@
 
 #define VOLTAGE_SAMPLES 5
 
+// Formato dello stato inviato a /api/status: 1 = pacchetto binario compatto
+// (vedi status_codec.py nel monitor, circa 40 byte), 0 = JSON
+#define STATUS_BINARY 0
+
 #define tickNote           100
 #define pauseNote          550
 #define endingNote         1000
@@ -400,8 +404,25 @@ unsigned long lastWiFiStatusCheck = 0;
 
 unsigned long lastServerDiscoveryAttempt = 0;
 const unsigned long SERVER_DISCOVERY_INTERVAL = 60000; // Tenta discovery ogni minuto
+const unsigned long SERVER_REDISCOVERY_INTERVAL = 10000; // Dopo un errore di connessione riprova prima
 bool serverDiscovered = false;
+bool serverConnectionFailed = false; // L'ultimo invio di stato non ha raggiunto il server
 String discoveredServerUrl = "";
+String serverInstanceId = "";  // id= annunciato dal server: cambia a ogni riavvio
+WiFiUDP beaconUdp;             // Ascolto passivo dei beacon del server mentre si è connessi
+bool beaconListening = false;
+uint32_t lastCommandSeq = 0;  // command_seq dell'ultimo comando ricevuto, confermato al server con ack_seq
+
+// Long-poll su /api/commands: la richiesta resta aperta sul server e la risposta
+// viene letta dal loop senza bloccarlo, così start/pausa arrivano subito invece
+// che alla risposta dello stato successivo
+const uint16_t COMMAND_POLL_TIMEOUT = 25;               // Secondi di attesa chiesti al server
+const unsigned long COMMAND_POLL_ERROR_DELAY = 5000;    // Attesa dopo un errore prima di riprovare
+WiFiClient commandClient;
+bool commandPollActive = false;
+unsigned long commandPollStartTime = 0;
+unsigned long nextCommandPollTime = 0;
+String commandPollResponse = "";
 const char* defaultMonitorServerUrl = "http://192.168.1.89:3000/api/status"; // URL di fallback
 
 
@@ -1970,6 +1991,12 @@ void loop() {
       lastStatusUpdateTime = currentMillisForUpdate;
       sendStatusToServer();
     }
+    
+    // Segue riavvii e cambi di porta del server annunciati dai beacon
+    listenForServerBeacons();
+    
+    // Attende i comandi senza bloccare il loop
+    pollServerCommands();
   }
   
   // Petting il watchdog per farlo sapere che il loop è ancora attivo
@@ -4268,6 +4295,46 @@ void handleWiFiSetup() {
 }
 
 // Funzione per inviare lo stato del PokerTimer al server di monitoraggio
+#if STATUS_BINARY
+// Pacchetto di stato binario (little-endian, versione 1), stesso layout di status_codec.py
+size_t buildBinaryStatus(uint8_t* packet, size_t size, int rssi) {
+  String deviceId = getUniqueDeviceId();
+  size_t idLength = min((size_t)deviceId.length(), size - 23);
+  uint16_t voltageMv = (uint16_t)constrain((long)(lastVolt * 1000), 0L, 65535L);
+  uint8_t flags = 0x20 | 0x40;  // wifi_signal e ack_seq presenti
+  if (isStarted) flags |= 0x01;
+  if (isPaused) flags |= 0x02;
+  if (timeExpired) flags |= 0x08;
+  if (buzzerOnOff) flags |= 0x10;
+  
+  packet[0] = 'P';
+  packet[1] = 'T';
+  packet[2] = 1;  // Versione
+  packet[3] = flags;
+  packet[4] = tableNumber;
+  packet[5] = 0;
+  packet[6] = timerCurrent;
+  packet[7] = 0;
+  packet[8] = pokerTimer1;
+  packet[9] = 0;
+  packet[10] = pokerTimer2;
+  packet[11] = 0;
+  packet[12] = operationMode;
+  packet[13] = (uint8_t)constrain((int)lastPercent, 0, 254);
+  packet[14] = voltageMv & 0xFF;
+  packet[15] = voltageMv >> 8;
+  packet[16] = (uint8_t)(int8_t)constrain(rssi, -128, 127);
+  packet[17] = playersCount;
+  packet[18] = lastCommandSeq & 0xFF;
+  packet[19] = (lastCommandSeq >> 8) & 0xFF;
+  packet[20] = (lastCommandSeq >> 16) & 0xFF;
+  packet[21] = (lastCommandSeq >> 24) & 0xFF;
+  packet[22] = idLength;
+  memcpy(packet + 23, deviceId.c_str(), idLength);
+  return 23 + idLength;
+}
+#endif
+
 void sendStatusToServer() {
   // Verifica che il WiFi sia connesso
   if (WiFi.status() != WL_CONNECTED) {
@@ -4275,7 +4342,9 @@ void sendStatusToServer() {
   }
   
   // Verifica se il server è stato scoperto, altrimenti tenta la discovery
-  if (!serverDiscovered && millis() - lastServerDiscoveryAttempt > SERVER_DISCOVERY_INTERVAL) {
+  // Dopo un errore di connessione (es. server riavviato o porta cambiata) la discovery riparte entro pochi secondi
+  unsigned long discoveryInterval = serverConnectionFailed ? SERVER_REDISCOVERY_INTERVAL : SERVER_DISCOVERY_INTERVAL;
+  if (!serverDiscovered && millis() - lastServerDiscoveryAttempt > discoveryInterval) {
     discoverServer();
   }
   
@@ -4293,11 +4362,20 @@ void sendStatusToServer() {
   
   // Inizializza la connessione HTTP con l'URL scoperto o quello di default
   http.begin(client, discoveredServerUrl);
-  http.addHeader("Content-Type", "application/json");
   
   // Ottieni la potenza del segnale WiFi
   int rssi = WiFi.RSSI();
   
+#if STATUS_BINARY
+  http.addHeader("Content-Type", "application/x-poker-timer-status");
+  uint8_t packet[64];
+  size_t packetLength = buildBinaryStatus(packet, sizeof(packet), rssi);
+  
+  // Invia la richiesta POST
+  int httpResponseCode = http.POST(packet, packetLength);
+#else
+  http.addHeader("Content-Type", "application/json");
+  
   // Costruisci il JSON di stato
   String jsonStatus = "{";
   jsonStatus += "\"device_id\":\"" + getUniqueDeviceId() + "\",";
@@ -4313,6 +4391,7 @@ void sendStatusToServer() {
   jsonStatus += "\"voltage\":" + String(lastVolt) + ",";
   jsonStatus += "\"wifi_signal\":" + String(rssi) + ",";
   jsonStatus += "\"buzzer\":" + String(buzzerOnOff) + ","; // Aggiunto il campo buzzer
+  jsonStatus += "\"ack_seq\":" + String(lastCommandSeq) + ",";
   jsonStatus += "\"players_count\":" + String(playersCount);
   jsonStatus += "}";
   
@@ -4320,6 +4399,7 @@ void sendStatusToServer() {
   
   // Invia la richiesta POST
   int httpResponseCode = http.POST(jsonStatus);
+#endif
   
   if (httpResponseCode > 0) {
     Serial.print("HTTP Response code: ");
@@ -4331,6 +4411,7 @@ void sendStatusToServer() {
     
     // Se la connessione è riuscita, segna il server come scoperto
     serverDiscovered = true;
+    serverConnectionFailed = false;
     
     // Processa eventuali comandi dal server
     processServerCommands(response);
@@ -4343,6 +4424,7 @@ void sendStatusToServer() {
     if (httpResponseCode <= 0) {
       Serial.println("Connection failed. Will try discovery again.");
       serverDiscovered = false;
+      serverConnectionFailed = true;
     }
   }
   
@@ -4350,9 +4432,95 @@ void sendStatusToServer() {
   http.end();
 }
 
+// Valore di un campo "nome=valore" di un pacchetto di discovery (stringa vuota se manca)
+String discoveryField(const String& packet, const char* name) {
+  String key = " " + String(name) + "=";
+  int start = packet.indexOf(key);
+  if (start == -1) {
+    return "";
+  }
+  start += key.length();
+  int end = packet.indexOf(" ", start);
+  if (end == -1) end = packet.length();
+  return packet.substring(start, end);
+}
+
+// Legge i beacon periodici del server senza bloccare il loop. Un beacon dello
+// stesso server con porta o id diversi (riavvio, cambio di porta) fa ricollegare
+// subito il timer, senza attendere un errore di invio e la nuova discovery;
+// se il server non risponde si accetta il beacon di qualsiasi server
+void listenForServerBeacons() {
+  if (!beaconListening) {
+    beaconListening = beaconUdp.begin(DISCOVERY_PORT);
+    if (!beaconListening) {
+      return;
+    }
+  }
+  
+  while (beaconUdp.parsePacket() > 0) {
+    char packetBuffer[128];
+    int len = beaconUdp.read(packetBuffer, sizeof(packetBuffer) - 1);
+    if (len <= 0) {
+      continue;
+    }
+    packetBuffer[len] = 0;
+    String beacon = String(packetBuffer);
+    // Sulla stessa porta arrivano anche le richieste di discovery degli altri timer
+    if (!beacon.startsWith("POKER_TIMER_SERVER")) {
+      continue;
+    }
+    
+    long port = discoveryField(beacon, "port").toInt();
+    if (port <= 0 || port > 65535) {
+      continue;
+    }
+    String instanceId = discoveryField(beacon, "id");
+    String serverIP = beaconUdp.remoteIP().toString();
+    String beaconUrl = "http://" + serverIP + ":" + String(port) + "/api/status";
+    
+    bool sameHost = discoveredServerUrl.startsWith("http://" + serverIP + ":");
+    bool serverLost = !serverDiscovered || serverConnectionFailed;
+    if (!sameHost && !serverLost) {
+      continue;  // Un altro server sulla rete: si resta su quello che risponde
+    }
+    bool restarted = instanceId.length() > 0 && instanceId != serverInstanceId;
+    if (beaconUrl == discoveredServerUrl && !restarted && !serverLost) {
+      continue;
+    }
+    
+    Serial.println("Server beacon: " + beacon + " from " + serverIP + ", reconnecting");
+    discoveredServerUrl = beaconUrl;
+    if (instanceId.length() > 0) {
+      if (restarted && serverInstanceId.length() > 0) {
+        // Nuova istanza del server: la numerazione dei comandi può ripartire da 1
+        lastCommandSeq = 0;
+      }
+      serverInstanceId = instanceId;
+    }
+    serverDiscovered = true;
+    serverConnectionFailed = false;
+    saveDiscoveredServerUrl();
+    
+    // Stato e long-poll ripartono subito verso il nuovo indirizzo
+    lastStatusUpdateTime = millis() - statusUpdateInterval;
+    if (commandPollActive) {
+      commandClient.stop();
+      commandPollActive = false;
+      commandPollResponse = "";
+    }
+    nextCommandPollTime = millis();
+  }
+}
+
 void discoverServer() {
   Serial.println("Attempting to discover server on network...");
   
+  // La discovery usa la stessa porta UDP dell'ascolto dei beacon
+  if (beaconListening) {
+    beaconUdp.stop();
+    beaconListening = false;
+  }
+  
   // Crea un socket UDP per il broadcast
   WiFiUDP udp;
   udp.begin(DISCOVERY_PORT);
@@ -4370,6 +4538,8 @@ void discoverServer() {
   unsigned long startTime = millis();
   serverDiscovered = false; // Reset dello stato di discovery
   
+  String fallbackServerUrl = "";
+  
   while (millis() - startTime < 3000) { // Attendi risposte per 3 secondi
     int packetSize = udp.parsePacket();
     
@@ -4387,17 +4557,30 @@ void discoverServer() {
         Serial.println(udp.remoteIP().toString());
         
         // Verifica se la risposta è dal nostro server
-        if (response.indexOf("POKER_TIMER_SERVER") >= 0) {
+        if (response.startsWith("POKER_TIMER_SERVER")) {
           // Costruisci l'URL del server usando l'IP del mittente
-          IPAddress remoteIP = udp.remoteIP();
-          String serverIP = remoteIP.toString();
-          discoveredServerUrl = "http://" + serverIP + ":3000/api/status";
-          
-          Serial.print("Server discovered! URL: ");
-          Serial.println(discoveredServerUrl);
+          String serverIP = udp.remoteIP().toString();
+
+          // Risposte e beacon indicano la porta HTTP ("port=NNNN"); i server precedenti no
+          int portIndex = response.indexOf("port=");
+          long parsedPort = portIndex >= 0 ? response.substring(portIndex + 5).toInt() : 0;
+          if (parsedPort > 0 && parsedPort <= 65535) {
+            discoveredServerUrl = "http://" + serverIP + ":" + String(parsedPort) + "/api/status";
+            String instanceId = discoveryField(response, "id");
+            if (instanceId.length() > 0) {
+              if (serverInstanceId.length() > 0 && instanceId != serverInstanceId) {
+                lastCommandSeq = 0;  // Nuova istanza del server
+              }
+              serverInstanceId = instanceId;
+            }
+            serverDiscovered = true;
+            break;
+          }
           
-          serverDiscovered = true;
-          break;
+          // Risposta senza porta: la si usa solo se entro la finestra non arriva di meglio
+          if (fallbackServerUrl.length() == 0) {
+            fallbackServerUrl = "http://" + serverIP + ":3000/api/status";
+          }
         }
       }
     }
@@ -4407,7 +4590,15 @@ void discoverServer() {
     yield(); // Permette all'ESP di gestire altri processi
   }
   
-  if (!serverDiscovered) {
+  if (!serverDiscovered && fallbackServerUrl.length() > 0) {
+    discoveredServerUrl = fallbackServerUrl;
+    serverDiscovered = true;
+  }
+  
+  if (serverDiscovered) {
+    Serial.print("Server discovered! URL: ");
+    Serial.println(discoveredServerUrl);
+  } else {
     Serial.println("No server found during discovery.");
   }
   
@@ -4469,10 +4660,94 @@ void loadDiscoveredServerUrl() {
   }
 }
 
+// Avvia o legge il long-poll dei comandi: chiamata a ogni giro del loop
+void pollServerCommands() {
+  if (commandPollActive) {
+    while (commandClient.available()) {
+      commandPollResponse += (char)commandClient.read();
+    }
+    // Con HTTP/1.0 il server chiude la connessione dopo la risposta
+    if (commandClient.connected() && millis() - commandPollStartTime < (COMMAND_POLL_TIMEOUT + 10) * 1000UL) {
+      return;
+    }
+    commandClient.stop();
+    commandPollActive = false;
+    finishCommandPoll();
+    return;
+  }
+  
+  if (!serverDiscovered || serverConnectionFailed || (long)(millis() - nextCommandPollTime) < 0) {
+    return;
+  }
+  
+  // discoveredServerUrl ha la forma http://host:porta/api/status
+  int hostStart = discoveredServerUrl.indexOf("//") + 2;
+  int pathStart = discoveredServerUrl.indexOf("/", hostStart);
+  if (hostStart < 2 || pathStart == -1) {
+    nextCommandPollTime = millis() + COMMAND_POLL_ERROR_DELAY;
+    return;
+  }
+  String hostPort = discoveredServerUrl.substring(hostStart, pathStart);
+  String apiPath = discoveredServerUrl.substring(pathStart, discoveredServerUrl.lastIndexOf("/"));
+  int colon = hostPort.indexOf(":");
+  String host = colon >= 0 ? hostPort.substring(0, colon) : hostPort;
+  uint16_t port = colon >= 0 ? hostPort.substring(colon + 1).toInt() : 80;
+  
+  if (!commandClient.connect(host.c_str(), port)) {
+    Serial.println("Command long-poll: connection failed");
+    nextCommandPollTime = millis() + COMMAND_POLL_ERROR_DELAY;
+    return;
+  }
+  
+  // ack conferma l'ultimo comando ricevuto: il server può consegnare il successivo
+  commandClient.print("GET " + apiPath + "/commands/" + getUniqueDeviceId() +
+                      "?timeout=" + String(COMMAND_POLL_TIMEOUT) + "&ack=" + String(lastCommandSeq) +
+                      " HTTP/1.0\r\nHost: " + hostPort + "\r\nConnection: close\r\n\r\n");
+  commandPollResponse = "";
+  commandPollStartTime = millis();
+  commandPollActive = true;
+}
+
+void finishCommandPoll() {
+  int bodyStart = commandPollResponse.indexOf("\r\n\r\n");
+  if (!commandPollResponse.startsWith("HTTP/1.") || commandPollResponse.indexOf(" 200 ") == -1 || bodyStart == -1) {
+    // Errore o timer non ancora registrato (404 prima del primo stato): riprova più tardi
+    Serial.println("Command long-poll failed");
+    nextCommandPollTime = millis() + COMMAND_POLL_ERROR_DELAY;
+    commandPollResponse = "";
+    return;
+  }
+  
+  String body = commandPollResponse.substring(bodyStart + 4);
+  commandPollResponse = "";
+  
+  // Posti per le attese esauriti: il server indica dopo quanto riprovare (retry_ms)
+  unsigned long retryDelay = 0;
+  int retryPos = body.indexOf("\"retry_ms\":");
+  if (retryPos >= 0) {
+    retryDelay = body.substring(retryPos + 11).toInt();
+  }
+  nextCommandPollTime = millis() + retryDelay;
+  
+  processServerCommands(body);
+}
+
 void processServerCommands(String response) {
   // La risposta è in formato JSON, analizziamola
   Serial.println("Full server response: " + response);
   
+  // Il server reinvia un comando finché non riceve ack_seq: se il numero di
+  // sequenza è quello dell'ultimo comando ricevuto è già stato eseguito
+  int seqPos = response.indexOf("\"command_seq\":");
+  if (seqPos >= 0) {
+    uint32_t commandSeq = (uint32_t)response.substring(seqPos + 14).toInt();
+    if (commandSeq == lastCommandSeq) {
+      Serial.println("Command already executed (seq " + String(commandSeq) + "), ignoring");
+      return;
+    }
+    lastCommandSeq = commandSeq;
+  }
+  
   if (response.indexOf("\"command\":\"apply_settings\"") >= 0) {
     Serial.println("Command received: APPLY SETTINGS");
     